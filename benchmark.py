@@ -0,0 +1,310 @@
+########################################################################
+#                                                                      #
+#       NAME:  LMODEM - Goodput Benchmark                              #
+#  COPYRIGHT:  2021-2025 Chris Clement (K7CTC)                         #
+#    VERSION:  v0.9.1                                                  #
+#                                                                      #
+########################################################################
+
+#standard library imports
+import argparse
+import itertools
+import json
+import random
+import tempfile
+import threading
+from sys import exit, stdout
+from time import monotonic
+from pathlib import Path
+
+#related third party imports
+import serial
+
+#local application/library specific imports
+import ui
+import lmodem
+from emulator import Air, RN2903
+from lostik import LoStik, LoStikError
+from payloadcache import PayloadCache
+from chunkstore import ChunkStore
+from telemetry import Telemetry
+
+#LMODEM channel frequencies, so interference can be placed on a channel
+channel_freqs = {1: lmodem.channel1_freq, 2: lmodem.channel2_freq, 3: lmodem.channel3_freq, 4: lmodem.channel4_freq, 5: lmodem.channel5_freq}
+
+#words used to build compressible (text-like) benchmark files
+vocabulary = ('lora', 'lmodem', 'block', 'packet', 'channel', 'mode', 'radio', 'station',
+              'transfer', 'file', 'hash', 'compress', 'receive', 'send', 'k7ctc', 'qth')
+
+#function: generate benchmark file contents
+# accepts: size in bytes, compressibility ('text', 'mixed' or 'random') and random seed
+# returns: bytes
+def generate_file(size, compressibility, seed):
+    generator = random.Random(seed)
+    if compressibility == 'random':
+        return generator.randbytes(size)
+    text = bytearray()
+    while len(text) < size:
+        line = ','.join(generator.choice(vocabulary) for _ in range(8))
+        text.extend(f'{len(text)},{line}\n'.encode('ASCII'))
+    text = text[:size]
+    if compressibility == 'mixed':
+        text[::2] = generator.randbytes(len(text[::2]))
+    return bytes(text)
+
+#function: generate an earlier version of a benchmark file, differing in a few places
+# accepts: file contents, number of edits and random seed
+# returns: bytes
+def generate_earlier_version(contents, edits, seed):
+    generator = random.Random(seed)
+    earlier = bytearray(contents)
+    for _ in range(edits):
+        #each edit replaces, inserts or deletes a short run of bytes
+        start = generator.randrange(len(earlier) + 1)
+        length = generator.randrange(1, 33)
+        edit = generator.choice(('replace', 'insert', 'delete'))
+        if edit == 'replace':
+            earlier[start:start+length] = generator.randbytes(len(earlier[start:start+length]))
+        if edit == 'insert':
+            earlier[start:start] = generator.randbytes(length)
+        if edit == 'delete':
+            del earlier[start:start+length]
+    return bytes(earlier)
+
+#function: run a station in its own thread, recording its exit status
+def run_station(results, name, target, *args):
+    try:
+        results[name] = target(*args)
+    except SystemExit as status:
+        results[name] = status.code
+    except LoStikError as error:
+        #port closed by the benchmark after the other station gave up
+        results[name] = 'abandoned' if isinstance(error.__cause__, serial.SerialException) else 1
+
+#function: run one LMODEM session (sender and receiver) over the emulated air
+# accepts: emulated air, list of files to send, receive directory, mode and options
+# returns: receiver exit status
+def run_session(air, send_paths, receive_directory, mode, options, payload_cache=None):
+    #each station has one emulated LoStik per stripe, paired by channel
+    sending_stations = [LoStik(RN2903(air)) for _ in range(options.lostiks)]
+    receiving_stations = [LoStik(RN2903(air)) for _ in range(options.lostiks)]
+    for stripe, station_pair in enumerate(zip(sending_stations, receiving_stations)):
+        for station in station_pair:
+            lmodem.lmodem_set_channel(station, lmodem.lmodem_stripe_channel(options.channel, stripe))
+            lmodem.lmodem_set_mode(station, mode)
+    #each station may log its packets, the sending station to one file and the receiving station to another
+    telemetry_logs = {}
+    if options.telemetry:
+        for name, stations in (('send', sending_stations), ('receive', receiving_stations)):
+            telemetry_logs[name] = Telemetry(f'{options.telemetry}.{name}.jsonl')
+            for stripe, station in enumerate(stations):
+                station.telemetry = telemetry_logs[name]
+                station.telemetry_number = stripe
+    results = {}
+    if len(send_paths) == 1:
+        send_arguments = (lmodem.send_file, sending_stations[0], send_paths[0], mode, options.fec, sending_stations[1:], payload_cache,
+                          True, None, options.adaptive, options.survey)
+    else:
+        send_arguments = (lmodem.send_batch, sending_stations[0], send_paths, mode, options.fec, sending_stations[1:], payload_cache,
+                          options.adaptive, options.survey)
+    threads = [threading.Thread(target=run_station, args=(results, 'send', *send_arguments), daemon=True),
+               threading.Thread(target=run_station, args=(results, 'receive', lmodem.receive_batch, receiving_stations[0], mode, receive_directory, receiving_stations[1:],
+                                                         ChunkStore(receive_directory)), daemon=True)]
+    for thread in threads:
+        thread.start()
+    #once either station finishes allow the other a grace period before pulling the plug
+    while all(thread.is_alive() for thread in threads):
+        threads[0].join(0.1)
+    for thread in threads:
+        thread.join(options.grace)
+    for station in sending_stations + receiving_stations:
+        station.close()
+    for thread in threads:
+        thread.join()
+    for name, telemetry in telemetry_logs.items():
+        telemetry.summary(results.get(name))
+        telemetry.close()
+    return results.get('receive')
+
+#function: benchmark a complete transfer, resuming until complete or out of sessions
+# returns: dictionary of results
+def run_transfer(size, compressibility, mode, loss, options):
+    with tempfile.TemporaryDirectory() as directory:
+        send_directory = Path(directory) / 'send'
+        receive_directory = Path(directory) / 'receive'
+        send_directory.mkdir()
+        receive_directory.mkdir()
+        #the size is split evenly across the files of a batch
+        send_paths = []
+        file_contents = []
+        for file_number in range(options.files):
+            send_path = send_directory / ('benchmark.bin' if options.files == 1 else f'benchmark{file_number}.bin')
+            contents = generate_file(size // options.files, compressibility, options.seed + file_number)
+            #files may share content (a template), which the receiving station's chunk store need only receive once
+            if options.shared:
+                contents = generate_file(options.shared, compressibility, options.seed - 1) + contents[options.shared:]
+            send_path.write_bytes(contents)
+            #the receiving station may already hold an earlier version of each file (delta transfer)
+            if options.delta:
+                (receive_directory / send_path.name).write_bytes(generate_earlier_version(contents, options.delta, options.seed + file_number))
+            send_paths.append(send_path)
+            file_contents.append(contents)
+        #resumed sessions reuse the compressed file, as an operator re-running LMODEM would
+        payload_cache = PayloadCache(Path(directory) / 'cache')
+        air = Air(loss=loss,
+                  corruption=options.corruption,
+                  latency=options.latency,
+                  time_scale=options.time_scale,
+                  seed=options.seed,
+                  path_loss=options.path_loss,
+                  noise={channel_freqs[channel]: noise for channel, noise in options.noise})
+        sessions = 0
+        status = None
+        start_time = monotonic()
+        while sessions < options.max_sessions:
+            sessions += 1
+            status = run_session(air, send_paths, receive_directory, mode, options, payload_cache)
+            #an operator re-runs LMODEM after any failure (lost handshake, time-out or incomplete transfer)
+            if status == 0:
+                break
+        wall_time = monotonic() - start_time
+        complete = status == 0
+        for send_path, contents in zip(send_paths, file_contents):
+            received_path = receive_directory / send_path.name
+            complete = complete and received_path.is_file() and received_path.read_bytes() == contents
+    return {'mode': mode,
+            'size': size,
+            'compressibility': compressibility,
+            'loss': loss,
+            'corruption': options.corruption,
+            'latency': options.latency,
+            'time_scale': options.time_scale,
+            'fec': options.fec,
+            'lostiks': options.lostiks,
+            'files': options.files,
+            'delta': options.delta,
+            'shared': options.shared,
+            'adaptive': options.adaptive,
+            'path_loss': options.path_loss,
+            'survey': options.survey,
+            'noise': dict(options.noise),
+            'complete': complete,
+            'wall_time': round(wall_time, 3),
+            'goodput': round(size / wall_time, 3) if complete else 0.0,
+            'air_time': round(air.air_time, 3),
+            'air_time_utilization': round(air.air_time / wall_time, 4),
+            'packets_sent': air.packets_sent,
+            'packets_lost': air.packets_lost,
+            'round_trips': air.turnarounds // 2,
+            'sessions': sessions,
+            'resumes': sessions - 1}
+
+def main():
+    parser = argparse.ArgumentParser(description='LMODEM goodput benchmark (emulated LoStik pair)')
+    parser.add_argument('--sizes',
+                        help='file sizes in bytes (default: 1024,8192)',
+                        type=lambda value: [int(size) for size in value.split(',')],
+                        default=[1024, 8192])
+    parser.add_argument('--compressibility',
+                        help='file contents (default: text,random)',
+                        type=lambda value: value.split(','),
+                        default=['text', 'random'])
+    parser.add_argument('--modes',
+                        help='LMODEM modes (default: 1,2,3,4,5)',
+                        type=lambda value: [int(mode) for mode in value.split(',')],
+                        default=[1, 2, 3, 4, 5])
+    parser.add_argument('--loss',
+                        help='packet loss rates (default: 0,0.05,0.2)',
+                        type=lambda value: [float(loss) for loss in value.split(',')],
+                        default=[0.0, 0.05, 0.2])
+    parser.add_argument('--corruption',
+                        help='packet corruption rate (default: 0)',
+                        type=float,
+                        default=0.0)
+    parser.add_argument('--latency',
+                        help='packet delivery latency in seconds (default: 0.01)',
+                        type=float,
+                        default=0.01)
+    parser.add_argument('--time-scale',
+                        help='air time multiplier, values below 1 distort host-side pacing (default: 1)',
+                        type=float,
+                        default=1.0)
+    parser.add_argument('--channel',
+                        help='LMODEM channel (default: 3)',
+                        type=int,
+                        choices=[1,2,3,4,5],
+                        default=3)
+    parser.add_argument('--fec',
+                        help='send forward error correction (parity) blocks',
+                        action='store_true')
+    parser.add_argument('--lostiks',
+                        help='emulated LoStiks per station, striped across consecutive channels (default: 1)',
+                        type=int,
+                        choices=[1,2,3,4,5],
+                        default=1)
+    parser.add_argument('--files',
+                        help='split each transfer into this many files, sent as a batch (default: 1)',
+                        type=int,
+                        default=1)
+    parser.add_argument('--delta',
+                        help='receive station starts with an earlier version of each file, differing by this many edits (default: 0, none)',
+                        type=int,
+                        default=0)
+    parser.add_argument('--shared',
+                        help='bytes at the start of every file in a batch that are common to all of them (default: 0)',
+                        type=int,
+                        default=0)
+    parser.add_argument('--adaptive',
+                        help='let the receive station switch mode as the link allows',
+                        action='store_true')
+    parser.add_argument('--path-loss',
+                        help='dB lost between stations, so loss follows the power, bandwidth and spreading factor of each mode (default: none)',
+                        type=float)
+    parser.add_argument('--survey',
+                        help='survey every channel before each transfer and move to the best',
+                        action='store_true')
+    parser.add_argument('--noise',
+                        help='comma separated interference per channel as channel:dB, e.g. 3:20,4:10 (default: none)',
+                        type=lambda value: [(int(channel), float(noise)) for channel, noise in (entry.split(':') for entry in value.split(','))],
+                        default=[])
+    parser.add_argument('--telemetry',
+                        help='append per-packet telemetry and session summaries to prefix.send.jsonl and prefix.receive.jsonl',
+                        metavar='prefix')
+    parser.add_argument('--max-sessions',
+                        help='maximum LMODEM runs (initial plus resumes) per transfer (default: 10)',
+                        type=int,
+                        default=10)
+    parser.add_argument('--grace',
+                        help='seconds to wait for a station after its peer exits (default: 20)',
+                        type=float,
+                        default=20.0)
+    parser.add_argument('--seed',
+                        help='random seed (default: 1)',
+                        type=int,
+                        default=1)
+    parser.add_argument('-o', '--output',
+                        help='write JSON lines to file instead of stdout',
+                        metavar='filename')
+    options = parser.parse_args()
+
+    for compressibility in options.compressibility:
+        if compressibility not in ('text', 'mixed', 'random'):
+            parser.error(f'invalid compressibility: {compressibility}')
+
+    #stations share the LMODEM user interface, silence it
+    ui.console.quiet = True
+
+    output = open(options.output, 'a') if options.output else stdout
+    try:
+        for mode, size, compressibility, loss in itertools.product(options.modes, options.sizes, options.compressibility, options.loss):
+            result = run_transfer(size, compressibility, mode, loss, options)
+            output.write(json.dumps(result) + '\n')
+            output.flush()
+    except KeyboardInterrupt:
+        exit(2)
+    finally:
+        if output is not stdout:
+            output.close()
+
+if __name__ == '__main__':
+    main()
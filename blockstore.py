@@ -0,0 +1,217 @@
+########################################################################
+#                                                                      #
+#       NAME:  LMODEM - Block Store                                    #
+#  COPYRIGHT:  2021-2025 Chris Clement (K7CTC)                         #
+#    VERSION:  v0.9.1                                                  #
+#                                                                      #
+########################################################################
+
+# The blocks of a (compressed) file held in one preallocated buffer along
+# with a bitmap of received blocks and a running count.  Storing, fetching
+# and counting blocks costs O(1) per block, and the bitmap doubles as the
+# basis of the negative acknowledgement sent by the receiving station.
+#
+# A Checkpoint mirrors a receiving BlockStore on disk so that an abort at
+# any point loses at most the last second of blocks (and none once the
+# channel falls silent, when the receiving station forces a flush).  Checkpoint layout:
+#   header (magic, version, mode, block size, file size, secure hash)
+#   received block bitmap
+#   block data (sparse, block n at n * block size)
+# Block data is always flushed to disk before the bitmap claiming it.
+
+#standard library imports
+import os
+import struct
+from sys import exit
+from time import monotonic
+
+if __name__ == '__main__':
+    print('[ERROR] blockstore.py is not intended for direct execution!')
+    exit(1)
+
+#class: numbered, fixed size blocks of a file (the last block may be shorter)
+# accepts: file size in bytes and block size in bytes
+#  option: data (bytearray) - complete file contents, held without copying and every block marked received
+class BlockStore:
+    def __init__(self, size, block_size, data=None):
+        self.size = size
+        self.block_size = block_size
+        self.block_count = -(-size // block_size)
+        #bit n (least significant first) set when block n has been received
+        self.bitmap = bytearray((self.block_count + 7) // 8)
+        if data is None:
+            self.buffer = bytearray(size)
+            self.received_count = 0
+        else:
+            self.buffer = data if isinstance(data, bytearray) else bytearray(data)
+            for block_number in range(self.block_count):
+                self.bitmap[block_number // 8] |= 1 << (block_number % 8)
+            self.received_count = self.block_count
+
+    def __len__(self):
+        return self.block_count
+
+    #function: length of a block in bytes
+    # accepts: block number
+    # returns: block length (int)
+    def block_length(self, block_number):
+        return min(self.block_size, self.size - block_number * self.block_size)
+
+    #function: determine whether a block has been received
+    # accepts: block number
+    # returns: boolean
+    def has(self, block_number):
+        return bool(self.bitmap[block_number // 8] & (1 << (block_number % 8)))
+
+    #function: obtain a received block without copying it
+    # accepts: block number
+    # returns: memoryview of block contents
+    def get(self, block_number):
+        start = block_number * self.block_size
+        return memoryview(self.buffer)[start:start + self.block_length(block_number)]
+
+    #function: store a block
+    # accepts: block number and block contents (bytes-like)
+    # returns: True if the block is new, False if it is a duplicate, out of range or the wrong length
+    def put(self, block_number, block):
+        if not 0 <= block_number < self.block_count or self.has(block_number):
+            return False
+        if len(block) != self.block_length(block_number):
+            return False
+        start = block_number * self.block_size
+        self.buffer[start:start + len(block)] = block
+        self.bitmap[block_number // 8] |= 1 << (block_number % 8)
+        self.received_count += 1
+        return True
+
+    #function: determine whether every block has been received
+    # returns: boolean
+    def is_complete(self):
+        return self.received_count == self.block_count
+
+    #function: obtain bitmap of missing blocks, bit n (least significant first) set when block n is missing
+    # returns: bytes
+    def missing_bitmap(self):
+        bitmap = bytearray(byte ^ 0xFF for byte in self.bitmap)
+        if self.block_count % 8:
+            bitmap[-1] &= (1 << (self.block_count % 8)) - 1
+        return bytes(bitmap)
+
+    #function: obtain runs of consecutive missing blocks in ascending order
+    # returns: generator of (first block number, number of blocks)
+    def missing_runs(self):
+        run_start = None
+        for byte_number, byte in enumerate(self.bitmap):
+            #skip whole bytes of received blocks, or whole bytes of missing blocks, at once
+            if byte == 0xFF and run_start is None:
+                continue
+            if byte == 0x00 and run_start is not None:
+                continue
+            for block_number in range(byte_number * 8, min(byte_number * 8 + 8, self.block_count)):
+                if self.has(block_number):
+                    if run_start is not None:
+                        yield run_start, block_number - run_start
+                        run_start = None
+                elif run_start is None:
+                    run_start = block_number
+        if run_start is not None:
+            yield run_start, self.block_count - run_start
+
+#checkpoint header: magic | version | mode | block size | file size | secure hash (16 bytes)
+checkpoint_magic = b'LMODEMCP'
+checkpoint_version = 1
+checkpoint_header = struct.Struct('<8sBBHI16s')
+
+#function: restore blocks from a checkpoint left by an earlier, incomplete transfer
+# accepts: checkpoint path, empty BlockStore, mode number and expected secure hash hex digest
+# returns: True if the checkpoint belongs to this file (blocks restored), otherwise False
+def load_checkpoint(path, store, mode, secure_hash_hex_digest):
+    try:
+        with open(path, 'rb') as file:
+            header = file.read(checkpoint_header.size)
+            if len(header) != checkpoint_header.size:
+                return False
+            if checkpoint_header.unpack(header) != (checkpoint_magic, checkpoint_version, mode, store.block_size,
+                                                    store.size, bytes.fromhex(secure_hash_hex_digest)):
+                return False
+            bitmap = file.read(len(store.bitmap))
+            data = file.read(store.size)
+    except OSError:
+        return False
+    if len(bitmap) != len(store.bitmap):
+        return False
+    data = data.ljust(store.size, b'\x00')
+    for block_number in range(store.block_count):
+        if bitmap[block_number // 8] & (1 << (block_number % 8)):
+            start = block_number * store.block_size
+            store.put(block_number, data[start:start + store.block_length(block_number)])
+    return True
+
+#class: on-disk mirror of a receiving BlockStore, (re)written from the store's current contents
+# accepts: checkpoint path, BlockStore, mode number and secure hash hex digest
+#  option: interval (float) - seconds between flushes to disk (default: 1)
+class Checkpoint:
+    def __init__(self, path, store, mode, secure_hash_hex_digest, interval=1.0):
+        self.path = path
+        self.store = store
+        self.interval = interval
+        self.data_offset = checkpoint_header.size + len(store.bitmap)
+        header = checkpoint_header.pack(checkpoint_magic, checkpoint_version, mode, store.block_size,
+                                        store.size, bytes.fromhex(secure_hash_hex_digest))
+        #a checkpoint of this file (the one just restored from) is updated in place, never truncated,
+        #so the blocks it holds stay claimed on disk until the store's bitmap replaces its own
+        saved_bitmap = None
+        try:
+            self.file = open(path, 'r+b')
+            if self.file.read(checkpoint_header.size) == header:
+                saved_bitmap = self.file.read(len(store.bitmap)).ljust(len(store.bitmap), b'\x00')
+            else:
+                self.file.close()
+        except OSError:
+            pass
+        if saved_bitmap is None:
+            #no checkpoint of this file, nothing on disk is worth keeping
+            self.file = open(path, 'w+b')
+            self.file.write(header)
+            self.file.write(bytes(len(store.bitmap)))
+            saved_bitmap = bytes(len(store.bitmap))
+        self.file.truncate(self.data_offset + store.size)
+        self.dirty = True
+        for block_number in range(store.block_count):
+            if store.has(block_number) and not saved_bitmap[block_number // 8] & (1 << (block_number % 8)):
+                self.record(block_number)
+        del header, saved_bitmap
+        self.last_flush_time = None
+        self.flush(force=True)
+
+    #function: write a newly stored block (claimed in the bitmap at the next flush)
+    # accepts: block number
+    def record(self, block_number):
+        self.file.seek(self.data_offset + block_number * self.store.block_size)
+        self.file.write(self.store.get(block_number))
+        self.dirty = True
+
+    #function: make recorded blocks durable, at most once per interval unless forced
+    #  option: force (boolean) - flush regardless of interval (e.g. as the channel falls silent)
+    def flush(self, force=False):
+        if not self.dirty or (not force and monotonic() - self.last_flush_time < self.interval):
+            return
+        #block data reaches the disk before the bitmap that claims it
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.seek(checkpoint_header.size)
+        self.file.write(self.store.bitmap)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.dirty = False
+        self.last_flush_time = monotonic()
+
+    #function: flush and close checkpoint, optionally deleting it (transfer finished)
+    #  option: remove (boolean) - delete checkpoint file
+    def close(self, remove=False):
+        if not self.file.closed:
+            if not remove:
+                self.flush(force=True)
+            self.file.close()
+        if remove:
+            os.remove(self.path)
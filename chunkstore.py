@@ -0,0 +1,201 @@
+########################################################################
+#                                                                      #
+#       NAME:  LMODEM - Received Chunk Store                           #
+#  COPYRIGHT:  2021-2025 Chris Clement (K7CTC)                         #
+#    VERSION:  v0.9.1                                                  #
+#                                                                      #
+########################################################################
+
+# Files often share large portions (templates, repeated forms, re-exports)
+# so the receiving station indexes every file it receives by content.  Each
+# file is cut into content defined chunks: a gear rolling hash picks chunk
+# boundaries from the bytes themselves, so an insertion early in a file only
+# moves the boundaries around it and every later chunk keeps its hash.
+# The index maps each chunk hash to the file, offset and length holding it
+# and lives beside the received files as a JSON document:
+#   {"version": 1, "parameters": [...], "files": {name: [[hash, offset, length], ...]}}
+# Files are only referenced, never copied.  A chunk is re-hashed before it is
+# offered, so a file changed or removed since it was indexed is never trusted.
+
+#standard library imports
+import os
+import json
+import tempfile
+from sys import exit
+from hashlib import blake2b
+from pathlib import Path
+
+if __name__ == '__main__':
+    print('[ERROR] chunkstore.py is not intended for direct execution!')
+    exit(1)
+
+#content defined chunking parameters (changing any of them invalidates existing indexes)
+min_chunk_size = 256              #no boundary before this many bytes
+boundary_mask = 0x3FF << 22       #boundary where these hash bits are all zero, 1 KiB average chunk
+max_chunk_size = 8192             #boundary forced at this many bytes
+chunk_hash_length = 8             #bytes of BLAKE2b identifying a chunk
+
+#bytes read from disk at a time while chunking a file
+read_size = 65536
+
+#index file, kept in the directory of the files it describes
+index_name = '.lmodem-chunks.json'
+index_version = 1
+
+#gear table, 32 pseudo-random bits per byte value (derived, so identical at every station)
+gear = [int.from_bytes(blake2b(bytes([value]), digest_size=4).digest(), 'little') for value in range(256)]
+
+#class: incremental content defined chunker, fed data in arbitrary pieces
+class Chunker:
+    def __init__(self):
+        #bytes of the current chunk seen so far
+        self.length = 0
+        self.rolling_hash = 0
+
+    #function: find the chunk boundaries within the next piece
+    # accepts: piece (bytes-like)
+    # returns: list of lengths of the chunks completed within this piece
+    def feed(self, piece):
+        lengths = []
+        length = self.length
+        rolling_hash = self.rolling_hash
+        for byte in piece:
+            #high bits of the gear hash depend on the last 32 bytes only
+            rolling_hash = ((rolling_hash << 1) + gear[byte]) & 0xFFFFFFFF
+            length += 1
+            if (length >= min_chunk_size and not rolling_hash & boundary_mask) or length == max_chunk_size:
+                lengths.append(length)
+                length = 0
+                rolling_hash = 0
+        self.length = length
+        self.rolling_hash = rolling_hash
+        return lengths
+
+    #function: complete the data
+    # returns: list holding the length of the final chunk (empty if the data ended on a boundary)
+    def finish(self):
+        return [self.length] if self.length else []
+
+#function: cut data into content defined chunks
+# accepts: data (bytes-like)
+# returns: list of (offset, length)
+def chunk_boundaries(data):
+    chunker = Chunker()
+    boundaries = []
+    offset = 0
+    for length in chunker.feed(data) + chunker.finish():
+        boundaries.append((offset, length))
+        offset += length
+    return boundaries
+
+#function: hash identifying a chunk
+# accepts: chunk (bytes-like)
+# returns: bytes
+def chunk_hash(chunk):
+    return blake2b(chunk, digest_size=chunk_hash_length).digest()
+
+#function: cut data into content defined chunks and hash each
+# accepts: data (bytes-like)
+# returns: list of (offset, length, chunk hash)
+def chunks(data):
+    return [(offset, length, chunk_hash(data[offset:offset+length])) for offset, length in chunk_boundaries(data)]
+
+#function: cut a file into content defined chunks and hash each, reading it a piece at a time
+# accepts: file (opened for binary reading) and read size in bytes
+# returns: list of (offset, length, chunk hash), the same as chunks() of the whole file
+def file_chunks(file, read_size):
+    chunker = Chunker()
+    found_chunks = []
+    offset = 0
+    #file contents from offset onwards, never more than one chunk and one read
+    pending = bytearray()
+    while True:
+        piece = file.read(read_size)
+        pending += piece
+        lengths = chunker.feed(piece) if piece else chunker.finish()
+        position = 0
+        for length in lengths:
+            found_chunks.append((offset, length, chunk_hash(pending[position:position+length])))
+            offset += length
+            position += length
+        del pending[:position]
+        if not piece:
+            return found_chunks
+
+#class: index of the chunks of every file received into a directory
+# accepts: directory
+# an index that cannot be read or written behaves as if empty, it never stops a transfer
+class ChunkStore:
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.index_path = self.directory / index_name
+        #file name to list of [chunk hash, offset, length], as saved
+        self.files = {}
+        #chunk hash to (file name, offset, length), the most recently indexed file wins
+        self.locations = {}
+        try:
+            with open(self.index_path, 'r', encoding='UTF-8') as file:
+                index = json.load(file)
+            if index.get('version') == index_version and index.get('parameters') == self.parameters():
+                for file_name, file_chunks in index['files'].items():
+                    for chunk_hash_hex, offset, length in file_chunks:
+                        self.locations[bytes.fromhex(chunk_hash_hex)] = (file_name, offset, length)
+                self.files = index['files']
+        except (OSError, ValueError, AttributeError, KeyError, TypeError):
+            self.files = {}
+            self.locations = {}
+
+    def __len__(self):
+        return len(self.locations)
+
+    #function: chunking parameters recorded in the index
+    # returns: list
+    @staticmethod
+    def parameters():
+        return [min_chunk_size, boundary_mask, max_chunk_size, chunk_hash_length]
+
+    #function: index a received file (replacing any earlier index of a file by that name)
+    # accepts: file path (within the store's directory)
+    def add(self, path):
+        path = Path(path)
+        try:
+            with open(path, 'rb') as file:
+                indexed_chunks = file_chunks(file, read_size)
+        except OSError:
+            return
+        self.files[path.name] = [[hash.hex(), offset, length] for offset, length, hash in indexed_chunks]
+        for offset, length, hash in indexed_chunks:
+            self.locations[hash] = (path.name, offset, length)
+        self.save()
+
+    #function: write the index, beside the old one then renamed so a reader never sees a partial index
+    def save(self):
+        try:
+            descriptor, temporary_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            try:
+                with os.fdopen(descriptor, 'w', encoding='UTF-8') as file:
+                    json.dump({'version': index_version, 'parameters': self.parameters(), 'files': self.files}, file)
+                os.replace(temporary_path, self.index_path)
+            except OSError:
+                os.remove(temporary_path)
+                raise
+        except OSError:
+            pass
+
+    #function: read a chunk, verifying it is still held
+    # accepts: chunk hash (bytes)
+    # returns: chunk contents (bytes) or None if the chunk is not held
+    def read(self, hash):
+        location = self.locations.get(hash)
+        if location is None:
+            return None
+        file_name, offset, length = location
+        try:
+            with open(self.directory / file_name, 'rb') as file:
+                file.seek(offset)
+                chunk = file.read(length)
+        except OSError:
+            return None
+        if len(chunk) != length or chunk_hash(chunk) != hash:
+            return None
+        return chunk
@@ -0,0 +1,182 @@
+########################################################################
+#                                                                      #
+#       NAME:  LMODEM - Compression Codecs                             #
+#  COPYRIGHT:  2021-2025 Chris Clement (K7CTC)                         #
+#    VERSION:  v0.9.1                                                  #
+#                                                                      #
+########################################################################
+
+# Every byte over the air is expensive (mode 5 is only a few hundred bits per
+# second) so the sending station compresses the file with each codec below and
+# sends whichever output is smallest.  The codec id is carried in the file
+# transfer details so the receiving station can decompress incrementally.
+
+#standard library imports
+import bz2
+import lzma
+import zlib
+import queue
+import threading
+from sys import exit
+
+if __name__ == '__main__':
+    print('[ERROR] codec.py is not intended for direct execution!')
+    exit(1)
+
+#codec ids (carried in the file transfer details)
+codec_none = 0            #stored as is, for incompressible files
+codec_xz = 1              #lzma.compress() defaults, .xz container (LMODEM v0.9.1 and earlier)
+codec_lzma2 = 2           #raw LZMA2 stream (no container), preset 6
+codec_lzma2_extreme = 3   #raw LZMA2 stream (no container), preset 9 extreme
+codec_deflate = 4         #raw deflate stream (no zlib header), level 9
+codec_bzip2 = 5           #bzip2, level 9
+codecs = (codec_none, codec_xz, codec_lzma2, codec_lzma2_extreme, codec_deflate, codec_bzip2)
+
+#exceptions raised by a decompressor fed a corrupt stream (or data beyond the end of the stream)
+decompression_errors = (lzma.LZMAError, zlib.error, OSError, EOFError, ValueError)
+
+#raw LZMA2 carries no header, so both stations must agree on the dictionary size
+#(1 MiB comfortably exceeds any file that fits the over the air limit and keeps decoder memory modest)
+lzma2_dict_size = 1 << 20
+
+#class: stand-in compressor and decompressor for codec_none
+class Passthrough:
+    eof = True
+    def compress(self, data):
+        return bytes(data)
+    def flush(self):
+        return b''
+    def decompress(self, data):
+        return bytes(data)
+
+#function: create incremental compressor
+# accepts: codec id
+# returns: object providing compress(data) and flush()
+def create_compressor(codec_id):
+    if codec_id == codec_none:
+        return Passthrough()
+    if codec_id == codec_xz:
+        return lzma.LZMACompressor()
+    if codec_id == codec_lzma2:
+        return lzma.LZMACompressor(format=lzma.FORMAT_RAW, filters=[{'id': lzma.FILTER_LZMA2, 'preset': 6, 'dict_size': lzma2_dict_size}])
+    if codec_id == codec_lzma2_extreme:
+        return lzma.LZMACompressor(format=lzma.FORMAT_RAW, filters=[{'id': lzma.FILTER_LZMA2, 'preset': 9 | lzma.PRESET_EXTREME, 'dict_size': lzma2_dict_size}])
+    if codec_id == codec_deflate:
+        return zlib.compressobj(9, zlib.DEFLATED, -15)
+    if codec_id == codec_bzip2:
+        return bz2.BZ2Compressor(9)
+    raise ValueError(f'unknown codec: {codec_id}')
+
+#function: create incremental decompressor
+# accepts: codec id
+# returns: object providing decompress(data) and eof (True once the end of the stream has been decoded)
+def create_decompressor(codec_id):
+    if codec_id == codec_none:
+        return Passthrough()
+    if codec_id == codec_xz:
+        return lzma.LZMADecompressor()
+    if codec_id in (codec_lzma2, codec_lzma2_extreme):
+        return lzma.LZMADecompressor(format=lzma.FORMAT_RAW, filters=[{'id': lzma.FILTER_LZMA2, 'dict_size': lzma2_dict_size}])
+    if codec_id == codec_deflate:
+        return zlib.decompressobj(-15)
+    if codec_id == codec_bzip2:
+        return bz2.BZ2Decompressor()
+    raise ValueError(f'unknown codec: {codec_id}')
+
+#class: one codec compressing a stream fed in chunks, giving up once its output exceeds the size limit
+# accepts: codec id and size limit in bytes
+class LimitedCompression:
+    def __init__(self, codec_id, limit):
+        self.codec_id = codec_id
+        self.limit = limit
+        self.compressor = create_compressor(codec_id)
+        self.compressed = bytearray()
+
+    #function: compress the next chunk (ignored once the size limit is exceeded)
+    # accepts: chunk (bytes-like)
+    def compress(self, chunk):
+        if self.compressed is not None:
+            self.compressed += self.compressor.compress(chunk)
+            if len(self.compressed) > self.limit:
+                self.compressed = None
+
+    #function: complete the stream
+    # returns: compressed file (bytearray) or None if the output exceeds the size limit
+    def flush(self):
+        if self.compressed is not None:
+            self.compressed += self.compressor.flush()
+            if len(self.compressed) > self.limit:
+                self.compressed = None
+        return self.compressed
+
+    #function: compress every chunk taken from a queue until None (a worker thread)
+    # accepts: queue of chunks
+    def compress_queue(self, chunks):
+        while (chunk := chunks.get()) is not None:
+            self.compress(chunk)
+
+#class: every codec compressing one stream fed in pieces, keeping the smallest output
+# accepts: size limit in bytes
+class SmallestCompression:
+    def __init__(self, limit):
+        self.compressions = [LimitedCompression(codec_id, limit) for codec_id in codecs]
+
+    #function: compress the next piece with every codec
+    # accepts: piece (bytes-like)
+    def compress(self, piece):
+        for compression in self.compressions:
+            compression.compress(piece)
+
+    #function: determine whether every codec has exceeded the size limit, so no output can meet it
+    # returns: boolean
+    def is_exhausted(self):
+        return all(compression.compressed is None for compression in self.compressions)
+
+    #function: complete the stream
+    # returns: codec id and compressed stream (bytearray), or None and None if no codec meets the size limit
+    def flush(self):
+        best_codec_id = None
+        best_compressed = None
+        for compression in self.compressions:
+            compressed = compression.flush()
+            if compressed is not None and (best_compressed is None or len(compressed) < len(best_compressed)):
+                best_codec_id, best_compressed = compression.codec_id, compressed
+        return best_codec_id, best_compressed
+
+#function: compress a file with every codec and keep the smallest output, reading the file only once
+# accepts: file path, size limit in bytes and chunk size in bytes
+#  option: parallel (boolean) - compress with one thread per codec, worthwhile once compression outweighs thread start up
+#  option: hash (hashlib object) - also updated with every chunk read (incomplete if no codec meets the size limit)
+# returns: codec id and compressed file (bytearray), or None and None if no codec meets the size limit
+# Each chunk is read once and handed to every codec.  lzma, zlib and bz2 release the GIL while compressing
+# so the threads run on separate CPUs, and unlike worker processes they share each chunk rather than copy it.
+def compress_smallest(path, limit, chunk_size, parallel=True, hash=None):
+    smallest = SmallestCompression(limit)
+    workers = []
+    if parallel:
+        for compression in smallest.compressions:
+            #a few chunks in hand per codec keeps memory flat while the slowest codec catches up
+            chunks = queue.Queue(maxsize=4)
+            worker = threading.Thread(target=compression.compress_queue, args=(chunks,), daemon=True)
+            worker.start()
+            workers.append((worker, chunks))
+    try:
+        with open(path, 'rb') as file:
+            while chunk := file.read(chunk_size):
+                if hash is not None:
+                    hash.update(chunk)
+                if parallel:
+                    for worker, chunks in workers:
+                        chunks.put(chunk)
+                else:
+                    smallest.compress(chunk)
+                #the file cannot be sent once every codec is over the limit, so the rest is neither read nor hashed
+                #(worker threads run a few chunks behind, they only stop the read once they catch up)
+                if smallest.is_exhausted():
+                    break
+    finally:
+        for worker, chunks in workers:
+            chunks.put(None)
+        for worker, chunks in workers:
+            worker.join()
+    return smallest.flush()
@@ -0,0 +1,274 @@
+########################################################################
+#                                                                      #
+#       NAME:  LMODEM - Delta Transfer                                 #
+#  COPYRIGHT:  2021-2025 Chris Clement (K7CTC)                         #
+#    VERSION:  v0.9.1                                                  #
+#                                                                      #
+########################################################################
+
+# rsync style delta encoding.  The receiving station divides its copy of a
+# file into fixed size chunks and sends a signature (weak rolling checksum
+# and truncated strong hash) of each.  The sending station slides a window
+# across its version of the file, finds every chunk the receiving station
+# already holds and encodes the file as a stream of instructions:
+#   literal: varint (length << 1) followed by the bytes themselves
+#   copy:    varint (run << 1 | 1) then varint first chunk index, copying
+#            that many consecutive chunks from the receiving station's copy
+# The instruction stream is compressed and sent exactly as a whole file
+# would be.  Weak checksums can collide and strong hashes are truncated, so
+# the rebuilt file is always verified against the secure hash of the source.
+
+#standard library imports
+from hashlib import blake2b
+from sys import exit
+
+if __name__ == '__main__':
+    print('[ERROR] delta.py is not intended for direct execution!')
+    exit(1)
+
+#signature entry: weak checksum (4 bytes, little endian) | strong hash (2 bytes)
+weak_checksum_length = 4
+strong_hash_length = 2
+signature_entry_length = weak_checksum_length + strong_hash_length
+
+#exceptions raised by a Patcher fed corrupt instructions
+delta_errors = (ValueError,)
+
+#function: encode unsigned integer as LEB128 varint (LMODEM packet headers and control packets use it too)
+# returns: bytes (one byte for 0-127, two bytes for 128-16,383, etc.)
+def encode_varint(value):
+    encoded = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            encoded.append(byte | 0x80)
+        else:
+            encoded.append(byte)
+            return bytes(encoded)
+
+#function: decode LEB128 varint
+# accepts: bytes and position of first varint byte
+# returns: value and position following the varint
+#  raises: IndexError if data ends mid-varint
+def decode_varint(data, position):
+    value = 0
+    shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            return value, position
+
+#function: choose chunk size so a file is described by at most a given number of signatures
+# accepts: file size in bytes, minimum chunk size in bytes and maximum number of chunks
+# returns: chunk size in bytes
+def chunk_size_for(size, min_chunk_size, max_chunks):
+    return max(min_chunk_size, -(-size // max_chunks))
+
+#function: weak rolling checksum of a window (rsync's pair of 16 bit sums)
+# accepts: window (bytes-like)
+# returns: low sum, high sum
+def weak_checksum(window):
+    low = 0
+    high = 0
+    length = len(window)
+    for offset, byte in enumerate(window):
+        low += byte
+        high += (length - offset) * byte
+    return low & 0xFFFF, high & 0xFFFF
+
+#function: truncated strong hash of a chunk
+# accepts: chunk (bytes-like)
+# returns: bytes
+def strong_hash(chunk):
+    return blake2b(chunk, digest_size=strong_hash_length).digest()
+
+#function: build signatures of every whole chunk of a file (a shorter final chunk is not signed)
+# accepts: file path and chunk size in bytes
+# returns: list of (weak checksum, strong hash)
+def signatures(path, chunk_size):
+    entries = []
+    with open(path, 'rb') as file:
+        while len(chunk := file.read(chunk_size)) == chunk_size:
+            low, high = weak_checksum(chunk)
+            entries.append((low | high << 16, strong_hash(chunk)))
+    return entries
+
+#function: pack signatures for transmission
+# accepts: list of (weak checksum, strong hash)
+# returns: bytes, signature_entry_length per chunk
+def encode_signatures(entries):
+    return b''.join(weak.to_bytes(weak_checksum_length, 'little') + strong for weak, strong in entries)
+
+#function: unpack signatures
+# accepts: bytes (a whole number of entries)
+# returns: list of (weak checksum, strong hash)
+def decode_signatures(data):
+    return [(int.from_bytes(data[position:position+weak_checksum_length], 'little'),
+             bytes(data[position+weak_checksum_length:position+signature_entry_length]))
+            for position in range(0, len(data) - signature_entry_length + 1, signature_entry_length)]
+
+#class: builder of an instruction stream, consecutive chunks are sent as a single copy instruction
+class Instructions:
+    def __init__(self):
+        self.stream = bytearray()
+        self.copy_start = None
+        self.copy_run = 0
+
+    #function: write any pending copy instruction
+    def flush_copy(self):
+        if self.copy_run:
+            self.stream.extend(encode_varint(self.copy_run << 1 | 1) + encode_varint(self.copy_start))
+        self.copy_start = None
+        self.copy_run = 0
+
+    #function: append bytes the receiving station does not hold
+    # accepts: data (bytes-like)
+    def literal(self, data):
+        if data:
+            self.flush_copy()
+            self.stream.extend(encode_varint(len(data) << 1))
+            self.stream.extend(data)
+
+    #function: append a chunk the receiving station holds
+    # accepts: chunk index
+    def copy(self, chunk_index):
+        if self.copy_run and self.copy_start + self.copy_run != chunk_index:
+            self.flush_copy()
+        if not self.copy_run:
+            self.copy_start = chunk_index
+        self.copy_run += 1
+
+    #function: take the instructions completed so far (a pending copy instruction may still grow)
+    # returns: bytes
+    def take(self):
+        taken = bytes(self.stream)
+        self.stream.clear()
+        return taken
+
+    #function: complete the instruction stream
+    # returns: the rest of the instruction stream (bytes)
+    def finish(self):
+        self.flush_copy()
+        return self.take()
+
+#function: encode a file as literals alone (always correct, whatever the receiving station holds)
+# accepts: file (opened for binary reading) and read size in bytes
+# yields: pieces of the instruction stream (bytes)
+def literal_instructions(file, read_size):
+    while piece := file.read(read_size):
+        yield encode_varint(len(piece) << 1) + piece
+
+#function: encode a file as instructions against the receiving station's chunks, reading it a piece at a time
+# accepts: file (opened for binary reading), chunk size in bytes, list of (weak checksum, strong hash),
+#          dictionary to fill with chunk index to matching offset within the file and read size in bytes
+# yields: pieces of the instruction stream (bytes), each chunk index in matches before the piece copying it
+# Only the window and at most one read of bytes before it are held, whatever the size of the file.
+def encode(file, chunk_size, entries, matches, read_size):
+    #weak checksum to chunk indices, the first chunk wins when the receiving station holds duplicates
+    chunks = {}
+    for chunk_index, (weak, strong) in enumerate(entries):
+        chunks.setdefault(weak, {}).setdefault(strong, chunk_index)
+    instructions = Instructions()
+    #file contents from window_offset onwards, positions are relative to it
+    window = bytearray()
+    window_offset = 0
+    end_of_file = False
+    literal_start = 0
+    position = 0
+    low = high = None
+    while True:
+        #keep the window and the byte following it (to roll into) in hand
+        if not end_of_file and position + chunk_size >= len(window):
+            #bytes before the window no longer match anything, send them as a literal and let them go
+            instructions.literal(window[literal_start:position])
+            del window[:position]
+            window_offset += position
+            literal_start = position = 0
+            piece = file.read(read_size)
+            if piece:
+                window += piece
+            else:
+                end_of_file = True
+            if instructions.stream:
+                yield instructions.take()
+            continue
+        if not chunks or position + chunk_size > len(window):
+            break
+        if low is None:
+            low, high = weak_checksum(window[position:position+chunk_size])
+        chunk_index = None
+        candidates = chunks.get(low | high << 16)
+        if candidates is not None:
+            chunk_index = candidates.get(strong_hash(window[position:position+chunk_size]))
+        if chunk_index is not None:
+            instructions.literal(window[literal_start:position])
+            instructions.copy(chunk_index)
+            matches.setdefault(chunk_index, window_offset + position)
+            position += chunk_size
+            literal_start = position
+            low = high = None
+            continue
+        #roll the window one byte forward
+        if position + chunk_size < len(window):
+            outgoing_byte = window[position]
+            incoming_byte = window[position + chunk_size]
+            low = (low - outgoing_byte + incoming_byte) & 0xFFFF
+            high = (high - chunk_size * outgoing_byte + low) & 0xFFFF
+        position += 1
+    instructions.literal(window[literal_start:])
+    del window
+    yield instructions.take()
+    #no signatures, the rest of the file is literal
+    while piece := file.read(read_size):
+        instructions.literal(piece)
+        yield instructions.take()
+    yield instructions.finish()
+
+#class: incremental delta decoder, fed the instruction stream in arbitrary pieces
+# accepts: function returning a chunk held by the receiving station (accepts chunk index, raises ValueError if not held)
+class Patcher:
+    def __init__(self, read_chunk):
+        self.read_chunk = read_chunk
+        self.pending = bytearray()
+        #bytes of the current literal instruction still to come
+        self.literal_remaining = 0
+
+    #function: decode as many instructions as are complete
+    # accepts: next piece of the instruction stream (bytes-like)
+    # returns: rebuilt file contents (bytes)
+    #  raises: ValueError if an instruction refers to a chunk the receiving station does not hold
+    def feed(self, data):
+        self.pending += data
+        output = bytearray()
+        position = 0
+        while position < len(self.pending):
+            if self.literal_remaining:
+                take = min(self.literal_remaining, len(self.pending) - position)
+                output += self.pending[position:position+take]
+                position += take
+                self.literal_remaining -= take
+                continue
+            try:
+                instruction, instruction_end = decode_varint(self.pending, position)
+                if instruction & 1:
+                    chunk_index, instruction_end = decode_varint(self.pending, instruction_end)
+            except IndexError:
+                #instruction continues in the next piece
+                break
+            position = instruction_end
+            if not instruction & 1:
+                self.literal_remaining = instruction >> 1
+                continue
+            for copy_index in range(chunk_index, chunk_index + (instruction >> 1)):
+                output += self.read_chunk(copy_index)
+        del self.pending[:position]
+        return bytes(output)
+
+    #function: determine whether the stream so far ends on an instruction boundary
+    # returns: boolean
+    def is_complete(self):
+        return not self.pending and not self.literal_remaining
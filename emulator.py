@@ -0,0 +1,371 @@
+########################################################################
+#                                                                      #
+#       NAME:  Ronoth LoStik (RN2903) Emulator                         #
+#  COPYRIGHT:  2021-2025 Chris Clement (K7CTC)                         #
+#    VERSION:  v0.9.1                                                  #
+#                                                                      #
+########################################################################
+
+#standard library imports
+import random
+import threading
+from sys import exit
+from math import log10
+from time import monotonic
+
+#related third party imports
+import serial
+
+#local application/library specific imports
+from lostik import firmware_version, time_on_air, demodulation_floor
+
+if __name__ == '__main__':
+    print('[ERROR] emulator.py is not intended for direct execution!')
+    exit(1)
+
+#link model constants
+noise_figure = 6.0        #receiver noise figure in dB (used only when a path loss is given)
+fade_margin = 3.0         #dB either side of the demodulation floor across which packets go from received to lost
+
+#class: virtual "air" shared by emulated stations
+#  option: loss (float) - probability that a packet is lost in transit
+#  option: corruption (float) - probability that a byte of a packet is flipped in transit
+#  option: latency (float) - seconds between end of transmission and delivery to the receiving host
+#  option: time_scale (float) - multiplier applied to air time and watchdog timer (1.0 = real time)
+#  option: rssi (int) - reported received signal strength indicator in dBm
+#  option: snr (int) - reported signal-to-noise ratio in dB
+#  option: seed - random seed for reproducible loss and corruption
+#  option: path_loss (float) - dB lost between stations, RSSI, SNR and loss then follow each sender's power,
+#                              bandwidth and spreading factor (replacing the fixed rssi and snr)
+#  option: noise (dict) - frequency (string, Hz) to dB of interference raising the noise floor on that frequency
+class Air:
+    def __init__(self, loss=0.0, corruption=0.0, latency=0.0, time_scale=1.0, rssi=-60, snr=10, seed=None, path_loss=None,
+                 noise=None):
+        self.loss = loss
+        self.corruption = corruption
+        self.latency = latency
+        self.time_scale = time_scale
+        self.rssi = rssi
+        self.snr = snr
+        self.path_loss = path_loss
+        self.noise = noise or {}
+        self.random = random.Random(seed)
+        self.stations = []
+        self.lock = threading.Lock()
+        #running totals, useful for benchmarking
+        self.packets_sent = 0
+        self.packets_lost = 0
+        self.air_time = 0.0
+        self.turnarounds = 0
+        #last station to transmit on each frequency
+        self.last_senders = {}
+
+    #function: attach an emulated station to this air
+    def attach(self, station):
+        with self.lock:
+            self.stations.append(station)
+
+    #function: put a packet on the air
+    # accepts: transmitting station, payload as bytes and time on air in seconds
+    def transmit(self, sender, payload, duration):
+        with self.lock:
+            self.packets_sent += 1
+            self.air_time += duration
+            freq = sender.settings['freq']
+            if self.last_senders.get(freq, sender) is not sender:
+                self.turnarounds += 1
+            self.last_senders[freq] = sender
+            listeners = [station for station in self.stations
+                         if station is not sender and station.listening_to(sender)]
+        link = self.link(sender.settings)
+        for station in listeners:
+            station.begin_reception(payload, duration + self.latency, link)
+
+    #function: signal with which a packet arrives
+    # accepts: transmitting station's settings
+    # returns: RSSI in dBm, SNR in dB and probability that the packet is lost
+    def link(self, settings):
+        interference = self.noise.get(settings['freq'], 0.0)
+        if self.path_loss is None:
+            rssi = self.rssi
+            snr = self.snr - interference
+        else:
+            rssi = int(settings['pwr']) - self.path_loss
+            snr = rssi - (-174 + 10 * log10(int(settings['bw']) * 1000) + noise_figure + interference)
+        margin = snr - demodulation_floor[settings['sf']]
+        if margin >= fade_margin:
+            loss = self.loss
+        elif margin <= -fade_margin:
+            loss = 1.0
+        else:
+            loss = self.loss + (1.0 - self.loss) * (fade_margin - margin) / (2 * fade_margin)
+        return round(rssi), round(snr), loss
+
+    #function: decide the fate of a packet arriving at a receiver
+    # accepts: payload as bytes
+    #  option: loss (float) - probability that the packet is lost (default: the air's loss)
+    # returns: (payload, intact) or None if the packet was lost
+    def propagate(self, payload, loss=None):
+        with self.lock:
+            if self.random.random() < (self.loss if loss is None else loss):
+                self.packets_lost += 1
+                return None
+            if self.random.random() < self.corruption:
+                payload = bytearray(payload)
+                payload[self.random.randrange(len(payload))] ^= 1 << self.random.randrange(8)
+                return bytes(payload), False
+            return payload, True
+
+#class: emulated RN2903 presenting the same interface as serial.Serial (readline/write)
+# accepts: air - Air object shared with the other emulated station(s)
+#  option: timeout (float) - readline time-out in seconds, mirrors serial.Serial
+class RN2903:
+    def __init__(self, air, timeout=1):
+        self.air = air
+        self.timeout = timeout
+        self.hweui = f'{random.getrandbits(64):016X}'
+        #RN2903 power-on defaults
+        self.settings = {'bw': '125',
+                         'cr': '4/5',
+                         'crc': 'on',
+                         'freq': '923300000',
+                         'iqi': 'off',
+                         'mod': 'lora',
+                         'prlen': '8',
+                         'pwr': '2',
+                         'sf': 'sf12',
+                         'sync': '34',
+                         'wdt': '15000'}
+        self.state = 'idle'
+        self.generation = 0
+        self.incoming = None
+        self.incoming_link = None
+        self.rssi = -128
+        self.snr = -128
+        self.input_buffer = b''
+        self.output_lines = []
+        self.condition = threading.Condition()
+        self.is_open = True
+        air.attach(self)
+
+    #function: return the next response line (with CRLF) or b'' after time-out
+    def readline(self):
+        deadline = monotonic() + self.timeout
+        with self.condition:
+            while not self.output_lines:
+                if not self.is_open:
+                    raise serial.PortNotOpenError()
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    return b''
+                self.condition.wait(remaining)
+            return self.output_lines.pop(0).encode('ASCII') + b'\r\n'
+
+    #function: accept raw bytes from host, executing each complete CRLF terminated command
+    def write(self, data):
+        if not self.is_open:
+            raise serial.PortNotOpenError()
+        self.input_buffer += data
+        while b'\r\n' in self.input_buffer:
+            command, self.input_buffer = self.input_buffer.split(b'\r\n', 1)
+            self.execute(command.decode('ASCII'))
+        return len(data)
+
+    #function: close the emulated port, any blocked readline() raises as pyserial would
+    def close(self):
+        with self.condition:
+            self.is_open = False
+            self.generation += 1
+            self.state = 'idle'
+            self.condition.notify_all()
+
+    #function: queue a response line for the host
+    def respond(self, line):
+        with self.condition:
+            self.output_lines.append(line)
+            self.condition.notify_all()
+
+    #function: schedule a callback that is ignored if the radio state changes in the meantime
+    def schedule(self, delay, generation, callback, *args):
+        timer = threading.Timer(delay, self.fire, (generation, callback) + args)
+        timer.daemon = True
+        timer.start()
+
+    def fire(self, generation, callback, *args):
+        with self.condition:
+            if generation != self.generation:
+                return
+            callback(*args)
+
+    #function: determine whether this station would demodulate a packet from the given sender
+    def listening_to(self, sender):
+        with self.condition:
+            if self.state != 'rx':
+                return False
+            for setting in ('freq', 'sf', 'bw', 'sync', 'iqi', 'mod'):
+                if self.settings[setting] != sender.settings[setting]:
+                    return False
+            return True
+
+    #function: lock onto a packet whose preamble has just been heard
+    # accepts: payload as bytes, seconds until it ends and link (RSSI, SNR and loss probability)
+    def begin_reception(self, payload, duration, link):
+        with self.condition:
+            if self.state != 'rx':
+                return
+            if self.incoming is not None:
+                #overlapping packets collide and neither is demodulated
+                self.incoming = 'COLLISION'
+                return
+            self.incoming = payload
+            self.incoming_link = link
+            generation = self.generation
+        timer = threading.Timer(duration, self.end_reception, (generation,))
+        timer.daemon = True
+        timer.start()
+
+    def end_reception(self, generation):
+        with self.condition:
+            if generation != self.generation or self.state != 'rx':
+                return
+            payload = self.incoming
+            rssi, snr, loss = self.incoming_link
+            self.incoming = None
+        if payload == 'COLLISION':
+            return
+        outcome = self.air.propagate(payload, loss)
+        if outcome is None:
+            return
+        payload, intact = outcome
+        with self.condition:
+            if generation != self.generation or self.state != 'rx':
+                return
+            if not intact and self.settings['crc'] == 'on':
+                #radio discards packets failing CRC and keeps listening
+                return
+            self.rssi = rssi + self.air.random.randint(-2, 2)
+            self.snr = snr + self.air.random.randint(-1, 1)
+            self.generation += 1
+            self.state = 'idle'
+            self.output_lines.append('radio_rx  ' + payload.hex().upper())
+            self.condition.notify_all()
+
+    #function: time-outs and completions scheduled against the radio watchdog timer
+    def watchdog_time_out(self):
+        self.generation += 1
+        self.state = 'idle'
+        self.incoming = None
+        self.output_lines.append('radio_err')
+        self.condition.notify_all()
+
+    def transmit_complete(self):
+        self.generation += 1
+        self.state = 'idle'
+        self.output_lines.append('radio_tx_ok')
+        self.condition.notify_all()
+
+    #function: parse and execute a single RN2903 command
+    def execute(self, command):
+        words = command.split()
+        if words[:3] == ['sys', 'get', 'ver']:
+            self.respond(firmware_version)
+        elif words[:3] == ['sys', 'get', 'hweui']:
+            self.respond(self.hweui)
+        elif words[:3] == ['sys', 'set', 'pindig'] and len(words) == 5:
+            self.respond('ok' if words[4] in ('0', '1') else 'invalid_param')
+        elif words == ['mac', 'pause']:
+            self.respond('4294967245')
+        elif words[:2] == ['radio', 'get'] and len(words) == 3:
+            self.radio_get(words[2])
+        elif words[:2] == ['radio', 'set'] and len(words) == 4:
+            self.radio_set(words[2], words[3])
+        elif words[:2] == ['radio', 'tx'] and len(words) == 3:
+            self.radio_tx(words[2])
+        elif words[:2] == ['radio', 'rx'] and len(words) == 3:
+            self.radio_rx(words[2])
+        elif words == ['radio', 'rxstop']:
+            with self.condition:
+                if self.state == 'rx':
+                    self.generation += 1
+                    self.state = 'idle'
+                    self.incoming = None
+            self.respond('ok')
+        else:
+            self.respond('invalid_param')
+
+    def radio_get(self, setting):
+        if setting == 'rssi':
+            self.respond(str(self.rssi))
+        elif setting == 'snr':
+            self.respond(str(self.snr))
+        elif setting in self.settings:
+            self.respond(self.settings[setting])
+        else:
+            self.respond('invalid_param')
+
+    def radio_set(self, setting, value):
+        valid = {'bw': lambda v: v in ('125', '250', '500'),
+                 'cr': lambda v: v in ('4/5', '4/6', '4/7', '4/8'),
+                 'crc': lambda v: v in ('on', 'off'),
+                 'freq': lambda v: v.isdigit() and 902000000 <= int(v) <= 928000000,
+                 'iqi': lambda v: v in ('on', 'off'),
+                 'mod': lambda v: v in ('lora', 'fsk'),
+                 'prlen': lambda v: v.isdigit() and 0 <= int(v) <= 65535,
+                 'pwr': lambda v: v.lstrip('-').isdigit() and 2 <= int(v) <= 20,
+                 'sf': lambda v: v in ('sf7', 'sf8', 'sf9', 'sf10', 'sf11', 'sf12'),
+                 'sync': lambda v: len(v) <= 2 and all(c in '0123456789abcdefABCDEF' for c in v),
+                 'wdt': lambda v: v.isdigit() and 0 <= int(v) <= 4294967295}
+        if setting not in valid or not valid[setting](value):
+            self.respond('invalid_param')
+            return
+        with self.condition:
+            self.settings[setting] = value
+        self.respond('ok')
+
+    def radio_tx(self, data):
+        try:
+            payload = bytes.fromhex(data)
+        except ValueError:
+            self.respond('invalid_param')
+            return
+        if not 0 < len(payload) <= 255:
+            self.respond('invalid_param')
+            return
+        with self.condition:
+            if self.state != 'idle':
+                self.output_lines.append('busy')
+                self.condition.notify_all()
+                return
+            self.generation += 1
+            self.state = 'tx'
+            self.output_lines.append('ok')
+            self.condition.notify_all()
+            generation = self.generation
+            settings = dict(self.settings)
+        duration = time_on_air(len(payload), settings['sf'], settings['bw'], settings['cr'],
+                               preamble=int(settings['prlen']), crc=settings['crc'] == 'on') * self.air.time_scale
+        wdt = int(settings['wdt']) / 1000 * self.air.time_scale
+        if wdt and duration > wdt:
+            self.schedule(wdt, generation, self.watchdog_time_out)
+            return
+        self.air.transmit(self, payload, duration)
+        self.schedule(duration, generation, self.transmit_complete)
+
+    def radio_rx(self, window):
+        if window != '0':
+            self.respond('invalid_param')
+            return
+        with self.condition:
+            if self.state != 'idle':
+                self.output_lines.append('busy')
+                self.condition.notify_all()
+                return
+            self.generation += 1
+            self.state = 'rx'
+            self.incoming = None
+            self.output_lines.append('ok')
+            self.condition.notify_all()
+            generation = self.generation
+            wdt = int(self.settings['wdt']) / 1000 * self.air.time_scale
+        if wdt:
+            self.schedule(wdt, generation, self.watchdog_time_out)
@@ -0,0 +1,113 @@
+########################################################################
+#                                                                      #
+#       NAME:  LMODEM - Forward Error Correction                       #
+#  COPYRIGHT:  2021-2025 Chris Clement (K7CTC)                         #
+#    VERSION:  v0.9.1                                                  #
+#                                                                      #
+########################################################################
+
+# Systematic Reed-Solomon erasure code over GF(2^8) using a Cauchy matrix.
+# A group of k data blocks is protected by m parity blocks and any k of the
+# k+m blocks are sufficient to rebuild the group.  LMODEM always knows which
+# blocks are missing (block index header), so only erasure decoding is needed.
+
+#standard library imports
+from sys import exit
+
+if __name__ == '__main__':
+    print('[ERROR] fec.py is not intended for direct execution!')
+    exit(1)
+
+#GF(2^8) exponent and logarithm tables (primitive polynomial x^8+x^4+x^3+x^2+1)
+gf_exp = [0] * 512
+gf_log = [0] * 256
+value = 1
+for power in range(255):
+    gf_exp[power] = value
+    gf_log[value] = power
+    value <<= 1
+    if value & 0x100:
+        value ^= 0x11D
+for power in range(255, 512):
+    gf_exp[power] = gf_exp[power - 255]
+del value, power
+
+def gf_mul(a, b):
+    if a == 0 or b == 0:
+        return 0
+    return gf_exp[gf_log[a] + gf_log[b]]
+
+def gf_inv(a):
+    return gf_exp[255 - gf_log[a]]
+
+#translation tables allow a whole block to be multiplied by a constant via bytes.translate()
+mul_tables = [bytes(gf_mul(constant, byte) for byte in range(256)) for constant in range(256)]
+
+#function: multiply every byte of a block by a GF(2^8) constant
+def scale(constant, block):
+    return block.translate(mul_tables[constant])
+
+#function: add (xor) two equal length blocks
+def add(a, b):
+    return (int.from_bytes(a, 'big') ^ int.from_bytes(b, 'big')).to_bytes(len(a), 'big')
+
+#function: Cauchy matrix coefficient for parity row and data column
+# x = 255 - row and y = column are distinct for any group where k + m <= 256
+def coefficient(row, column):
+    return gf_inv((255 - row) ^ column)
+
+#function: compute parity blocks for a group of data blocks
+# accepts: list of equal length data blocks (bytes) and number of parity blocks
+# returns: list of parity blocks (bytes)
+def encode(blocks, parity_count):
+    if len(blocks) + parity_count > 256:
+        raise ValueError('FEC group exceeds 256 blocks')
+    parity = []
+    for row in range(parity_count):
+        parity_block = bytes(len(blocks[0]))
+        for column, block in enumerate(blocks):
+            parity_block = add(parity_block, scale(coefficient(row, column), block))
+        parity.append(parity_block)
+    return parity
+
+#function: rebuild missing data blocks of a group
+# accepts: list of data blocks and list of parity blocks, missing blocks are None
+# returns: complete list of data blocks or None if too few blocks were received
+def decode(blocks, parity):
+    missing = [column for column, block in enumerate(blocks) if block is None]
+    if not missing:
+        return list(blocks)
+    available = [row for row, block in enumerate(parity) if block is not None]
+    if len(available) < len(missing):
+        return None
+    rows = available[:len(missing)]
+    #subtract the contribution of received data blocks from each parity block
+    matrix = []
+    vectors = []
+    for row in rows:
+        vector = parity[row]
+        for column, block in enumerate(blocks):
+            if block is not None:
+                vector = add(vector, scale(coefficient(row, column), block))
+        matrix.append([coefficient(row, column) for column in missing])
+        vectors.append(vector)
+    #Gauss-Jordan elimination, any square Cauchy submatrix is invertible
+    size = len(missing)
+    for pivot in range(size):
+        for candidate in range(pivot, size):
+            if matrix[candidate][pivot]:
+                matrix[pivot], matrix[candidate] = matrix[candidate], matrix[pivot]
+                vectors[pivot], vectors[candidate] = vectors[candidate], vectors[pivot]
+                break
+        inverse = gf_inv(matrix[pivot][pivot])
+        matrix[pivot] = [gf_mul(inverse, element) for element in matrix[pivot]]
+        vectors[pivot] = scale(inverse, vectors[pivot])
+        for other in range(size):
+            factor = matrix[other][pivot]
+            if other != pivot and factor:
+                matrix[other] = [element ^ gf_mul(factor, pivot_element) for element, pivot_element in zip(matrix[other], matrix[pivot])]
+                vectors[other] = add(vectors[other], scale(factor, vectors[pivot]))
+    recovered = list(blocks)
+    for position, column in enumerate(missing):
+        recovered[column] = vectors[position]
+    return recovered
@@ -7,44 +7,28 @@
 ########################################################################
 
 #standard library imports
-import lzma
 import os
-import textwrap
 import argparse
-import json
+import random
+import threading
 from sys import exit
+from math import log10
+from time import sleep, monotonic
 from hashlib import blake2b
 from pathlib import Path
 
-#related third party imports
-import rich.progress
-
 #local application/library specific imports
 import ui
 import lostik
-
-#establish and parse command line arguments
-parser = argparse.ArgumentParser(description='LMODEM v0.9.2',
-                                 epilog='Copyright © 2021-2025 Chris Clement (K7CTC).')
-group = parser.add_mutually_exclusive_group(required=True)
-group.add_argument('-s', '--send',
-                   help='send the specified file',
-                   metavar='filename')
-group.add_argument('-r', '--receive',
-                   help='receive an incoming file',
-                   action='store_true')
-parser.add_argument('-c', '--channel',
-                    help='LMODEM channel (default: 3)',
-                    type=int,
-                    choices=[1,2,3,4,5],
-                    default=3)
-parser.add_argument('-m', '--mode',
-                    help='LMODEM mode (default: 2)',
-                    type=int,
-                    choices=[1,2,3,4,5],
-                    default=2)
-args = parser.parse_args()
-del group, parser
+import fec
+import codec
+import delta
+import chunkstore
+from blockstore import BlockStore, Checkpoint, load_checkpoint
+from delta import encode_varint, decode_varint
+from chunkstore import ChunkStore
+from payloadcache import PayloadCache, default_directory
+from telemetry import Telemetry
 
 #LMODEM channel constants
 channel1_freq = '913000000'
@@ -53,6 +37,65 @@ channel3_freq = '915000000'
 channel4_freq = '916000000'
 channel5_freq = '917000000'
 
+#LMODEM link model constants (used to size blocks for each mode)
+lmodem_max_header_length = 4            #session byte plus block index varint (up to 2,097,151 blocks)
+lmodem_target_packet_error_rate = 0.1   #expected loss of a maximum length (255 byte) packet
+lmodem_packet_overhead = 0.2            #seconds of host side overhead per packet (tx delay, serial round trips)
+lmodem_wdt_margin = 0.8                 #fraction of watchdog timer time-out a packet may occupy
+
+#LMODEM retransmission constants
+lmodem_session_open = b'\x01'              #ASCII SOH (start of heading), begins the file transfer details
+lmodem_negative_acknowledgement = b'\x15'  #ASCII NAK, cannot begin any ASCII reply
+lmodem_manifest = b'\x1c'                  #ASCII FS (file separator), begins batch manifest fragments and their replies
+lmodem_signature = b'\x16'                 #ASCII SYN (synchronous idle), begins delta signature fragments and their replies
+lmodem_chunk_list = b'\x1d'                #ASCII GS (group separator), begins chunk list requests and fragments
+lmodem_survey = b'\x05'                    #ASCII ENQ (enquiry), begins channel survey packets
+lmodem_result_wdt = 15000                 #watchdog timer time-out (ms) while sending station awaits a reply
+lmodem_max_reply_timeouts = 3             #consecutive time-outs tolerated while awaiting a reply
+lmodem_max_stalled_rounds = 3             #retransmission rounds without progress before giving up
+
+#LMODEM file processing constants
+lmodem_read_chunk_size = 65536            #bytes read from disk at a time while hashing and compressing
+lmodem_parallel_compression_size = 65536  #files at least this large are compressed by every codec in parallel threads
+
+#LMODEM delta transfer constants (receive station holds a different version of the file)
+lmodem_delta_min_chunk_size = 128         #smallest chunk of the existing file described by a signature
+lmodem_delta_max_chunks = 256             #most signatures sent for one file (larger files use larger chunks)
+
+#LMODEM pacing constants (gap between packets sized to the receive station's measured re-arm latency)
+lmodem_pacing_factor = 1.5                #safety multiple applied to reported re-arm latency
+lmodem_pacing_margin = 0.025              #seconds added to the paced gap
+
+#LMODEM channel survey constants (send station probes every channel before the transfer)
+lmodem_survey_slot_probes = 3             #time on each channel, in probes each allowed a full time-out
+lmodem_survey_guard = 0.25                #seconds at the start of each channel before the first probe
+
+#LMODEM adaptive mode constants (receive station moves both stations to the fastest mode the link allows)
+lmodem_adaptive_target_loss = 0.1         #block loss in a round above which the next slower mode is chosen
+lmodem_adaptive_snr_margin = 5.0          #dB above the demodulation floor a faster mode must be predicted to have
+lmodem_adaptive_round_blocks = 64         #most blocks requested per round, so link quality is measured regularly
+lmodem_adaptive_slowest_mode = 4          #mode 5 (emergency use only) is never chosen automatically
+
+#function: determine block size which maximizes expected goodput for a mode
+# accepts: spreading factor, bandwidth, coding rate and watchdog timer time-out (ms)
+# returns: block size in bytes
+def optimal_block_size(sf, bw, cr, wdt):
+    #probability a single byte survives, derived from target packet error rate of a maximum length packet
+    byte_survival = (1 - lmodem_target_packet_error_rate) ** (1 / 255)
+    best_block_size = 1
+    best_goodput = 0
+    for block_size in range(1, 255 - lmodem_max_header_length + 1):
+        packet_length = block_size + lmodem_max_header_length
+        packet_time = lostik.time_on_air(packet_length, sf, bw, cr) + lmodem_packet_overhead
+        #receive station must hear the whole packet before its watchdog timer expires
+        if packet_time > int(wdt) / 1000 * lmodem_wdt_margin:
+            break
+        goodput = block_size * byte_survival ** packet_length / packet_time
+        if goodput > best_goodput:
+            best_block_size = block_size
+            best_goodput = goodput
+    return best_block_size
+
 #LMODEM mode constants
 #minimum range (bench testing only)
 mode1_pwr = '2'
@@ -60,49 +103,54 @@ mode1_bw = '500'
 mode1_sf = 'sf9'
 mode1_cr = '4/6'
 mode1_wdt = '1000'
-mode1_block_size = 128 * 2
-mode1_max_request_length = 127  #32 blocks
+mode1_block_size = optimal_block_size(mode1_sf, mode1_bw, mode1_cr, mode1_wdt) * 2
 mode1_max_ota_file_size = 32768
+mode1_fec_group_size = 16
+mode1_fec_parity = 2         #parity blocks per group when FEC is enabled
 #short range
 mode2_pwr = '6'
 mode2_bw = '250'
 mode2_sf = 'sf10'
 mode2_cr = '4/7'
 mode2_wdt = '2000'
-mode2_block_size = 128 * 2
-mode2_max_request_length = 127  #32 blocks
+mode2_block_size = optimal_block_size(mode2_sf, mode2_bw, mode2_cr, mode2_wdt) * 2
 mode2_max_ota_file_size = 32768
+mode2_fec_group_size = 16
+mode2_fec_parity = 2         #parity blocks per group when FEC is enabled
 #medium range
 mode3_pwr = '12'
 mode3_bw = '250'
 mode3_sf = 'sf11'
 mode3_cr = '4/8'
 mode3_wdt = '3000'
-mode3_block_size = 128 * 2
-mode3_max_request_length = 127  #32 blocks
+mode3_block_size = optimal_block_size(mode3_sf, mode3_bw, mode3_cr, mode3_wdt) * 2
 mode3_max_ota_file_size = 32768
+mode3_fec_group_size = 16
+mode3_fec_parity = 3         #parity blocks per group when FEC is enabled
 #long range
 mode4_pwr = '17'
 mode4_bw = '250'
 mode4_sf = 'sf12'
 mode4_cr = '4/8'
 mode4_wdt = '4000'
-mode4_block_size = 64 * 2
-mode4_max_request_length = 63   #16 blocks
+mode4_block_size = optimal_block_size(mode4_sf, mode4_bw, mode4_cr, mode4_wdt) * 2
 mode4_max_ota_file_size = 16384
+mode4_fec_group_size = 16
+mode4_fec_parity = 3         #parity blocks per group when FEC is enabled
 #maximum range (emergency use only)
 mode5_pwr = '20'
 mode5_bw = '125'
 mode5_sf = 'sf12'
 mode5_cr = '4/8'
 mode5_wdt = '7500'
-mode5_block_size = 32 * 2
-mode5_max_request_length = 31   #8 blocks
+mode5_block_size = optimal_block_size(mode5_sf, mode5_bw, mode5_cr, mode5_wdt) * 2
 mode5_max_ota_file_size = 8192
+mode5_fec_group_size = 16
+mode5_fec_parity = 4         #parity blocks per group when FEC is enabled
 
 #function: set LMODEM communication channel (frequency)
 # accepts: channel number (1, 2, 3, 4 or 5)
-def lmodem_set_channel(channel_number):
+def lmodem_set_channel(lostik, channel_number):
     if channel_number == 1:
         lostik.set_freq(channel1_freq)
     if channel_number == 2:
@@ -114,9 +162,34 @@ def lmodem_set_channel(channel_number):
     if channel_number == 5:
         lostik.set_freq(channel5_freq)
 
+#function: channel used by one of several striped LoStiks (consecutive channels, wrapping after channel 5)
+# accepts: channel number of the primary LoStik and stripe number (0 for the primary LoStik)
+# returns: channel number (1, 2, 3, 4 or 5)
+def lmodem_stripe_channel(channel_number, stripe):
+    return (channel_number - 1 + stripe) % 5 + 1
+
+#function: run a block burst on every LoStik at once (primary in the calling thread)
+# accepts: burst function (accepts LoStik object and stripe number) and list of LoStik objects
+def run_striped(burst, lostiks):
+    errors = []
+    def run(lostik, stripe):
+        try:
+            burst(lostik, stripe)
+        except Exception as error:
+            errors.append(error)
+    threads = [threading.Thread(target=run, args=(lostik, stripe), daemon=True)
+               for stripe, lostik in enumerate(lostiks) if stripe > 0]
+    for thread in threads:
+        thread.start()
+    run(lostiks[0], 0)
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+
 #function: get LMODEM communication channel (LoStik frequency)
 # returns: channel number (1, 2, 3, 4 or 5)
-def lmodem_get_channel():
+def lmodem_get_channel(lostik):
     freq = lostik.get_freq()
     if freq == channel1_freq:
         return 1
@@ -133,7 +206,7 @@ def lmodem_get_channel():
 
 #function: set LMODEM communication mode (LoStik settings)
 # accepts: mode number (1, 2, 3, 4 or 5)
-def lmodem_set_mode(mode_number):
+def lmodem_set_mode(lostik, mode_number):
     if mode_number == 1:
         lostik.set_pwr(mode1_pwr)
         lostik.set_bw(mode1_bw)
@@ -165,9 +238,74 @@ def lmodem_set_mode(mode_number):
         lostik.set_cr(mode5_cr)
         lostik.set_wdt(mode5_wdt)
 
+#function: get LoStik settings and limits of an LMODEM mode
+# accepts: mode number (1, 2, 3, 4 or 5)
+# returns: power, bandwidth, spreading factor, block size in bytes and maximum size over the air in bytes
+def lmodem_mode_details(mode_number):
+    if mode_number == 1:
+        return mode1_pwr, mode1_bw, mode1_sf, mode1_block_size // 2, mode1_max_ota_file_size
+    if mode_number == 2:
+        return mode2_pwr, mode2_bw, mode2_sf, mode2_block_size // 2, mode2_max_ota_file_size
+    if mode_number == 3:
+        return mode3_pwr, mode3_bw, mode3_sf, mode3_block_size // 2, mode3_max_ota_file_size
+    if mode_number == 4:
+        return mode4_pwr, mode4_bw, mode4_sf, mode4_block_size // 2, mode4_max_ota_file_size
+    if mode_number == 5:
+        return mode5_pwr, mode5_bw, mode5_sf, mode5_block_size // 2, mode5_max_ota_file_size
+
+#function: display LMODEM mode details
+def display_lmodem_mode(lostik):
+    ui.insert_lmodem_mode(lmodem_get_mode(lostik))
+    ui.insert_bandwidth(lostik.get_bw())
+    ui.insert_power(lostik.get_pwr())
+    ui.insert_spreading_factor(lostik.get_sf())
+    ui.insert_coding_rate(lostik.get_cr())
+
+#function: add to the session totals of the telemetry log, if one is kept
+# accepts: LoStik object and totals (keyword arguments)
+def add_telemetry(lostik, **totals):
+    if lostik.telemetry is not None:
+        lostik.telemetry.add(**totals)
+
+#function: move every LoStik of a station to another mode part way through an adaptive transfer
+# accepts: list of LoStik objects and mode number (1, 2, 3, 4 or 5)
+def lmodem_switch_mode(lostiks, mode_number):
+    for lostik in lostiks:
+        lmodem_set_mode(lostik, mode_number)
+    display_lmodem_mode(lostiks[0])
+    ui.update_status(f'Switched to mode {mode_number}.')
+
+#function: slowest mode an adaptive transfer may use
+# accepts: chosen mode number and size over the air in bytes
+# returns: mode number (the chosen mode if no slower mode can carry the file)
+def lmodem_adaptive_range(mode_number, file_size_ota):
+    slowest_mode = mode_number
+    for candidate_mode in range(mode_number + 1, lmodem_adaptive_slowest_mode + 1):
+        if file_size_ota > lmodem_mode_details(candidate_mode)[4]:
+            break
+        slowest_mode = candidate_mode
+    return slowest_mode
+
+#function: choose the mode of the next round of an adaptive transfer
+# accepts: current mode number, slowest mode allowed, set of modes which failed to connect, block loss of the last
+#          round (0 to 1) and signal-to-noise ratio of the last packet heard in dB (None if unknown)
+# returns: mode number
+def lmodem_adaptive_mode(mode_number, slowest_mode, failed_modes, block_loss, snr):
+    if block_loss > lmodem_adaptive_target_loss:
+        return min(mode_number + 1, slowest_mode)
+    if block_loss > 0 or snr is None or mode_number == 1 or mode_number - 1 in failed_modes:
+        return mode_number
+    #predict signal-to-noise ratio in the next faster mode from the change in power and bandwidth (noise)
+    pwr, bw, _, _, _ = lmodem_mode_details(mode_number)
+    faster_pwr, faster_bw, faster_sf, _, _ = lmodem_mode_details(mode_number - 1)
+    predicted_snr = snr + int(faster_pwr) - int(pwr) - 10 * log10(int(faster_bw) / int(bw))
+    if predicted_snr >= lostik.demodulation_floor[faster_sf] + lmodem_adaptive_snr_margin:
+        return mode_number - 1
+    return mode_number
+
 #function: get LMODEM communication mode
 # returns: mode number (1, 2, 3, 4 or 5)
-def lmodem_get_mode():
+def lmodem_get_mode(lostik):
     pwr = lostik.get_pwr()
     bw = lostik.get_bw()
     sf = lostik.get_sf()
@@ -186,412 +324,1811 @@ def lmodem_get_mode():
     ui.update_status('[red1 on deep_sky_blue4][ERROR][/] Failed to get LMODEM mode!')
     exit(1)
 
-#initialize user interface
-ui.console.show_cursor(False)
-ui.splash_k7ctc()
-ui.splash_lmodem()
-ui.print_static_content()
-
-#initialize LoStik
-lmodem_set_channel(args.channel)
-lmodem_set_mode(args.mode)
-
-#display LMODEM channel details
-ui.insert_lmodem_channel(lmodem_get_channel())
-ui.insert_frequency(lostik.get_freq())
-
-#display LMODEM mode details
-ui.insert_lmodem_mode(lmodem_get_mode())
-ui.insert_bandwidth(lostik.get_bw())
-ui.insert_power(lostik.get_pwr())
-ui.insert_spreading_factor(lostik.get_sf())
-ui.insert_coding_rate(lostik.get_cr())
-
-#allow CTRL+C to gracefully terminate LMODEM
-try:
-    #sending file
-    if args.send:
-        outgoing_file = args.send
-
-        #display outgoing file name
-        ui.insert_file_name(outgoing_file)
-
-        #check if outgoing file actually exists
-        if not Path(outgoing_file).is_file():
-            ui.update_status('[red1 on deep_sky_blue4][ERROR][/] File does not exist!')
-            exit(1)
+#function: build binary packet header
+# accepts: session id (0-255) and block index
+# returns: session byte followed by block index as varint (hexadecimal string)
+def encode_packet_header(session_id, block_index):
+    return (bytes([session_id]) + encode_varint(block_index)).hex()
 
-        #check if outgoing file name exceeds LMODEM maximum length of 32 characters
-        if len(outgoing_file) > 32:
-            ui.update_status('[red1 on deep_sky_blue4][ERROR][/] File name exceeds 32 character limit!')
-            exit(1)
+#function: parse binary packet header
+# accepts: packet as hexadecimal string
+# returns: session id, block index and block (hexadecimal string) or None if packet is malformed
+def decode_packet_header(packet):
+    try:
+        header = bytes.fromhex(packet[:2 * lmodem_max_header_length])
+    except ValueError:
+        return None
+    try:
+        block_index, position = decode_varint(header, 1)
+    except IndexError:
+        return None
+    return header[0], block_index, packet[2 * position:]
 
-        #generate secure hash hex digest for outgoing file
-        with open(outgoing_file, 'rb') as file:
-            outgoing_file_secure_hash = blake2b(digest_size=16)
-            outgoing_file_secure_hash.update(file.read())
-            outgoing_file_secure_hash_hex_digest = outgoing_file_secure_hash.hexdigest()
-            del outgoing_file_secure_hash
-
-        #compress outgoing file (in memory) using lzma algorithm
-        with open(outgoing_file, 'rb') as file:
-            outgoing_file_compressed = lzma.compress(file.read())
-
-        # #determine outgoing file size over the air in bytes
-        outgoing_file_size_ota = len(outgoing_file_compressed)
-
-        #display outgoing file size over the air
-        ui.insert_file_size_ota(outgoing_file_size_ota)
-
-        #check if outgoing file size over-the-air exceeds LMODEM maximum for chosen mode
-        maximum_ota_file_size = 0
-        if args.mode == 1:
-            maximum_ota_file_size = mode1_max_ota_file_size
-        if args.mode == 2:
-            maximum_ota_file_size = mode2_max_ota_file_size
-        if args.mode == 3:
-            maximum_ota_file_size = mode3_max_ota_file_size
-        if args.mode == 4:
-            maximum_ota_file_size = mode4_max_ota_file_size
-        if args.mode == 5:
-            maximum_ota_file_size = mode5_max_ota_file_size
-        if outgoing_file_size_ota > maximum_ota_file_size:
-            ui.update_status(f'[red1 on deep_sky_blue4][ERROR][/] Size (over the air) exceeds maximum of {maximum_ota_file_size} bytes for mode {args.mode}!')
-            exit(1)
-        del maximum_ota_file_size
-
-        #determine outgoing file size on disk in bytes
-        outgoing_file_size_on_disk = Path(outgoing_file).stat().st_size
-
-        #display outgoing file size on disk
-        ui.insert_file_size_on_disk(outgoing_file_size_on_disk)
-
-        #convert compressed outgoing file to hex
-        outgoing_file_compressed_hex = outgoing_file_compressed.hex()
-        del outgoing_file_compressed
-
-        #split hex encoded base85 encoded compressed outgoing file into blocks sized for chosen mode
-        block_size = 0
-        if args.mode == 1:
-            block_size = mode1_block_size
-        if args.mode == 2:
-            block_size = mode2_block_size
-        if args.mode == 3:
-            block_size = mode3_block_size
-        if args.mode == 4:
-            block_size = mode4_block_size
-        if args.mode == 5:
-            block_size = mode5_block_size
-
-        blocks = textwrap.wrap(outgoing_file_compressed_hex, block_size)
-        del block_size, outgoing_file_compressed_hex
-
-        #obtain block count
-        block_count = len(blocks)
-
-        #concatenate zero filled block index and block contents to create numbered packets
-        packets = []
-        for block in blocks:
-            block_index_zfill = str(blocks.index(block)).zfill(3)
-            block_index_zfill_hex = block_index_zfill.encode('ASCII').hex()
-            del block_index_zfill
-            packet = block_index_zfill_hex + block
-            packets.append(packet)
-        del blocks
-
-        #sub function: send requested blocks
-        #     accepts: received block count, requested blocks list
-        def send_requested_blocks(received_block_count, requested_blocks):
-            ui.update_status('Transmitting requested blocks.')
-            ui.move_cursor(21,1)
-            progress = rich.progress.Progress(rich.progress.BarColumn(bar_width=59),
-                                            rich.progress.TaskProgressColumn(),
-                                            rich.progress.TimeRemainingColumn(),
-                                            rich.progress.TimeElapsedColumn())
-            task = progress.add_task('Send Requested Blocks', total=block_count)
-            with progress:
-                sent_block_count = 0
-                progress.update(task, completed=received_block_count+sent_block_count)
-                for block_number in requested_blocks:
-                    lostik.tx(packets[int(block_number)])
-                    sent_block_count += 1
-                    progress.update(task, completed=received_block_count+sent_block_count)
+#function: get block number of a packet from this session (recorded in the telemetry log)
+# accepts: session id (0-255) and packet as hexadecimal string
+# returns: block index or None if the packet is malformed or from another session
+def packet_block_number(session_id, packet):
+    header = decode_packet_header(packet)
+    if header is None or header[0] != session_id:
+        return None
+    return header[1]
+
+#function: build negative acknowledgement (NAK) listing missing blocks
+# accepts: BlockStore of received blocks, receive re-arm latency in seconds (None if unknown) and
+#          maximum length in bytes
+#  option: mode_number - mode of the coming round (adaptive transfer, 0 otherwise)
+#  option: max_requested - most blocks to request (None for as many as fit)
+# returns: NAK control character | received block count (varint) | re-arm latency in ms (varint, 0 if unknown)
+#          | mode (varint, 0 unless adaptive) | encoding | missing blocks
+#          encoding 0 = bitmap, bit n (least significant first) set when block n is missing
+#          encoding 1 = runs, varint pairs (received blocks to skip, missing blocks to request)
+#          the encoding requesting more blocks (then the shorter) is chosen, blocks that do not fit are
+#          requested in a later round
+def encode_negative_acknowledgement(received_blocks, rearm_time, max_length, mode_number=0, max_requested=None):
+    rearm_time_ms = round(rearm_time * 1000) if rearm_time is not None else 0
+    prefix = (lmodem_negative_acknowledgement + encode_varint(received_blocks.received_count) + encode_varint(rearm_time_ms)
+              + encode_varint(mode_number))
+    body_length = max_length - len(prefix) - 1
+    bitmap = int.from_bytes(received_blocks.missing_bitmap()[:body_length], 'little')
+    #later blocks are left for a later round
+    while max_requested is not None and bitmap.bit_count() > max_requested:
+        bitmap &= ~(1 << (bitmap.bit_length() - 1))
+    bitmap_requested = bitmap.bit_count()
+    bitmap = bitmap.to_bytes(body_length, 'little').rstrip(b'\x00')
+    runs = bytearray()
+    runs_requested = 0
+    block_number = 0
+    for run_start, run in received_blocks.missing_runs():
+        if max_requested is not None:
+            run = min(run, max_requested - runs_requested)
+            if not run:
+                break
+        pair = encode_varint(run_start - block_number) + encode_varint(run)
+        if len(runs) + len(pair) > body_length:
+            break
+        runs.extend(pair)
+        runs_requested += run
+        block_number = run_start + run
+    if (runs_requested, -len(runs)) > (bitmap_requested, -len(bitmap)):
+        return prefix + b'\x01' + bytes(runs)
+    return prefix + b'\x00' + bitmap
+
+#function: parse negative acknowledgement
+# accepts: packet as bytes and block count
+# returns: received block count, re-arm latency in seconds (None if unknown), mode of the coming round (0 unless
+#          adaptive) and list of requested block numbers or None if packet is not a NAK
+def decode_negative_acknowledgement(packet, block_count):
+    if not packet.startswith(lmodem_negative_acknowledgement):
+        return None
+    try:
+        received_block_count, position = decode_varint(packet, len(lmodem_negative_acknowledgement))
+        rearm_time_ms, position = decode_varint(packet, position)
+        mode_number, position = decode_varint(packet, position)
+        encoding = packet[position]
+        body = packet[position+1:]
+        requested_blocks = []
+        if encoding == 0:
+            for block_number in range(min(len(body) * 8, block_count)):
+                if body[block_number // 8] & (1 << (block_number % 8)):
+                    requested_blocks.append(block_number)
+        elif encoding == 1:
+            block_number = 0
+            position = 0
+            while position < len(body):
+                skip, position = decode_varint(body, position)
+                run, position = decode_varint(body, position)
+                block_number += skip
+                requested_blocks.extend(range(block_number, min(block_number + run, block_count)))
+                block_number += run
+        else:
+            return None
+    except IndexError:
+        return None
+    return received_block_count, rearm_time_ms / 1000 if rearm_time_ms else None, mode_number, requested_blocks
+
+#function: build session open frame (the file transfer details, which also answer the receive station's handshake)
+# accepts: file name, size on disk, size over the air, secure hash hex digest, session id, FEC group size, FEC parity,
+#          LoStik count, codec id and slowest adaptive mode (0 unless adaptive)
+#  option: payload (bytes) - the whole compressed file, for a file small enough to travel within the frame
+# returns: SESSION OPEN control character | size on disk (varint) | size over the air (varint) | secure hash (16 bytes) | session id (1 byte) | FEC group size (varint) | FEC parity (varint) | LoStik count (1 byte)
+#          | codec id (1 byte) | slowest adaptive mode (1 byte) | file name length (1 byte) | file name (UTF-8)
+#          | payload (the rest of the packet, only if present)
+#          block count is left out, each station derives it from the size over the air and the block size
+def encode_session_open(file_name, size_on_disk, size_ota, secure_hash_hex_digest, session_id, fec_group_size,
+                        fec_parity, lostik_count, codec_id, slowest_mode, payload=b''):
+    file_name = file_name.encode('UTF-8')
+    return (lmodem_session_open + encode_varint(size_on_disk) + encode_varint(size_ota)
+            + bytes.fromhex(secure_hash_hex_digest) + bytes([session_id]) + encode_varint(fec_group_size)
+            + encode_varint(fec_parity) + bytes([lostik_count, codec_id, slowest_mode, len(file_name)]) + file_name + payload)
+
+#function: parse session open frame
+# accepts: packet as bytes
+# returns: file name, size on disk, size over the air, secure hash hex digest, session id, FEC group size, FEC parity,
+#          LoStik count, codec id, slowest adaptive mode and payload (None unless the whole compressed file
+#          is present), or None if packet is not a session open frame
+def decode_session_open(packet):
+    if not packet.startswith(lmodem_session_open):
+        return None
+    try:
+        size_on_disk, position = decode_varint(packet, len(lmodem_session_open))
+        size_ota, position = decode_varint(packet, position)
+        secure_hash_hex_digest = packet[position:position+16].hex()
+        session_id = packet[position+16]
+        fec_group_size, position = decode_varint(packet, position + 17)
+        fec_parity, position = decode_varint(packet, position)
+        lostik_count, codec_id, slowest_mode, name_length = packet[position:position+4]
+        position += 4
+        file_name = packet[position:position+name_length].decode('UTF-8')
+        position += name_length
+    except (IndexError, ValueError):
+        return None
+    if len(secure_hash_hex_digest) != 32 or not file_name or position > len(packet):
+        return None
+    payload = bytes(packet[position:])
+    if len(payload) != size_ota:
+        payload = None
+    return (file_name, size_on_disk, size_ota, secure_hash_hex_digest, session_id, fec_group_size, fec_parity,
+            lostik_count, codec_id, slowest_mode, payload)
+
+#function: determine whether a packet answers the receive station's handshake (the send station's first packet)
+# accepts: packet as bytes
+# returns: boolean
+def is_handshake_reply(packet):
+    return (decode_session_open(packet) is not None or decode_manifest_fragment(packet) is not None
+            or decode_survey(packet) == (survey_start, []))
+
+#function: build batch manifest, split into fragments that each fit a single packet
+# accepts: list of (file name, secure hash hex digest) and maximum length in bytes
+# returns: list of fragments, each MANIFEST control character | fragment index (varint) | fragment count (varint)
+#          | entries, each name length (1 byte) | name (UTF-8) | secure hash (16 bytes)
+def encode_manifest(entries, max_length):
+    #fragment index and count take at most two bytes each
+    body_length = max_length - len(lmodem_manifest) - 4
+    bodies = [b'']
+    for file_name, secure_hash_hex_digest in entries:
+        file_name = file_name.encode('UTF-8')
+        entry = bytes([len(file_name)]) + file_name + bytes.fromhex(secure_hash_hex_digest)
+        if bodies[-1] and len(bodies[-1]) + len(entry) > body_length:
+            bodies.append(b'')
+        bodies[-1] += entry
+    return [lmodem_manifest + encode_varint(fragment_index) + encode_varint(len(bodies)) + body
+            for fragment_index, body in enumerate(bodies)]
+
+#function: parse batch manifest fragment
+# accepts: packet as bytes
+# returns: fragment index, fragment count and list of (file name, secure hash hex digest)
+#          or None if packet is not a manifest fragment
+def decode_manifest_fragment(packet):
+    if not packet.startswith(lmodem_manifest):
+        return None
+    try:
+        fragment_index, position = decode_varint(packet, len(lmodem_manifest))
+        fragment_count, position = decode_varint(packet, position)
+        entries = []
+        while position < len(packet):
+            name_length = packet[position]
+            file_name = packet[position+1:position+1+name_length].decode('UTF-8')
+            position += 1 + name_length
+            secure_hash = packet[position:position+16]
+            if len(secure_hash) != 16:
+                return None
+            entries.append((file_name, secure_hash.hex()))
+            position += 16
+    except (IndexError, UnicodeDecodeError):
+        return None
+    if fragment_index >= fragment_count:
+        return None
+    return fragment_index, fragment_count, entries
+
+#function: build reply to a batch manifest fragment
+# accepts: fragment index and list of needed flags (one per entry)
+# returns: MANIFEST control character | fragment index (varint) | needed bitmap
+#          bit n (least significant first) set when the receive station lacks file n (or holds a different version)
+def encode_manifest_reply(fragment_index, needed):
+    bitmap = bytearray((len(needed) + 7) // 8)
+    for entry_number, flag in enumerate(needed):
+        if flag:
+            bitmap[entry_number // 8] |= 1 << (entry_number % 8)
+    return lmodem_manifest + encode_varint(fragment_index) + bytes(bitmap)
+
+#function: parse reply to a batch manifest fragment
+# accepts: packet as bytes, fragment index and number of entries in the fragment
+# returns: list of needed flags or None if packet is not the reply to this fragment
+def decode_manifest_reply(packet, fragment_index, entry_count):
+    if not packet.startswith(lmodem_manifest):
+        return None
+    try:
+        reply_fragment_index, position = decode_varint(packet, len(lmodem_manifest))
+    except IndexError:
+        return None
+    bitmap_length = (entry_count + 7) // 8
+    if reply_fragment_index != fragment_index or len(packet) != position + bitmap_length:
+        return None
+    needed_bitmap = packet[position:]
+    return [bool(needed_bitmap[entry_number // 8] & (1 << (entry_number % 8))) for entry_number in range(entry_count)]
+
+#function: build delta signature fragments, each fitting a single packet
+# accepts: packed signatures (bytes), chunk size in bytes and maximum length in bytes
+# returns: list of fragments, each SYN control character | fragment index (varint) | fragment count (varint)
+#          | chunk size (varint) | whole signature entries
+def encode_signature_fragments(signatures, chunk_size, max_length):
+    prefix_length = len(lmodem_signature) + 4 + len(encode_varint(chunk_size))
+    #fragment index and count take at most two bytes each, entries are never split
+    body_length = (max_length - prefix_length) // delta.signature_entry_length * delta.signature_entry_length
+    bodies = [signatures[position:position+body_length] for position in range(0, len(signatures), body_length)] or [b'']
+    return [lmodem_signature + encode_varint(fragment_index) + encode_varint(len(bodies)) + encode_varint(chunk_size) + body
+            for fragment_index, body in enumerate(bodies)]
+
+#function: parse delta signature fragment
+# accepts: packet as bytes
+# returns: fragment index, fragment count, chunk size and packed signatures or None if packet is not a signature fragment
+def decode_signature_fragment(packet):
+    if not packet.startswith(lmodem_signature):
+        return None
+    try:
+        fragment_index, position = decode_varint(packet, len(lmodem_signature))
+        fragment_count, position = decode_varint(packet, position)
+        chunk_size, position = decode_varint(packet, position)
+    except IndexError:
+        return None
+    signatures = packet[position:]
+    if fragment_index >= fragment_count or chunk_size == 0 or len(signatures) % delta.signature_entry_length:
+        return None
+    return fragment_index, fragment_count, chunk_size, signatures
+
+#function: build reply to a delta signature fragment
+# accepts: fragment index
+#  option: delta_size and codec_id - size over the air and codec of the delta, sent in reply to the final fragment
+# returns: SYN control character | fragment index (varint) [| delta size over the air (varint) | codec id (varint)]
+def encode_signature_reply(fragment_index, delta_size=None, codec_id=None):
+    reply = lmodem_signature + encode_varint(fragment_index)
+    if delta_size is not None:
+        reply += encode_varint(delta_size) + encode_varint(codec_id)
+    return reply
+
+#function: parse reply to a delta signature fragment
+# accepts: packet as bytes and fragment index
+# returns: delta size over the air and codec id (both None when only acknowledging the fragment)
+#          or None if packet is not the reply to this fragment
+def decode_signature_reply(packet, fragment_index):
+    if not packet.startswith(lmodem_signature):
+        return None
+    try:
+        reply_fragment_index, position = decode_varint(packet, len(lmodem_signature))
+        if reply_fragment_index != fragment_index:
+            return None
+        if position == len(packet):
+            return None, None
+        delta_size, position = decode_varint(packet, position)
+        codec_id, position = decode_varint(packet, position)
+    except IndexError:
+        return None
+    if position != len(packet):
+        return None
+    return delta_size, codec_id
+
+#function: build request for a chunk list fragment
+# accepts: fragment index
+#  option: held - list of held flags for the previous fragment's chunks
+# returns: GS control character | fragment index (varint) | held bitmap of the previous fragment
+#          bit n (least significant first) set when the receive station holds chunk n of the previous fragment
+def encode_chunk_list_request(fragment_index, held=()):
+    bitmap = bytearray((len(held) + 7) // 8)
+    for chunk_number, flag in enumerate(held):
+        if flag:
+            bitmap[chunk_number // 8] |= 1 << (chunk_number % 8)
+    return lmodem_chunk_list + encode_varint(fragment_index) + bytes(bitmap)
+
+#function: parse request for a chunk list fragment
+# accepts: packet as bytes
+# returns: fragment index and held bitmap of the previous fragment or None if packet is not a chunk list request
+def decode_chunk_list_request(packet):
+    if not packet.startswith(lmodem_chunk_list):
+        return None
+    try:
+        fragment_index, position = decode_varint(packet, len(lmodem_chunk_list))
+    except IndexError:
+        return None
+    return fragment_index, packet[position:]
+
+#function: number of chunk hashes carried by each chunk list fragment
+# accepts: maximum length in bytes
+# returns: int
+def chunk_list_fragment_capacity(max_length):
+    #fragment index and count take at most two bytes each
+    return (max_length - len(lmodem_chunk_list) - 4) // chunkstore.chunk_hash_length
+
+#function: determine whether a chunk list exchange can pay for itself
+# accepts: block count of the file as it would otherwise be sent and number of chunk list fragments
+# returns: boolean
+# Each fragment costs a request and a reply, and the final request and result two packets more.  Even with
+# every chunk held the exchange must save more blocks than the packets it adds.
+def chunk_list_pays(block_count, fragment_count):
+    return block_count > 2 * (fragment_count + 1)
+
+#function: build chunk list fragments, each fitting a single packet
+# accepts: list of chunk hashes and maximum length in bytes
+# returns: list of fragments, each GS control character | fragment index (varint) | fragment count (varint) | chunk hashes
+def encode_chunk_list(chunk_hashes, max_length):
+    chunks_per_fragment = chunk_list_fragment_capacity(max_length)
+    bodies = [b''.join(chunk_hashes[position:position+chunks_per_fragment])
+              for position in range(0, len(chunk_hashes), chunks_per_fragment)] or [b'']
+    return [lmodem_chunk_list + encode_varint(fragment_index) + encode_varint(len(bodies)) + body
+            for fragment_index, body in enumerate(bodies)]
+
+#function: build final reply to chunk list requests, sent once every fragment's held flags are known
+# accepts: fragment count, size over the air and codec id of the file as it will be sent
+# returns: GS control character | fragment count (varint) | fragment count (varint) | size over the air (varint) | codec id (varint)
+def encode_chunk_list_result(fragment_count, size_ota, codec_id):
+    return lmodem_chunk_list + encode_varint(fragment_count) + encode_varint(fragment_count) + encode_varint(size_ota) + encode_varint(codec_id)
+
+#function: parse chunk list fragment or final reply
+# accepts: packet as bytes and requested fragment index
+# returns: fragment count, list of chunk hashes (empty for the final reply) and size over the air and codec id
+#          (None unless the final reply) or None if packet is not the reply to this request
+def decode_chunk_list_fragment(packet, fragment_index):
+    if not packet.startswith(lmodem_chunk_list):
+        return None
+    try:
+        reply_fragment_index, position = decode_varint(packet, len(lmodem_chunk_list))
+        fragment_count, position = decode_varint(packet, position)
+        if reply_fragment_index != fragment_index or fragment_index > fragment_count:
+            return None
+        if fragment_index == fragment_count:
+            size_ota, position = decode_varint(packet, position)
+            codec_id, position = decode_varint(packet, position)
+            if position != len(packet):
+                return None
+            return fragment_count, [], (size_ota, codec_id)
+    except IndexError:
+        return None
+    body = packet[position:]
+    if len(body) % chunkstore.chunk_hash_length:
+        return None
+    return fragment_count, [bytes(body[position:position+chunkstore.chunk_hash_length])
+                            for position in range(0, len(body), chunkstore.chunk_hash_length)], None
+
+#survey packet types, each survey packet is ENQ control character | type | fields
+survey_start = 0       #no fields, echoed by the receive station before both begin the sweep
+survey_probe = 1       #channel number
+survey_reply = 2       #channel number | RSSI of the probe (signed byte, dBm) | SNR of the probe (signed byte, dB)
+survey_select = 3      #channel number, echoed by the receive station before both move to that channel
+
+#function: build channel survey packet
+# accepts: packet type and fields (integers, signed fields clamped to a signed byte)
+# returns: bytes
+def encode_survey(packet_type, *fields):
+    return lmodem_survey + bytes([packet_type]) + b''.join(max(-128, min(127, field)).to_bytes(1, 'little', signed=True)
+                                                           for field in fields)
+
+#function: parse channel survey packet
+# accepts: packet as bytes
+# returns: packet type and list of fields (signed integers) or None if packet is not a survey packet
+def decode_survey(packet):
+    if not packet.startswith(lmodem_survey) or len(packet) < 2:
+        return None
+    return packet[1], [int.from_bytes(packet[position:position+1], 'little', signed=True) for position in range(2, len(packet))]
+
+#function: length of each channel's turn in the survey sweep (identical at both stations, which share a mode)
+# accepts: LoStik object
+# returns: seconds (float)
+def survey_slot_time(lostik_device):
+    #a probe and its reply, each with host side overhead
+    exchange_time = 2 * (lostik.time_on_air(len(encode_survey(survey_reply, 0, 0, 0)), lostik_device.get_sf(), lostik_device.get_bw(),
+                                            lostik_device.get_cr())
+                         + lmodem_packet_overhead)
+    return lmodem_survey_slot_probes * (int(lostik_device.get_wdt()) / 1000 + exchange_time)
+
+#function: survey every channel and agree the best with the receive station (the send station leads)
+# accepts: list of LoStik objects (the first surveys, the rest follow on consecutive channels) and channel number
+# returns: channel number chosen (the channel given if the survey could not be completed)
+def survey_channels(lostiks, channel_number):
+    lostik = lostiks[0]
+    ui.update_status('Surveying channels.')
+    wdt = int(lostik.get_wdt()) / 1000
+    slot_time = survey_slot_time(lostik)
+    exchange_time = slot_time / lmodem_survey_slot_probes - wdt
+
+    #receive station echoes the start, both then visit each channel in turn on the same schedule
+    timeout_counter = 0
+    while True:
+        lostik.tx(encode_survey(survey_start).hex())
+        reply = lostik.rx()
+        if reply != 'TIME-OUT' and decode_survey(bytes.fromhex(reply)) == (survey_start, []):
+            break
+        if reply != 'TIME-OUT' and bytes.fromhex(reply) == b'READY':
+            #receive station missed the start (it answers the handshake), repeat it
+            continue
+        timeout_counter += 1
+        if timeout_counter == lmodem_max_reply_timeouts:
+            ui.update_status(f'[orange1 on deep_sky_blue4][WARNING][/] Channel survey not acknowledged. Staying on channel {channel_number}.')
+            return channel_number
+    sweep_start = monotonic()
+    del timeout_counter
+
+    #each channel is scored by its share of probes answered, then the weaker direction's SNR, then its noise
+    scores = {}
+    for survey_channel in range(1, 6):
+        lmodem_set_channel(lostik, survey_channel)
+        slot_end = sweep_start + survey_channel * slot_time
+        sleep(max(slot_end - slot_time + lmodem_survey_guard - monotonic(), 0.0))
+        probe_count = 0
+        snrs = []
+        noises = []
+        #a probe is only sent if its reply (or time-out) is due before the channel's turn ends
+        while slot_end - monotonic() >= wdt + exchange_time:
+            lostik.tx(encode_survey(survey_probe, survey_channel).hex())
+            probe_count += 1
+            reply = lostik.rx()
+            if reply == 'TIME-OUT':
+                continue
+            survey_packet = decode_survey(bytes.fromhex(reply))
+            if survey_packet is None or survey_packet[0] != survey_reply or survey_packet[1][:1] != [survey_channel]:
+                continue
+            _, (_, probe_rssi, probe_snr) = survey_packet
+            try:
+                reply_rssi = int(lostik.get_rssi())
+                reply_snr = int(lostik.get_snr())
+            except ValueError:
+                continue
+            snrs.append(min(probe_snr, reply_snr))
+            #noise estimated as signal strength less signal-to-noise ratio
+            noises.append(max(probe_rssi - probe_snr, reply_rssi - reply_snr))
+        if snrs:
+            scores[survey_channel] = (len(snrs) / probe_count, sum(snrs) / len(snrs), -sum(noises) / len(noises))
+            ui.update_status(f'Channel {survey_channel}: {len(snrs)} of {probe_count} probes answered, SNR {scores[survey_channel][1]:.0f} dB, '
+                             f'noise {-scores[survey_channel][2]:.0f} dBm.')
+        else:
+            ui.update_status(f'Channel {survey_channel}: {probe_count} probes unanswered.')
+        del probe_count, snrs, noises
+    lmodem_set_channel(lostik, channel_number)
+    sleep(max(sweep_start + 5 * slot_time - monotonic(), 0.0))
+
+    #best channel, the channel given wins a tie (no move needed)
+    if not scores:
+        ui.update_status(f'[orange1 on deep_sky_blue4][WARNING][/] No channel answered the survey. Staying on channel {channel_number}.')
+        return channel_number
+    best_channel = max(scores, key=lambda survey_channel: (scores[survey_channel], survey_channel == channel_number))
+    del scores
+
+    #receive station echoes the choice then moves, the send station follows once it hears the echo
+    timeout_counter = 0
+    while True:
+        lostik.tx(encode_survey(survey_select, best_channel).hex())
+        reply = lostik.rx()
+        if reply != 'TIME-OUT' and decode_survey(bytes.fromhex(reply)) == (survey_select, [best_channel]):
+            break
+        timeout_counter += 1
+        if timeout_counter == lmodem_max_reply_timeouts:
+            ui.update_status(f'[orange1 on deep_sky_blue4][WARNING][/] Channel choice not acknowledged. Staying on channel {channel_number}.')
+            return channel_number
+    del timeout_counter
+    for stripe, striped_lostik in enumerate(lostiks):
+        lmodem_set_channel(striped_lostik, lmodem_stripe_channel(best_channel, stripe))
+    ui.insert_lmodem_channel(best_channel)
+    ui.insert_frequency(lostik.get_freq())
+    ui.update_status(f'Channel survey complete. Moved to channel {best_channel}.')
+    return best_channel
+
+#function: take part in the send station's channel survey, once its start has been heard
+# accepts: LoStik object (the first of the station) and channel number the survey began on
+def respond_to_survey(lostik, channel_number):
+    ui.update_status('Send station is surveying channels.')
+    lostik.tx(encode_survey(survey_start).hex())
+    sweep_start = monotonic()
+    mode_wdt = lostik.get_wdt()
+    slot_time = survey_slot_time(lostik)
+    for survey_channel in range(1, 6):
+        lmodem_set_channel(lostik, survey_channel)
+        slot_end = sweep_start + survey_channel * slot_time
+        #listen until the channel's turn ends, never past it
+        while (remaining_time := slot_end - monotonic()) > lmodem_survey_guard:
+            lostik.set_wdt(round(remaining_time * 1000))
+            packet = lostik.rx()
+            if packet == 'TIME-OUT':
+                continue
+            survey_packet = decode_survey(bytes.fromhex(packet))
+            if survey_packet != (survey_probe, [survey_channel]):
+                continue
+            try:
+                lostik.tx(encode_survey(survey_reply, survey_channel, int(lostik.get_rssi()), int(lostik.get_snr())).hex())
+            except ValueError:
+                continue
+    lostik.set_wdt(mode_wdt)
+    lmodem_set_channel(lostik, channel_number)
+    sleep(max(sweep_start + 5 * slot_time - monotonic(), 0.0))
+    ui.update_status('Channel sweep complete. Awaiting channel choice.')
+
+#function: hash and compress an outgoing file, or fetch both from the payload cache if it was sent before
+# accepts: outgoing file path, size on disk in bytes and maximum size over the air in bytes
+#  option: payload_cache (PayloadCache) - reuse the compressed file from an earlier send
+# returns: secure hash hex digest, codec id and compressed file (None if no codec fits the maximum size)
+def prepare_outgoing_file(outgoing_file, outgoing_file_size_on_disk, maximum_ota_file_size, payload_cache=None):
+    #a file sent before (and unchanged since) needs neither hashing nor compressing again
+    #the key is taken before the file is read, so a change part way through misses the cache next time
+    cache_key = payload_cache.key(outgoing_file) if payload_cache is not None else None
+    cached_payload = payload_cache.get(cache_key) if payload_cache is not None else None
+    if cached_payload:
+        ui.update_status('Compressed file found in cache.')
+        return cached_payload
+
+    #generate outgoing file secure hash hex digest and compress outgoing file with every codec, in a single read
+    #each codec gives up as soon as its output can no longer fit, rather than compressing all of it
+    ui.update_status('Compressing file.')
+    outgoing_file_secure_hash = blake2b(digest_size=16)
+    parallel_compression = outgoing_file_size_on_disk >= lmodem_parallel_compression_size and (os.cpu_count() or 1) > 1
+    codec_id, outgoing_file_compressed = codec.compress_smallest(outgoing_file, maximum_ota_file_size, lmodem_read_chunk_size,
+                                                                 parallel=parallel_compression, hash=outgoing_file_secure_hash)
+    #a file no codec fits is never sent, and its hash stops short with the read
+    outgoing_file_secure_hash_hex_digest = outgoing_file_secure_hash.hexdigest() if outgoing_file_compressed is not None else None
+    del outgoing_file_secure_hash
+    del parallel_compression
+
+    #the smallest output does not depend on the size limit, so it serves every mode
+    if payload_cache is not None and outgoing_file_compressed is not None:
+        payload_cache.put(cache_key, outgoing_file_secure_hash_hex_digest, codec_id, outgoing_file_compressed)
+    return outgoing_file_secure_hash_hex_digest, codec_id, outgoing_file_compressed
+
+#function: send a file to the receiving station
+# accepts: LoStik object, outgoing file path and mode number (1, 2, 3, 4 or 5)
+#  option: forward_error_correction (boolean) - append Reed-Solomon parity blocks to each group of blocks
+#  option: additional_lostiks (list) - LoStik objects on further channels sharing every block burst
+#  option: payload_cache (PayloadCache) - reuse the compressed file from an earlier send
+#  option: handshake (boolean) - perform the basic handshake (False when part of a batch already connected)
+#  option: prepared (tuple) - result of prepare_outgoing_file(), if the file has already been hashed and compressed
+#  option: adaptive (boolean) - let the receive station move both stations between modes as the link allows
+#  option: survey (boolean) - survey every channel after the handshake and move both stations to the best
+# returns: exit status (0 success, 1 failure)
+def send_file(lostik, outgoing_file, mode, forward_error_correction=False, additional_lostiks=(), payload_cache=None,
+              handshake=True, prepared=None, adaptive=False, survey=False):
+    lostiks = [lostik] + list(additional_lostiks)
+    outgoing_file_name = Path(outgoing_file).name
+
+    #display outgoing file name
+    ui.insert_file_name(outgoing_file_name)
+
+    #check if outgoing file actually exists
+    if not Path(outgoing_file).is_file():
+        ui.update_status('[red1 on deep_sky_blue4][ERROR][/] File does not exist!')
+        return 1
+
+    #check if outgoing file name exceeds LMODEM maximum length of 32 characters
+    if len(outgoing_file_name) > 32:
+        ui.update_status('[red1 on deep_sky_blue4][ERROR][/] File name exceeds 32 character limit!')
+        return 1
+
+    #maximum size over the air for chosen mode
+    maximum_ota_file_size = 0
+    if mode == 1:
+        maximum_ota_file_size = mode1_max_ota_file_size
+    if mode == 2:
+        maximum_ota_file_size = mode2_max_ota_file_size
+    if mode == 3:
+        maximum_ota_file_size = mode3_max_ota_file_size
+    if mode == 4:
+        maximum_ota_file_size = mode4_max_ota_file_size
+    if mode == 5:
+        maximum_ota_file_size = mode5_max_ota_file_size
+
+    #determine outgoing file size on disk in bytes
+    outgoing_file_size_on_disk = Path(outgoing_file).stat().st_size
+
+    #hash and compress outgoing file (a batch has already done so before its handshake)
+    if prepared is None:
+        prepared = prepare_outgoing_file(outgoing_file, outgoing_file_size_on_disk, maximum_ota_file_size, payload_cache)
+    outgoing_file_secure_hash_hex_digest, codec_id, outgoing_file_compressed = prepared
+    del prepared
+
+    #determine outgoing file size over the air in bytes
+    if outgoing_file_compressed is None or len(outgoing_file_compressed) > maximum_ota_file_size:
+        ui.update_status(f'[red1 on deep_sky_blue4][ERROR][/] Size (over the air) exceeds maximum of {maximum_ota_file_size} bytes for mode {mode}!')
+        return 1
+    outgoing_file_size_ota = len(outgoing_file_compressed)
+
+    #display outgoing file size over the air
+    ui.insert_file_size_ota(outgoing_file_size_ota)
+
+    #display outgoing file size on disk
+    ui.insert_file_size_on_disk(outgoing_file_size_on_disk)
+
+    #block size (in bytes) for chosen mode
+    block_size = 0
+    if mode == 1:
+        block_size = mode1_block_size // 2
+    if mode == 2:
+        block_size = mode2_block_size // 2
+    if mode == 3:
+        block_size = mode3_block_size // 2
+    if mode == 4:
+        block_size = mode4_block_size // 2
+    if mode == 5:
+        block_size = mode5_block_size // 2
+
+    #an adaptive transfer may use any faster mode, or any slower mode which can carry the file
+    #blocks keep their size for the whole transfer, so they are sized for the slowest mode it may use
+    slowest_mode = 0
+    if adaptive == True:
+        slowest_mode = lmodem_adaptive_range(mode, outgoing_file_size_ota)
+        block_size = lmodem_mode_details(slowest_mode)[3]
+
+    #obtain block count (blocks are slices of the compressed file, never copied up front)
+    outgoing_blocks = BlockStore(outgoing_file_size_ota, block_size, data=outgoing_file_compressed)
+    del outgoing_file_compressed
+    block_count = len(outgoing_blocks)
+
+    #random session id allows the receiving station to ignore packets from any other session
+    session_id = random.randrange(256)
+
+    #optionally protect each group of blocks with parity blocks (numbered after the last data block)
+    fec_group_size = 0
+    fec_parity = 0
+    if forward_error_correction == True:
+        if mode == 1:
+            fec_group_size, fec_parity = mode1_fec_group_size, mode1_fec_parity
+        if mode == 2:
+            fec_group_size, fec_parity = mode2_fec_group_size, mode2_fec_parity
+        if mode == 3:
+            fec_group_size, fec_parity = mode3_fec_group_size, mode3_fec_parity
+        if mode == 4:
+            fec_group_size, fec_parity = mode4_fec_group_size, mode4_fec_parity
+        if mode == 5:
+            fec_group_size, fec_parity = mode5_fec_group_size, mode5_fec_parity
+
+    #function: compute parity blocks for every group of outgoing blocks
+    # returns: list of parity blocks (empty unless FEC is enabled)
+    def encode_parity_blocks():
+        parity_blocks = []
+        if not fec_parity:
+            return parity_blocks
+        for group_start in range(0, block_count, fec_group_size):
+            #blocks are zero padded to a common length for encoding
+            group_blocks = [bytes(outgoing_blocks.get(block_number)).ljust(block_size, b'\x00')
+                            for block_number in range(group_start, min(group_start + fec_group_size, block_count))]
+            parity_blocks.extend(fec.encode(group_blocks, fec_parity))
+        return parity_blocks
+
+    parity_blocks = encode_parity_blocks()
+
+    #function: replace the compressed file with compressed instructions (delta or chunk store transfer)
+    # accepts: pieces of the instruction stream (iterable) and function returning this station's copy of a referenced chunk
+    # returns: size over the air and codec id, or None if no codec fits the maximum size
+    def load_instructions(instruction_pieces, read_chunk):
+        nonlocal outgoing_blocks, block_count, parity_blocks
+        #each piece is compressed with every codec and, to check the instructions before relying on them,
+        #used to rebuild the file from this station's copies of the referenced chunks
+        smallest_compression = codec.SmallestCompression(maximum_ota_file_size)
+        rebuilt_file_secure_hash = blake2b(digest_size=16)
+        patcher = delta.Patcher(read_chunk)
+        for piece in instruction_pieces:
+            smallest_compression.compress(piece)
+            rebuilt_file_secure_hash.update(patcher.feed(piece))
+        if rebuilt_file_secure_hash.hexdigest() != outgoing_file_secure_hash_hex_digest or not patcher.is_complete():
+            #never expected, but instructions of literals alone are always correct
+            smallest_compression = codec.SmallestCompression(maximum_ota_file_size)
+            with open(outgoing_file, 'rb') as file:
+                for piece in delta.literal_instructions(file, lmodem_read_chunk_size):
+                    smallest_compression.compress(piece)
+        del rebuilt_file_secure_hash, patcher
+        codec_id, outgoing_file_instructions = smallest_compression.flush()
+        del smallest_compression
+        if outgoing_file_instructions is None:
+            return None
+        #instructions are sent and retransmitted exactly as the whole file would be
+        outgoing_blocks = BlockStore(len(outgoing_file_instructions), block_size, data=outgoing_file_instructions)
+        block_count = len(outgoing_blocks)
+        parity_blocks = encode_parity_blocks()
+        ui.insert_file_size_ota(len(outgoing_file_instructions))
+        return len(outgoing_file_instructions), codec_id
+
+    #function: build numbered packet (binary packet header and block contents) when it is about to be sent
+    # accepts: packet number (data blocks, then parity blocks)
+    # returns: packet as hexadecimal string
+    def build_packet(packet_number):
+        if packet_number < block_count:
+            block = outgoing_blocks.get(packet_number)
+        else:
+            block = parity_blocks[packet_number - block_count]
+        return encode_packet_header(session_id, packet_number) + block.hex()
+
+    #block and parity block numbers sent so far (kept for the telemetry log only)
+    sent_block_numbers = set()
+
+    #sub function: send requested blocks
+    #     accepts: received block count, requested blocks list
+    def send_requested_blocks(received_block_count, requested_blocks):
+        ui.update_status('Transmitting requested blocks.')
+        ui.move_cursor(21,1)
+        progress = ui.create_progress()
+        task = progress.add_task('Send Requested Blocks', total=received_block_count+len(requested_blocks))
+        requested_blocks = list(requested_blocks)
+        #blocks (and parity blocks) sent before in this session are retransmissions
+        if lostik.telemetry is not None:
+            add_telemetry(lostik, rounds=1, block_transmissions=len(requested_blocks),
+                          block_retransmissions=len(sent_block_numbers.intersection(requested_blocks)))
+            sent_block_numbers.update(requested_blocks)
+        #blocks are dealt to the LoStiks in turn, each ends its share with END_OF_TRANSMISSION
+        def send_burst(lostik, stripe):
+            #red LED stays lit for the whole burst, keeping the serial interface free for radio commands
+            lostik.burst_led('red', True)
+            #each packet is queued while the prior one is still on air
+            for block_number in requested_blocks[stripe::len(lostiks)]:
+                lostik.tx(build_packet(int(block_number)), wait=False, block=int(block_number))
+                progress.advance(task)
             lostik.tx('END_OF_TRANSMISSION', encode=True)
-            ui.update_status('All requested blocks have been sent.')
+            lostik.burst_led('red', False)
+        with progress:
+            progress.update(task, completed=received_block_count)
+            run_striped(send_burst, lostiks)
+        ui.update_status('All requested blocks have been sent.')
 
-        #basic handshake
+    #handshake, the first packet sent (channel survey or file transfer details) answers the receive station's READY
+    if handshake:
         ui.update_status('Connecting...')
         while True:
-            if lostik.rx(decode=True) == 'READY':
-                lostik.tx('READY', encode=True, delay=0)
+            reply = lostik.rx()
+            if reply != 'TIME-OUT' and bytes.fromhex(reply) == b'READY':
                 break
+        del reply
         ui.update_status('Connected!')
+        if survey == True:
+            survey_channels(lostiks, lmodem_get_channel(lostik))
 
-        #provide receiving station with the file transfer details
-        #file name | size on disk | size over the air | number of blocks | secure hash
-        file_transfer_details = (outgoing_file + '|' +
-                                str(outgoing_file_size_on_disk) + '|' +
-                                str(outgoing_file_size_ota) + '|' +
-                                str(block_count) + '|' +
-                                outgoing_file_secure_hash_hex_digest)
-        del outgoing_file_size_on_disk, outgoing_file_size_ota, outgoing_file_secure_hash_hex_digest
+    #provide receiving station with the file transfer details in a single binary session open frame
+    file_transfer_details = encode_session_open(outgoing_file_name, outgoing_file_size_on_disk, outgoing_file_size_ota,
+                                                outgoing_file_secure_hash_hex_digest, session_id, fec_group_size, fec_parity,
+                                                len(lostiks), codec_id, slowest_mode)
+    #a file small enough travels whole within the frame (no longer than a block packet of the chosen mode)
+    #and the receive station's result is the only reply
+    payload_embedded = len(file_transfer_details) + outgoing_file_size_ota <= lmodem_mode_details(mode)[3] + lmodem_max_header_length
+    if payload_embedded == True:
+        file_transfer_details += b''.join(bytes(outgoing_blocks.get(block_number)) for block_number in range(block_count))
+    file_transfer_details = file_transfer_details.hex()
+    del outgoing_file_size_on_disk, outgoing_file_size_ota, slowest_mode
+    if payload_embedded == True:
+        ui.update_status('Transmitting file with its transfer details.')
+    else:
         ui.update_status('Transmitting file transfer details.')
-        lostik.tx(file_transfer_details, encode=True)
-        del file_transfer_details
-        ui.update_status('File transfer details sent.')
+    lostik.tx(file_transfer_details)
+    ui.update_status('File transfer details sent.')
 
-        #await initial reply
-        ui.update_status('Awaiting instruction from receive station.')
-        reply = str(lostik.rx(decode=True))
+    #respond to the receive station until the transfer concludes
+    #replies are either a negative acknowledgement (blocks to send) or an ASCII result
+    ui.update_status('Awaiting instruction from receive station.')
+    lostik.set_wdt(lmodem_result_wdt)
+    timeout_counter = 0
+    #adaptive transfer: a mode is confirmed once a reply is heard in it, until then silence means returning to the last
+    current_mode = mode
+    previous_mode = mode
+    mode_confirmed = True
+    signature_fragments = {}
+    delta_reply = None
+    chunk_list = None
+    chunk_list_result = None
+    while True:
+        reply = lostik.rx()
         if reply == 'TIME-OUT':
-            ui.update_status('[red1 on deep_sky_blue4][ERROR][/] LoStik watchdog timer time-out!')
-            exit(1)
-        elif reply == 'DUPLICATE_PASS':
-            ui.update_status('[green1 on deep_sky_blue4][DONE][/] Duplicate file found. Integrity check passed.')
-            exit(0)
-        elif reply == 'DUPLICATE_FAIL':
-            ui.update_status('[red1 on deep_sky_blue4][ERROR][/] Duplicate filename found. Integrity check failed!')
-            exit(1)
-        else:
-            received_block_count = int(reply[:3])
+            timeout_counter += 1
+            if timeout_counter == lmodem_max_reply_timeouts:
+                ui.update_status('[red1 on deep_sky_blue4][ERROR][/] LoStik watchdog timer time-out!')
+                return 1
+            #receive station missed the switch, or cannot be heard in the new mode (it returns to the last mode as well)
+            if not mode_confirmed:
+                current_mode = previous_mode
+                mode_confirmed = True
+                lmodem_switch_mode(lostiks, current_mode)
+                lostik.set_wdt(lmodem_result_wdt)
+            #the result for a file sent within its details may have been lost, the receive station answers them again
+            if payload_embedded == True:
+                lostik.tx(file_transfer_details)
+            continue
+        timeout_counter = 0
+        mode_confirmed = True
+        reply = bytes.fromhex(reply)
+        negative_acknowledgement = decode_negative_acknowledgement(reply, block_count)
+        if negative_acknowledgement is not None:
+            received_block_count, rearm_time, next_mode, requested_blocks = negative_acknowledgement
+            del negative_acknowledgement
+            #pace packets so the receive station is listening again just before the next one begins
+            if rearm_time is not None:
+                for striped_lostik in lostiks:
+                    striped_lostik.tx_delay = max(rearm_time * lmodem_pacing_factor + lmodem_pacing_margin - striped_lostik.tx_overhead, 0.0)
+            del rearm_time
             if received_block_count == 0:
                 ui.update_status('Starting file transfer.')
-                requested_blocks = []
-                for packet in packets:
-                    requested_blocks.append(packets.index(packet))
-                send_requested_blocks(received_block_count, requested_blocks)
-                del requested_blocks
             else:
                 ui.update_status('Resuming file transfer.')
-                requested_block_numbers = reply[3:]
-                requested_blocks = requested_block_numbers.split('|')
+            #parity blocks (if any) accompany every group of a new transfer, or of an adaptive round (requesting a few
+            #groups at a time) each group whose data blocks are all requested
+            if fec_parity and (next_mode or (received_block_count == 0 and len(requested_blocks) == block_count)):
+                requested_block_numbers = set(requested_blocks)
+                requested_blocks = list(requested_blocks)
+                for group, group_start in enumerate(range(0, block_count, fec_group_size)):
+                    if requested_block_numbers.issuperset(range(group_start, min(group_start + fec_group_size, block_count))):
+                        requested_blocks.extend(range(block_count + group * fec_parity, block_count + (group + 1) * fec_parity))
                 del requested_block_numbers
-                send_requested_blocks(received_block_count, requested_blocks)
-                del requested_blocks
-            del received_block_count
-        del reply
-
-        #await reply after sending requested packets
-        ui.update_status('Awaiting transfer result from receive station.')
-        lostik.set_wdt(15000)
-        reply = lostik.rx(decode=True)
-        if reply == 'TIME-OUT':
-            ui.update_status('[red1 on deep_sky_blue4][ERROR][/] LoStik watchdog timer time-out!')
-            exit(1)
+            #adaptive transfer, the receive station has moved to the mode of the coming round
+            if next_mode and next_mode != current_mode:
+                previous_mode = current_mode
+                current_mode = next_mode
+                mode_confirmed = False
+                lmodem_switch_mode(lostiks, current_mode)
+                lostik.set_wdt(lmodem_result_wdt)
+            send_requested_blocks(received_block_count, requested_blocks)
+            del received_block_count, next_mode, requested_blocks
+            ui.update_status('Awaiting transfer result from receive station.')
+            continue
+        #receive station holds a different version, its signatures arrive one fragment at a time
+        signature_fragment = decode_signature_fragment(reply)
+        if signature_fragment is not None:
+            fragment_index, fragment_count, chunk_size, signatures = signature_fragment
+            del signature_fragment
+            if delta_reply is None:
+                signature_fragments[fragment_index] = signatures
+            if delta_reply is None and len(signature_fragments) == fragment_count:
+                ui.update_status('Receive station holds a different version. Encoding changes.')
+                #the file is streamed through the encoder, matched chunks are read back from a second handle
+                matches = {}
+                with open(outgoing_file, 'rb') as file, open(outgoing_file, 'rb') as chunk_file:
+                    def read_matched_chunk(chunk_index):
+                        chunk_file.seek(matches[chunk_index])
+                        return chunk_file.read(chunk_size)
+                    delta_details = load_instructions(delta.encode(file, chunk_size,
+                                                                   delta.decode_signatures(b''.join(signature_fragments[fragment_number]
+                                                                                                    for fragment_number in range(fragment_count))),
+                                                                   matches, lmodem_read_chunk_size),
+                                                      read_matched_chunk)
+                del matches
+                if delta_details is None:
+                    ui.update_status(f'[red1 on deep_sky_blue4][ERROR][/] Size (over the air) exceeds maximum of {maximum_ota_file_size} bytes for mode {mode}!')
+                    return 1
+                ui.update_status('Sending changes only.')
+                delta_reply = encode_signature_reply(fragment_count - 1, *delta_details)
+                del delta_details
+            #the final fragment is answered with the size and codec of the delta (repeated if that reply is lost)
+            if delta_reply is not None and fragment_index == fragment_count - 1:
+                lostik.tx(delta_reply.hex())
+            else:
+                lostik.tx(encode_signature_reply(fragment_index).hex())
+            del fragment_index, fragment_count, chunk_size, signatures
+            continue
+        #receive station keeps a chunk store, it requests the file's chunk list one fragment at a time
+        chunk_list_request = decode_chunk_list_request(reply)
+        if chunk_list_request is not None:
+            fragment_index, held_bitmap = chunk_list_request
+            del chunk_list_request
+            if chunk_list is None:
+                ui.update_status('Receive station keeps a chunk store. Sending chunk list.')
+                with open(outgoing_file, 'rb') as file:
+                    outgoing_chunks = chunkstore.file_chunks(file, lmodem_read_chunk_size)
+                chunk_list = encode_chunk_list([chunk_hash for _, _, chunk_hash in outgoing_chunks], block_size)
+                chunk_list_held = {}
+                #a list too long to pay for itself is declined at once, the final result with no fragments
+                if not chunk_list_pays(block_count, len(chunk_list)):
+                    ui.update_status('Chunk list would cost more than it could save. Sending file as is.')
+                    chunk_list = []
+                    chunk_list_result = encode_chunk_list_result(0, outgoing_blocks.size, codec_id)
+                    del outgoing_chunks
+            #each request carries the held flags for the fragment before it
+            if 0 < fragment_index <= len(chunk_list) and fragment_index - 1 not in chunk_list_held:
+                fragment_chunk_count = len(decode_chunk_list_fragment(chunk_list[fragment_index - 1], fragment_index - 1)[1])
+                chunk_list_held[fragment_index - 1] = [chunk_number // 8 < len(held_bitmap) and bool(held_bitmap[chunk_number // 8] & (1 << (chunk_number % 8)))
+                                                       for chunk_number in range(fragment_chunk_count)]
+                del fragment_chunk_count
+            if fragment_index < len(chunk_list):
+                lostik.tx(chunk_list[fragment_index].hex())
+            elif fragment_index == len(chunk_list) and len(chunk_list_held) == len(chunk_list):
+                if chunk_list_result is None:
+                    held = [flag for fragment_number in range(len(chunk_list)) for flag in chunk_list_held[fragment_number]]
+                    if any(held):
+                        #chunks the receive station holds are copied from its store, the rest are sent
+                        with open(outgoing_file, 'rb') as file, open(outgoing_file, 'rb') as chunk_file:
+                            def chunk_instructions():
+                                instructions = delta.Instructions()
+                                for chunk_number, ((offset, length, _), chunk_held) in enumerate(zip(outgoing_chunks, held)):
+                                    if chunk_held:
+                                        instructions.copy(chunk_number)
+                                    else:
+                                        file.seek(offset)
+                                        instructions.literal(file.read(length))
+                                    if len(instructions.stream) >= lmodem_read_chunk_size:
+                                        yield instructions.take()
+                                yield instructions.finish()
+                            def read_held_chunk(chunk_number):
+                                offset, length, _ = outgoing_chunks[chunk_number]
+                                chunk_file.seek(offset)
+                                return chunk_file.read(length)
+                            chunk_list_details = load_instructions(chunk_instructions(), read_held_chunk)
+                        if chunk_list_details is None:
+                            ui.update_status(f'[red1 on deep_sky_blue4][ERROR][/] Size (over the air) exceeds maximum of {maximum_ota_file_size} bytes for mode {mode}!')
+                            return 1
+                        ui.update_status('Sending only chunks the receive station lacks.')
+                    else:
+                        #nothing in common, the compressed file is sent as it is
+                        chunk_list_details = (outgoing_blocks.size, codec_id)
+                    chunk_list_result = encode_chunk_list_result(len(chunk_list), *chunk_list_details)
+                    del held, chunk_list_details, outgoing_chunks
+                lostik.tx(chunk_list_result.hex())
+            del fragment_index, held_bitmap
+            continue
+        reply = reply.decode('ASCII', errors='replace')
+        if reply == 'READY':
+            #receive station missed the file transfer details (they answer its handshake), repeat them
+            lostik.tx(file_transfer_details)
+            continue
+        if reply == 'DUPLICATE_PASS':
+            ui.update_status('[green1 on deep_sky_blue4][DONE][/] Duplicate file found. Integrity check passed.')
+            add_telemetry(lostik, files=1, size_on_disk=Path(outgoing_file).stat().st_size)
+            return 0
+        if reply == 'LOSTIK_COUNT_MISMATCH':
+            ui.update_status('[red1 on deep_sky_blue4][ERROR][/] Receive station is using a different number of LoStiks!')
+            return 1
+        if reply == 'UNSUPPORTED_CODEC':
+            ui.update_status('[red1 on deep_sky_blue4][ERROR][/] Receive station does not support the chosen compression codec!')
+            return 1
         if reply == 'INCOMPLETE':
             ui.update_status('[orange1 on deep_sky_blue4][WARNING][/] File transfer incomplete. Try again to resume.')
-            exit(1)
+            return 1
         if reply == 'COMPLETE_BASE85_FAIL':
             ui.update_status('[red1 on deep_sky_blue4][ERROR][/] File transfer complete. Base85 decode failed!')
-            exit(1)
+            return 1
         if reply == 'COMPLETE_BLAKE2_FAIL':
             ui.update_status('[red1 on deep_sky_blue4][ERROR][/] File transfer complete. Integrity check failed!')
-            exit(1)
+            return 1
         if reply == 'COMPLETE_PASS':
             ui.update_status('[green1 on deep_sky_blue4][DONE][/] File transfer complete. Integrity check passed.')
-            exit(0)
+            add_telemetry(lostik, files=1, size_on_disk=Path(outgoing_file).stat().st_size)
+            return 0
 
-    #receiving file
-    if args.receive:
-        #basic handshake
+#function: receive a file from the sending station
+# accepts: LoStik object and mode number (1, 2, 3, 4 or 5)
+#  option: directory - where the received file (and any partial file) is stored
+#  option: additional_lostiks (list) - LoStik objects on further channels sharing every block burst
+#  option: session_open (bytes) - session open frame already received by a batch (skips the handshake)
+#  option: chunk_store (ChunkStore) - reuse content of files received before, and index this one once received
+# returns: exit status (0 success, 1 failure)
+def receive_file(lostik, mode, directory='.', additional_lostiks=(), session_open=None, chunk_store=None):
+    lostiks = [lostik] + list(additional_lostiks)
+    if session_open is None:
+        #handshake, repeated until the send station answers with the file transfer details
         ui.update_status('Connecting...')
         while True:
             lostik.tx('READY', encode=True, delay=0)
-            if lostik.rx(decode=True) == 'READY':
+            packet = lostik.rx()
+            if packet != 'TIME-OUT' and decode_session_open(bytes.fromhex(packet)) is not None:
+                session_open = bytes.fromhex(packet)
                 break
+        del packet
         ui.update_status('Connected!')
+    file_transfer_details = decode_session_open(session_open)
+    incoming_file_name = Path(file_transfer_details[0]).name
+    incoming_file_size_on_disk = file_transfer_details[1]
+    incoming_file_size_ota = file_transfer_details[2]
+    incoming_file_secure_hash_hex_digest = file_transfer_details[3]
+    incoming_session_id = file_transfer_details[4]
+    incoming_fec_group_size = file_transfer_details[5]
+    incoming_fec_parity = file_transfer_details[6]
+    incoming_lostik_count = file_transfer_details[7]
+    incoming_codec_id = file_transfer_details[8]
+    incoming_slowest_mode = file_transfer_details[9]
+    incoming_payload = file_transfer_details[10]
+    del file_transfer_details, session_open
 
-        #listen for incoming file details
-        ui.update_status('Awaiting file transfer details.')
-        file_transfer_details_string = str(lostik.rx(decode=True))
-        if file_transfer_details_string == 'TIME-OUT':
-            ui.update_status('[red1 on deep_sky_blue4][ERROR][/] LoStik watchdog timer time-out!')
-            exit(1)
-        else:
-            file_transfer_details = file_transfer_details_string.split('|')
-            incoming_file_name = file_transfer_details[0]
-            incoming_file_size_on_disk = file_transfer_details[1]
-            incoming_file_size_ota = file_transfer_details[2]
-            incoming_file_block_count = file_transfer_details[3]
-            incoming_file_secure_hash_hex_digest = file_transfer_details[4]
-            del file_transfer_details
-        del file_transfer_details_string
-
-        #display file transfer details
-        ui.update_status('Received file transfer details.')
-        ui.insert_file_name(incoming_file_name)
-        ui.insert_file_size_on_disk(incoming_file_size_on_disk)
+    #display file transfer details
+    ui.update_status('Received file transfer details.')
+    ui.insert_file_name(incoming_file_name)
+    ui.insert_file_size_on_disk(incoming_file_size_on_disk)
+    ui.insert_file_size_ota(incoming_file_size_ota)
+
+    #block bursts are striped across the same number of LoStiks at each station
+    if incoming_lostik_count != len(lostiks):
+        ui.update_status('[red1 on deep_sky_blue4][ERROR][/] Send station is using a different number of LoStiks!')
+        lostik.tx('LOSTIK_COUNT_MISMATCH', encode=True)
+        return 1
+    del incoming_lostik_count
+
+    #block size (in bytes) for chosen mode
+    block_size = 0
+    if mode == 1:
+        block_size = mode1_block_size // 2
+    if mode == 2:
+        block_size = mode2_block_size // 2
+    if mode == 3:
+        block_size = mode3_block_size // 2
+    if mode == 4:
+        block_size = mode4_block_size // 2
+    if mode == 5:
+        block_size = mode5_block_size // 2
+
+    #an adaptive transfer sizes blocks for the slowest mode it may use
+    if incoming_slowest_mode:
+        block_size = lmodem_mode_details(incoming_slowest_mode)[3]
+    incoming_file_block_count = -(-incoming_file_size_ota // block_size)
+
+    #received file (and any partial file) reside in the chosen directory
+    incoming_file_path = Path(directory) / incoming_file_name
+
+    #partial file belongs to this version of the file (and, for a delta transfer, to the version it updates)
+    checkpoint_secure_hash_hex_digest = incoming_file_secure_hash_hex_digest
+    delta_chunk_size = None
+    stored_chunk_hashes = None
+
+    #if present, process existing file
+    local_file_secure_hash = None
+    if incoming_file_path.is_file():
+        with open(incoming_file_path, 'rb') as file:
+            local_file_secure_hash = blake2b(digest_size=16)
+            while chunk := file.read(lmodem_read_chunk_size):
+                local_file_secure_hash.update(chunk)
+        if incoming_file_secure_hash_hex_digest == local_file_secure_hash.hexdigest():
+            ui.update_status('[green1 on deep_sky_blue4][DONE][/] Duplicate file found. Integrity check passed.')
+            lostik.tx('DUPLICATE_PASS', encode=True)
+            add_telemetry(lostik, files=1, size_on_disk=incoming_file_path.stat().st_size)
+            return 0
+
+    #a small file arrives whole within its details, the single result both verifies and acknowledges it
+    if incoming_payload is not None:
+        ui.update_status('Whole file received with the file transfer details. Processing file...')
+        if incoming_codec_id not in codec.codecs:
+            ui.update_status('[red1 on deep_sky_blue4][ERROR][/] Send station is using an unsupported compression codec!')
+            lostik.tx('UNSUPPORTED_CODEC', encode=True)
+            return 1
+        decompressor = codec.create_decompressor(incoming_codec_id)
+        try:
+            incoming_file_contents = decompressor.decompress(incoming_payload)
+        except codec.decompression_errors:
+            incoming_file_contents = None
+        if (incoming_file_contents is None or not decompressor.eof
+                or incoming_file_secure_hash_hex_digest != blake2b(incoming_file_contents, digest_size=16).hexdigest()):
+            ui.update_status('[red1 on deep_sky_blue4][ERROR][/] File transfer complete. Integrity check failed!')
+            lostik.tx('COMPLETE_BLAKE2_FAIL', encode=True)
+            return 1
+        #received file only appears under its own name once complete and verified
+        reassembly_file_path = Path(str(incoming_file_path) + '.part')
+        with open(reassembly_file_path, 'wb') as file:
+            file.write(incoming_file_contents)
+        os.replace(reassembly_file_path, incoming_file_path)
+        #any partial file left by an earlier attempt is no longer needed
+        Path(str(incoming_file_path) + '.partial').unlink(missing_ok=True)
+        if chunk_store is not None:
+            chunk_store.add(incoming_file_path)
+        del incoming_file_contents, incoming_payload, decompressor
+        ui.update_status('[green1 on deep_sky_blue4][DONE][/] File transfer complete. Integrity check passed.')
+        lostik.tx('COMPLETE_PASS', encode=True)
+        add_telemetry(lostik, files=1, size_on_disk=incoming_file_path.stat().st_size)
+        return 0
+    del incoming_payload
+
+    if local_file_secure_hash is not None:
+        #a different version is updated by sending signatures of its chunks and receiving only the changes
+        ui.update_status('Different version found. Requesting changes only.')
+        checkpoint_secure_hash_hex_digest = blake2b(bytes.fromhex(incoming_file_secure_hash_hex_digest) + local_file_secure_hash.digest(),
+                                                    digest_size=16).hexdigest()
+        del local_file_secure_hash
+        delta_chunk_size = delta.chunk_size_for(incoming_file_path.stat().st_size, lmodem_delta_min_chunk_size, lmodem_delta_max_chunks)
+        signature_fragments = encode_signature_fragments(delta.encode_signatures(delta.signatures(incoming_file_path, delta_chunk_size)),
+                                                         delta_chunk_size, block_size)
+        #sending station encodes the delta before answering the final fragment, so allow it the longer time-out
+        mode_wdt = lostik.get_wdt()
+        lostik.set_wdt(lmodem_result_wdt)
+        for fragment_index, signature_fragment in enumerate(signature_fragments):
+            lostik.tx(signature_fragment.hex())
+            timeout_counter = 0
+            while True:
+                reply = lostik.rx()
+                if reply == 'TIME-OUT':
+                    timeout_counter += 1
+                    if timeout_counter == lmodem_max_reply_timeouts:
+                        ui.update_status('[red1 on deep_sky_blue4][ERROR][/] LoStik watchdog timer time-out!')
+                        lostik.set_wdt(mode_wdt)
+                        return 1
+                    lostik.tx(signature_fragment.hex())
+                    continue
+                signature_reply = decode_signature_reply(bytes.fromhex(reply), fragment_index)
+                if signature_reply is not None:
+                    break
+        lostik.set_wdt(mode_wdt)
+        del signature_fragments, mode_wdt, timeout_counter
+        #the delta takes the place of the compressed file
+        incoming_file_size_ota, incoming_codec_id = signature_reply
+        incoming_file_block_count = -(-incoming_file_size_ota // block_size)
         ui.insert_file_size_ota(incoming_file_size_ota)
-        del incoming_file_size_on_disk, incoming_file_size_ota
-
-        #if present, process existing file
-        if Path(incoming_file_name).is_file():
-            with open(incoming_file_name, 'rb') as file:
-                local_file_secure_hash = blake2b(digest_size=16)
-                local_file_secure_hash.update(file.read())
-            if incoming_file_secure_hash_hex_digest == local_file_secure_hash.hexdigest():
-                ui.update_status('[green1 on deep_sky_blue4][DONE][/] Duplicate file found. Integrity check passed.')
-                lostik.tx('DUPLICATE_PASS', encode=True)
-                exit(0)
-            if incoming_file_secure_hash_hex_digest != local_file_secure_hash.hexdigest():
-                ui.update_status('[red1 on deep_sky_blue4][ERROR][/] Duplicate filename found. Integrity check failed!')
-                lostik.tx('DUPLICATE_FAIL', encode=True)
-                exit(1)
-
-        #initialize dictionary to temporarily store received blocks
-        received_blocks = {}
-
-        #function: obtain the number of received blocks
-        # returns: received block count (int)
-        def count_received_blocks():
-            received_block_count = 0
-            for block in received_blocks:
-                if received_blocks[block] != '':
-                    received_block_count += 1
-            return received_block_count
-
-        #function: deposit received blocks into dictionary
-        def receive_requested_blocks():
-            ui.update_status('Receiving requested blocks.')
-            ui.move_cursor(21,1)
-            progress = rich.progress.Progress(rich.progress.BarColumn(bar_width=59),
-                                            rich.progress.TaskProgressColumn(),
-                                            rich.progress.TimeRemainingColumn(),
-                                            rich.progress.TimeElapsedColumn())
-            task = progress.add_task('Receive Requested Blocks', total=int(incoming_file_block_count))
-            with progress:
-                progress.update(task, completed=count_received_blocks())
-                timeout_counter = 0
-                while True:
-                    incoming_packet = str(lostik.rx())
-                    if incoming_packet == '454E445F4F465F5452414E534D495353494F4E': #END_OF_TRANSMISSION
+        del signature_reply
+
+    #otherwise content received before (by any file) need not be sent again, unless the file is too short for
+    #that to pay for the chunk list exchange (no chunk is longer than max_chunk_size, so this is the fewest fragments)
+    elif (chunk_store is not None and len(chunk_store)
+          and chunk_list_pays(incoming_file_block_count,
+                              max(1, -(-incoming_file_size_on_disk
+                                       // (chunkstore.max_chunk_size * chunk_list_fragment_capacity(block_size)))))):
+        ui.update_status('Checking chunk store for content received before.')
+        #the request for each chunk list fragment carries the held flags for the fragment before it
+        chunk_hashes = []
+        held = []
+        fragment_held = []
+        fragment_index = 0
+        #sending station encodes the file before answering the final request, so allow it the longer time-out
+        mode_wdt = lostik.get_wdt()
+        lostik.set_wdt(lmodem_result_wdt)
+        while True:
+            chunk_list_request = encode_chunk_list_request(fragment_index, fragment_held)
+            lostik.tx(chunk_list_request.hex())
+            timeout_counter = 0
+            while True:
+                reply = lostik.rx()
+                if reply == 'TIME-OUT':
+                    timeout_counter += 1
+                    if timeout_counter == lmodem_max_reply_timeouts:
+                        ui.update_status('[red1 on deep_sky_blue4][ERROR][/] LoStik watchdog timer time-out!')
+                        lostik.set_wdt(mode_wdt)
+                        return 1
+                    lostik.tx(chunk_list_request.hex())
+                    continue
+                chunk_list_fragment = decode_chunk_list_fragment(bytes.fromhex(reply), fragment_index)
+                if chunk_list_fragment is not None:
+                    break
+            _, fragment_chunk_hashes, chunk_list_result = chunk_list_fragment
+            if chunk_list_result is not None:
+                break
+            #a chunk is only claimed once it has been read back and its hash checked
+            fragment_held = [chunk_store.read(chunk_hash) is not None for chunk_hash in fragment_chunk_hashes]
+            chunk_hashes.extend(fragment_chunk_hashes)
+            held.extend(fragment_held)
+            fragment_index += 1
+        lostik.set_wdt(mode_wdt)
+        del chunk_list_request, chunk_list_fragment, fragment_chunk_hashes, fragment_held, fragment_index, mode_wdt, timeout_counter
+        incoming_file_size_ota, incoming_codec_id = chunk_list_result
+        del chunk_list_result
+        #with nothing in common the compressed file is sent as it is
+        if any(held):
+            stored_chunk_hashes = chunk_hashes
+            incoming_file_block_count = -(-incoming_file_size_ota // block_size)
+            ui.insert_file_size_ota(incoming_file_size_ota)
+            checkpoint_secure_hash_hex_digest = blake2b(bytes.fromhex(incoming_file_secure_hash_hex_digest) + bytes(held),
+                                                        digest_size=16).hexdigest()
+        del chunk_hashes, held
+    del incoming_file_size_on_disk
+
+    #file (or delta) is compressed with whichever codec the sending station found smallest
+    if incoming_codec_id not in codec.codecs:
+        ui.update_status('[red1 on deep_sky_blue4][ERROR][/] Send station is using an unsupported compression codec!')
+        lostik.tx('UNSUPPORTED_CODEC', encode=True)
+        return 1
+
+    #initialize block store for received blocks and dictionary for FEC parity blocks
+    received_blocks = BlockStore(int(incoming_file_size_ota), block_size)
+    received_blocks_lock = threading.Lock()
+    received_parity_blocks = {}
+
+    #blocks are decompressed, hashed and written to a partial file in order as soon as they are contiguous
+    reassembled_block_count = 0
+    reassembly_failed = False
+    decompressor = codec.create_decompressor(incoming_codec_id)
+    incoming_file_secure_hash = blake2b(digest_size=16)
+    reassembly_file_path = Path(str(incoming_file_path) + '.part')
+    reassembly_file = open(reassembly_file_path, 'wb')
+
+    #a delta is rebuilt into the file from its instructions and the chunks of the existing version
+    #(or, for a chunk store transfer, the chunks of files received before)
+    patcher = None
+    basis_file = None
+    if delta_chunk_size is not None:
+        basis_file = open(incoming_file_path, 'rb')
+        def read_basis_chunk(chunk_index):
+            basis_file.seek(chunk_index * delta_chunk_size)
+            chunk = basis_file.read(delta_chunk_size)
+            if len(chunk) != delta_chunk_size:
+                raise ValueError(f'chunk {chunk_index} not held')
+            return chunk
+        patcher = delta.Patcher(read_basis_chunk)
+    elif stored_chunk_hashes is not None:
+        def read_stored_chunk(chunk_number):
+            chunk = chunk_store.read(stored_chunk_hashes[chunk_number]) if chunk_number < len(stored_chunk_hashes) else None
+            if chunk is None:
+                raise ValueError(f'chunk {chunk_number} not held')
+            return chunk
+        patcher = delta.Patcher(read_stored_chunk)
+
+    #function: feed any newly contiguous received blocks through decompression, hashing and out to disk
+    def reassemble_received_blocks():
+        nonlocal reassembled_block_count, reassembly_failed
+        with received_blocks_lock:
+            while (not reassembly_failed and reassembled_block_count < len(received_blocks)
+                   and received_blocks.has(reassembled_block_count)):
+                try:
+                    incoming_file_chunk = decompressor.decompress(received_blocks.get(reassembled_block_count))
+                    if patcher is not None:
+                        incoming_file_chunk = patcher.feed(incoming_file_chunk)
+                except codec.decompression_errors + delta.delta_errors:
+                    #corrupt compressed stream (or delta), reported as an integrity failure once all blocks are in
+                    reassembly_failed = True
+                    break
+                incoming_file_secure_hash.update(incoming_file_chunk)
+                reassembly_file.write(incoming_file_chunk)
+                reassembled_block_count += 1
+
+    #function: deposit received blocks into block store
+    # returns: number of packets heard (from this session, on every LoStik)
+    def receive_requested_blocks():
+        ui.update_status('Receiving requested blocks.')
+        ui.move_cursor(21,1)
+        progress = ui.create_progress()
+        task = progress.add_task('Receive Requested Blocks', total=int(incoming_file_block_count))
+        #each LoStik listens on its own channel until its share of the burst ends
+        #shares are equal, so once any LoStik has finished the others stop after a full time-out of silence
+        finish_times = []
+        heard_packet_counts = []
+        def receive_burst(lostik, stripe):
+            wdt = int(lostik.get_wdt()) / 1000
+            #blue LED stays lit for the whole burst, keeping the serial interface free for radio commands
+            lostik.burst_led('blue', True)
+            lostik.receive_continuously(True)
+            timeout_counter = 0
+            heard_packet_count = 0
+            #block number of each packet heard, read only when a telemetry log is kept
+            def block_number(packet):
+                return packet_block_number(incoming_session_id, packet)
+            while True:
+                incoming_packet = str(lostik.rx(block=block_number))
+                if incoming_packet == '454E445F4F465F5452414E534D495353494F4E': #END_OF_TRANSMISSION
+                    heard_packet_count += 1
+                    break
+                if incoming_packet == 'TIME-OUT':
+                    #silence (burst over or its end lost), blocks received so far reach the disk without waiting for another
+                    with received_blocks_lock:
+                        checkpoint.flush(force=True)
+                    timeout_counter += 1
+                    if timeout_counter == 5 or (finish_times and monotonic() - finish_times[0] >= wdt):
                         break
-                    if incoming_packet == 'TIME-OUT':
-                        timeout_counter += 1
-                        if timeout_counter == 5:
-                            break
-                        continue
-                    incoming_block_number_hex = incoming_packet[:6]
-                    incoming_block_number = bytes.fromhex(incoming_block_number_hex).decode('ASCII')
-                    incoming_block = incoming_packet[6:]
-                    received_blocks.update({incoming_block_number: incoming_block})
-                    progress.update(task, completed=count_received_blocks())
-
-        #function: build string of pipe delimited missing block numbers, if any
-        # returns: missing blocks string
-        def create_missing_block_numbers_string(received_blocks):
-            missing_block_numbers_string = ''
-            for block in received_blocks:
-                if received_blocks[block] == '':
-                    missing_block_numbers_string = missing_block_numbers_string + str(block) + '|'
-            if len(missing_block_numbers_string) != 0:
-                missing_block_numbers_string = missing_block_numbers_string[:-1]
-            return missing_block_numbers_string
-
-        #check for partial file and transfer from disk to memory if found
-        partial_file_name = incoming_file_name + '.json'
-        if Path(partial_file_name).is_file():
-            with open(partial_file_name) as json_file:
-                received_blocks.clear()
-                received_blocks = json.load(json_file)
-            os.remove(partial_file_name)
-        del partial_file_name
-
-        #determine whether to resume a partial transfer or start fresh
-        resume = False
-        if 'secure_hash_hex_digest' in received_blocks:
-            if incoming_file_secure_hash_hex_digest == received_blocks['secure_hash_hex_digest']:
-                received_blocks.pop('secure_hash_hex_digest')
-                if count_received_blocks != int(incoming_file_block_count):
-                    resume = True
-        if resume == True:
-            missing_block_numbers = create_missing_block_numbers_string(received_blocks)
-            #trim missing block numbers string based on chosen mode
-            if args.mode == 1:
-                if len(missing_block_numbers) > mode1_max_request_length:
-                    missing_block_numbers = missing_block_numbers[:mode1_max_request_length]
-            if args.mode == 2:
-                if len(missing_block_numbers) > mode2_max_request_length:
-                    missing_block_numbers = missing_block_numbers[:mode2_max_request_length]
-            if args.mode == 3:
-                if len(missing_block_numbers) > mode3_max_request_length:
-                    missing_block_numbers = missing_block_numbers[:mode3_max_request_length]
-            if args.mode == 4:
-                if len(missing_block_numbers) > mode4_max_request_length:
-                    missing_block_numbers = missing_block_numbers[:mode4_max_request_length]
-            if args.mode == 5:
-                if len(missing_block_numbers) > mode5_max_request_length:
-                    missing_block_numbers = missing_block_numbers[:mode5_max_request_length]
-            received_block_count = str(count_received_blocks()).zfill(3)
-            block_request_details = received_block_count + missing_block_numbers
-            del received_block_count, missing_block_numbers
-            ui.update_status('Resuming file transfer.')
-            lostik.tx(block_request_details, encode=True)
-            del block_request_details
-            receive_requested_blocks()
-        elif resume == False:
-            #initialize key:value pairs based on incoming file block count
-            received_blocks.clear()
-            keys = []
-            for i in range(int(incoming_file_block_count)):
-                keys.append(str(i).zfill(3))
-            received_blocks = dict.fromkeys(keys, '')
-            received_block_count = '000000'
-            block_request_details = received_block_count
-            del received_block_count
-            ui.update_status('Starting file transfer.')
-            lostik.tx(block_request_details, encode=True)
-            del block_request_details
-            receive_requested_blocks()
-        del resume
-
-        #process received blocks
-        if count_received_blocks() == int(incoming_file_block_count):
-            del incoming_file_block_count
-            ui.update_status('All blocks received. Processing file...')
-            #concatenate blocks
-            incoming_file_compressed_hex = ''
-            for block in received_blocks.values():
-                incoming_file_compressed_hex = incoming_file_compressed_hex + block
-            del received_blocks
-            #decode from hex
-            incoming_file_compressed = bytes.fromhex(incoming_file_compressed_hex)
-            del incoming_file_compressed_hex
-            #decompress
-            incoming_file = lzma.decompress(incoming_file_compressed)
-            del incoming_file_compressed
-            #write to disk
-            with open(incoming_file_name, 'wb') as file:
-                file.write(incoming_file)
-            del incoming_file
-            #obtain secure hash
-            with open(incoming_file_name, 'rb') as file:
-                incoming_file_secure_hash = blake2b(digest_size=16)
-                incoming_file_secure_hash.update(file.read())
-            if incoming_file_secure_hash_hex_digest != incoming_file_secure_hash.hexdigest():
-                ui.update_status('[red1 on deep_sky_blue4][ERROR][/] File transfer complete. Integrity check failed!')
-                os.remove(incoming_file_name)
-                del incoming_file_name
-                lostik.tx('COMPLETE_BLAKE2_FAIL', encode=True)
-                exit(1)
-            if incoming_file_secure_hash_hex_digest == incoming_file_secure_hash.hexdigest():
-                ui.update_status('[green1 on deep_sky_blue4][DONE][/] File transfer complete. Integrity check passed.')
-                lostik.tx('COMPLETE_PASS', encode=True)
-                exit(0)
+                    continue
+                header = decode_packet_header(incoming_packet)
+                if header is None:
+                    continue
+                session_id, incoming_block_number, incoming_block = header
+                del header
+                #discard packets from any other session
+                if session_id != incoming_session_id:
+                    continue
+                heard_packet_count += 1
+                #parity blocks are numbered after the last data block
+                if incoming_block_number >= int(incoming_file_block_count):
+                    received_parity_blocks.update({incoming_block_number: incoming_block})
+                    continue
+                with received_blocks_lock:
+                    new_block = received_blocks.put(incoming_block_number, bytes.fromhex(incoming_block))
+                    if new_block:
+                        checkpoint.record(incoming_block_number)
+                        checkpoint.flush()
+                if not new_block:
+                    continue
+                reassemble_received_blocks()
+                progress.update(task, completed=received_blocks.received_count)
+            with received_blocks_lock:
+                checkpoint.flush(force=True)
+            finish_times.append(monotonic())
+            heard_packet_counts.append(heard_packet_count)
+            lostik.receive_continuously(False)
+            lostik.burst_led('blue', False)
+        with progress:
+            progress.update(task, completed=received_blocks.received_count)
+            run_striped(receive_burst, lostiks)
+        return sum(heard_packet_counts)
+
+    #function: rebuild missing blocks from FEC parity blocks where possible
+    def repair_missing_blocks():
+        block_count = len(received_blocks)
+        for group, group_start in enumerate(range(0, block_count, incoming_fec_group_size)):
+            group_block_numbers = range(group_start, min(group_start + incoming_fec_group_size, block_count))
+            blocks = []
+            for block_number in group_block_numbers:
+                if received_blocks.has(block_number):
+                    blocks.append(bytes(received_blocks.get(block_number)).ljust(block_size, b'\x00'))
+                else:
+                    blocks.append(None)
+            if None not in blocks:
+                continue
+            parity_start = block_count + group * incoming_fec_parity
+            parity = []
+            for parity_number in range(parity_start, parity_start + incoming_fec_parity):
+                parity_block = received_parity_blocks.get(parity_number)
+                parity.append(bytes.fromhex(parity_block) if parity_block is not None else None)
+            repaired_blocks = fec.decode(blocks, parity)
+            if repaired_blocks is None:
+                continue
+            for block_number, block in zip(group_block_numbers, repaired_blocks):
+                with received_blocks_lock:
+                    if received_blocks.put(block_number, block[:received_blocks.block_length(block_number)]):
+                        checkpoint.record(block_number)
+
+    #check for partial file (checkpoint) and resume if it belongs to the incoming file
+    partial_file_path = Path(str(incoming_file_path) + '.partial')
+    if load_checkpoint(partial_file_path, received_blocks, mode, checkpoint_secure_hash_hex_digest):
+        ui.update_status('Resuming file transfer.')
+    else:
+        ui.update_status('Starting file transfer.')
+
+    #every received block is checkpointed to disk, surviving an abort at any point
+    checkpoint = Checkpoint(partial_file_path, received_blocks, mode, checkpoint_secure_hash_hex_digest)
+    del partial_file_path, checkpoint_secure_hash_hex_digest
+
+    #blocks carried over from a partial transfer
+    reassemble_received_blocks()
+
+    #adaptive transfer: each NAK names the mode of the coming round, chosen from the block loss and signal-to-noise
+    #ratio of the round before, and both stations switch once it has been sent
+    #a mode is confirmed once a round requested in it is heard, until then silence means returning to the last
+    current_mode = mode
+    previous_mode = mode
+    mode_confirmed = True
+    next_mode = mode
+    failed_modes = set()
+
+    #request missing blocks (selective repeat) until all are received or the link stalls
+    stalled_rounds = 0
+    while not received_blocks.is_complete():
+        received_block_count = received_blocks.received_count
+        rearm_times = [striped_lostik.get_rearm_time() for striped_lostik in lostiks if striped_lostik.get_rearm_time() is not None]
+        if incoming_slowest_mode:
+            negative_acknowledgement = encode_negative_acknowledgement(received_blocks, max(rearm_times, default=None), block_size,
+                                                                       next_mode, lmodem_adaptive_round_blocks)
         else:
-            ui.update_status('[orange1 on deep_sky_blue4][WARNING][/] File transfer incomplete. Try again to resume.')
-            received_blocks['secure_hash_hex_digest'] = incoming_file_secure_hash_hex_digest
-            del incoming_file_secure_hash_hex_digest
-            partial_file_name = incoming_file_name + '.json'
-            del incoming_file_name
-            with open(partial_file_name, 'w') as json_file:
-                json.dump(received_blocks, json_file, indent=4)
-            lostik.tx('INCOMPLETE', encode=True)
+            negative_acknowledgement = encode_negative_acknowledgement(received_blocks, max(rearm_times, default=None), block_size)
+        lostik.tx(negative_acknowledgement.hex())
+        add_telemetry(lostik, rounds=1)
+        del rearm_times
+        round_confirms_mode = next_mode == current_mode
+        if next_mode != current_mode:
+            previous_mode = current_mode
+            current_mode = next_mode
+            mode_confirmed = False
+            lmodem_switch_mode(lostiks, current_mode)
+        heard_packet_count = receive_requested_blocks()
+        round_received_count = received_blocks.received_count - received_block_count
+        #rebuild missing blocks from FEC parity blocks, if any were sent
+        if incoming_fec_parity > 0:
+            repair_missing_blocks()
+            reassemble_received_blocks()
+        checkpoint.flush(force=True)
+        mode_reverted = False
+        if incoming_slowest_mode:
+            if heard_packet_count == 0 and not mode_confirmed:
+                #send station missed the switch, or cannot be heard in the new mode (it returns to the last mode as well)
+                failed_modes.add(current_mode)
+                current_mode = previous_mode
+                next_mode = current_mode
+                mode_confirmed = True
+                mode_reverted = True
+                lmodem_switch_mode(lostiks, current_mode)
+            elif heard_packet_count:
+                mode_confirmed = mode_confirmed or round_confirms_mode
+                #loss is measured on data blocks alone, before any repair
+                requested_block_count = len(decode_negative_acknowledgement(negative_acknowledgement, len(received_blocks))[3])
+                block_loss = 1 - round_received_count / requested_block_count if requested_block_count else 0
+                try:
+                    snr = int(lostik.get_snr())
+                except ValueError:
+                    snr = None
+                ui.update_status(f'Round block loss {block_loss:.0%}, SNR {snr} dB.')
+                if mode_confirmed:
+                    next_mode = lmodem_adaptive_mode(current_mode, incoming_slowest_mode, failed_modes, block_loss, snr)
+                del requested_block_count, block_loss, snr
+        del negative_acknowledgement, round_confirms_mode, heard_packet_count, round_received_count
+        #a round lost to a failed switch is not a stall, the stations have only to meet again in the last mode
+        if received_blocks.received_count != received_block_count:
+            stalled_rounds = 0
+        elif not mode_reverted:
+            stalled_rounds += 1
+            if stalled_rounds == lmodem_max_stalled_rounds:
+                break
+        del received_block_count, mode_reverted
+    del stalled_rounds, current_mode, previous_mode, mode_confirmed, next_mode, failed_modes
+
+    #process received blocks
+    if received_blocks.is_complete():
+        del incoming_file_block_count
+        ui.update_status('All blocks received. Processing file...')
+        del received_blocks
+        #partial file is no longer needed, pass or fail
+        checkpoint.close(remove=True)
+        #file has already been decompressed (and rebuilt from any delta), hashed and written as blocks arrived
+        reassembly_file.close()
+        if basis_file is not None:
+            basis_file.close()
+        if patcher is not None:
+            reassembly_failed = reassembly_failed or not patcher.is_complete()
+        if reassembly_failed or not decompressor.eof or incoming_file_secure_hash_hex_digest != incoming_file_secure_hash.hexdigest():
+            ui.update_status('[red1 on deep_sky_blue4][ERROR][/] File transfer complete. Integrity check failed!')
+            os.remove(reassembly_file_path)
+            del incoming_file_path
+            lostik.tx('COMPLETE_BLAKE2_FAIL', encode=True)
+            return 1
+        #received file only appears under its own name once complete and verified
+        os.replace(reassembly_file_path, incoming_file_path)
+        if chunk_store is not None:
+            chunk_store.add(incoming_file_path)
+        ui.update_status('[green1 on deep_sky_blue4][DONE][/] File transfer complete. Integrity check passed.')
+        lostik.tx('COMPLETE_PASS', encode=True)
+        add_telemetry(lostik, files=1, size_on_disk=incoming_file_path.stat().st_size)
+        return 0
+    else:
+        reassembly_file.close()
+        if basis_file is not None:
+            basis_file.close()
+        os.remove(reassembly_file_path)
+        ui.update_status('[orange1 on deep_sky_blue4][WARNING][/] File transfer incomplete. Try again to resume.')
+        #received blocks remain in the partial file
+        checkpoint.close()
+        del incoming_file_secure_hash_hex_digest, received_blocks, incoming_file_path
+        lostik.tx('INCOMPLETE', encode=True)
+        return 1
+
+#function: send several files to the receiving station in one session (one handshake)
+# accepts: LoStik object, list of outgoing file paths and mode number (1, 2, 3, 4 or 5)
+#  option: forward_error_correction (boolean) - append Reed-Solomon parity blocks to each group of blocks
+#  option: additional_lostiks (list) - LoStik objects on further channels sharing every block burst
+#  option: payload_cache (PayloadCache) - reuse compressed files from an earlier send
+#  option: adaptive (boolean) - let the receive station move both stations between modes as the link allows
+#  option: survey (boolean) - survey every channel after the handshake and move both stations to the best
+# returns: exit status (0 success, 1 failure)
+def send_batch(lostik, outgoing_files, mode, forward_error_correction=False, additional_lostiks=(), payload_cache=None,
+               adaptive=False, survey=False):
+    outgoing_file_names = [Path(outgoing_file).name for outgoing_file in outgoing_files]
+
+    #check every file up front, a batch never stops part way for a problem that could be known before connecting
+    for outgoing_file, outgoing_file_name in zip(outgoing_files, outgoing_file_names):
+        ui.insert_file_name(outgoing_file_name)
+        if not Path(outgoing_file).is_file():
+            ui.update_status('[red1 on deep_sky_blue4][ERROR][/] File does not exist!')
+            return 1
+        if len(outgoing_file_name) > 32:
+            ui.update_status('[red1 on deep_sky_blue4][ERROR][/] File name exceeds 32 character limit!')
+            return 1
+    if len(set(outgoing_file_names)) != len(outgoing_file_names):
+        ui.update_status('[red1 on deep_sky_blue4][ERROR][/] Batch contains more than one file with the same name!')
+        return 1
+
+    #maximum size over the air and block size (in bytes) for chosen mode
+    maximum_ota_file_size = 0
+    block_size = 0
+    if mode == 1:
+        maximum_ota_file_size, block_size = mode1_max_ota_file_size, mode1_block_size // 2
+    if mode == 2:
+        maximum_ota_file_size, block_size = mode2_max_ota_file_size, mode2_block_size // 2
+    if mode == 3:
+        maximum_ota_file_size, block_size = mode3_max_ota_file_size, mode3_block_size // 2
+    if mode == 4:
+        maximum_ota_file_size, block_size = mode4_max_ota_file_size, mode4_block_size // 2
+    if mode == 5:
+        maximum_ota_file_size, block_size = mode5_max_ota_file_size, mode5_block_size // 2
+
+    #hash and compress every file before connecting, so the receive station is never kept waiting between files
+    prepared_files = []
+    for file_number, (outgoing_file, outgoing_file_name) in enumerate(zip(outgoing_files, outgoing_file_names)):
+        ui.insert_file_name(outgoing_file_name)
+        ui.update_status(f'Preparing file {file_number + 1} of {len(outgoing_files)}.')
+        prepared = prepare_outgoing_file(outgoing_file, Path(outgoing_file).stat().st_size, maximum_ota_file_size, payload_cache)
+        if prepared[2] is None or len(prepared[2]) > maximum_ota_file_size:
+            ui.update_status(f'[red1 on deep_sky_blue4][ERROR][/] Size (over the air) exceeds maximum of {maximum_ota_file_size} bytes for mode {mode}!')
+            return 1
+        prepared_files.append(prepared)
+    del maximum_ota_file_size
+
+    #handshake, the first packet sent (channel survey or manifest fragment) answers the receive station's READY
+    ui.update_status('Connecting...')
+    while True:
+        reply = lostik.rx()
+        if reply != 'TIME-OUT' and bytes.fromhex(reply) == b'READY':
+            break
+    del reply
+    ui.update_status('Connected!')
+    if survey == True:
+        survey_channels([lostik] + list(additional_lostiks), lmodem_get_channel(lostik))
+
+    #send manifest one fragment at a time, each reply flags the files the receive station needs
+    ui.update_status('Transmitting batch manifest.')
+    manifest = encode_manifest([(outgoing_file_name, prepared[0]) for outgoing_file_name, prepared in zip(outgoing_file_names, prepared_files)],
+                               block_size)
+    needed = []
+    lostik.set_wdt(lmodem_result_wdt)
+    for fragment_index, fragment in enumerate(manifest):
+        entry_count = len(decode_manifest_fragment(fragment)[2])
+        lostik.tx(fragment.hex())
+        timeout_counter = 0
+        while True:
+            reply = lostik.rx()
+            if reply == 'TIME-OUT':
+                timeout_counter += 1
+                if timeout_counter == lmodem_max_reply_timeouts:
+                    ui.update_status('[red1 on deep_sky_blue4][ERROR][/] LoStik watchdog timer time-out!')
+                    return 1
+                lostik.tx(fragment.hex())
+                continue
+            reply = bytes.fromhex(reply)
+            if reply == b'READY':
+                #receive station missed the fragment (the first answers its handshake), repeat it
+                lostik.tx(fragment.hex())
+                continue
+            manifest_reply = decode_manifest_reply(reply, fragment_index, entry_count)
+            if manifest_reply is not None:
+                needed.extend(manifest_reply)
+                break
+    del manifest, timeout_counter
+
+    #send each needed file in turn (its own file transfer details, session id and partial file at the receive station)
+    #a file the receive station holds a different version of is sent as a delta
+    sent_count = 0
+    for outgoing_file, prepared, file_needed in zip(outgoing_files, prepared_files, needed):
+        if not file_needed:
+            continue
+        sent_count += 1
+        ui.update_status(f'Sending file {sent_count} of {needed.count(True)}.')
+        file_status = send_file(lostik, outgoing_file, mode, forward_error_correction=forward_error_correction,
+                                additional_lostiks=additional_lostiks, handshake=False, prepared=prepared, adaptive=adaptive)
+        if file_status != 0:
+            #the link (or the receive station) has given up, later files are left for the next run
+            return file_status
+        #every file begins in the chosen mode, wherever an adaptive transfer left the last
+        if adaptive == True:
+            lmodem_switch_mode([lostik] + list(additional_lostiks), mode)
+    ui.update_status(f'[green1 on deep_sky_blue4][DONE][/] Batch complete. {sent_count} sent, {len(outgoing_files) - sent_count} already received.')
+    return 0
+
+#function: receive a single file or a batch of files from the sending station
+# accepts: LoStik object and mode number (1, 2, 3, 4 or 5)
+#  option: directory - where the received files (and any partial files) are stored
+#  option: additional_lostiks (list) - LoStik objects on further channels sharing every block burst
+#  option: chunk_store (ChunkStore) - reuse content of files received before, and index each file once received
+# returns: exit status (0 success, 1 failure)
+def receive_batch(lostik, mode, directory='.', additional_lostiks=(), chunk_store=None):
+    #handshake, repeated until the send station answers with its first packet (handled below like any other)
+    ui.update_status('Connecting...')
+    while True:
+        lostik.tx('READY', encode=True, delay=0)
+        handshake_reply = lostik.rx()
+        if handshake_reply != 'TIME-OUT' and is_handshake_reply(bytes.fromhex(handshake_reply)):
+            break
+    ui.update_status('Connected!')
+
+    #a batch begins with its manifest, a single file with its file transfer details
+    ui.update_status('Awaiting file transfer details.')
+    manifest_replies = {}
+    manifest_fragment_count = None
+    needed_file_count = 0
+    pending_file_names = set()
+    timeout_counter = 0
+    #the send station may survey every channel first, the channel it chose is confirmed once the send station is heard there
+    lostiks = [lostik] + list(additional_lostiks)
+    survey_channel_number = lmodem_get_channel(lostik)
+    channel_confirmed = True
+    while True:
+        #batch is over once the whole manifest has been answered and every needed file received
+        if manifest_fragment_count is not None and len(manifest_replies) == manifest_fragment_count and not pending_file_names:
+            ui.update_status(f'[green1 on deep_sky_blue4][DONE][/] Batch complete. {needed_file_count} received.')
+            return 0
+        if handshake_reply is not None:
+            packet = handshake_reply
+            handshake_reply = None
+        else:
+            packet = lostik.rx()
+        if packet == 'TIME-OUT':
+            #send station did not hear the echo of its choice, and is still on the channel the survey began on
+            if not channel_confirmed:
+                channel_confirmed = True
+                for stripe, striped_lostik in enumerate(lostiks):
+                    lmodem_set_channel(striped_lostik, lmodem_stripe_channel(survey_channel_number, stripe))
+                ui.insert_lmodem_channel(survey_channel_number)
+                ui.insert_frequency(lostik.get_freq())
+            timeout_counter += 1
+            if timeout_counter == lmodem_max_reply_timeouts:
+                ui.update_status('[red1 on deep_sky_blue4][ERROR][/] LoStik watchdog timer time-out!')
+                return 1
+            lostik.tx('READY', encode=True, delay=0)
+            continue
+        timeout_counter = 0
+        packet = bytes.fromhex(packet)
+        survey_packet = decode_survey(packet)
+        if survey_packet == (survey_start, []):
+            respond_to_survey(lostik, survey_channel_number)
+            continue
+        if survey_packet is not None and survey_packet[0] == survey_select and survey_packet[1] and 1 <= survey_packet[1][0] <= 5:
+            #echo the choice then move, the send station follows once it hears the echo
+            lostik.tx(packet.hex())
+            for stripe, striped_lostik in enumerate(lostiks):
+                lmodem_set_channel(striped_lostik, lmodem_stripe_channel(survey_packet[1][0], stripe))
+            channel_confirmed = survey_packet[1][0] == survey_channel_number
+            ui.insert_lmodem_channel(survey_packet[1][0])
+            ui.insert_frequency(lostik.get_freq())
+            ui.update_status(f'Channel survey complete. Moved to channel {survey_packet[1][0]}.')
+            continue
+        if survey_packet is not None:
+            continue
+        channel_confirmed = True
+        manifest_fragment = decode_manifest_fragment(packet)
+        if manifest_fragment is not None:
+            fragment_index, manifest_fragment_count, entries = manifest_fragment
+            #a repeated fragment (reply lost) is answered the same way again
+            if fragment_index not in manifest_replies:
+                ui.update_status('Received batch manifest.')
+                needed = []
+                for file_name, secure_hash_hex_digest in entries:
+                    file_path = Path(directory) / Path(file_name).name
+                    #files already held are skipped by secure hash, a different version is updated by a delta transfer
+                    if file_path.is_file():
+                        local_file_secure_hash = blake2b(digest_size=16)
+                        with open(file_path, 'rb') as file:
+                            while chunk := file.read(lmodem_read_chunk_size):
+                                local_file_secure_hash.update(chunk)
+                        needed.append(local_file_secure_hash.hexdigest() != secure_hash_hex_digest)
+                    else:
+                        needed.append(True)
+                    if needed[-1]:
+                        needed_file_count += 1
+                        pending_file_names.add(file_path.name)
+                manifest_replies[fragment_index] = encode_manifest_reply(fragment_index, needed)
+            lostik.tx(manifest_replies[fragment_index].hex())
+            continue
+        file_transfer_details = decode_session_open(packet)
+        if file_transfer_details is not None:
+            status = receive_file(lostik, mode, directory, additional_lostiks, session_open=packet, chunk_store=chunk_store)
+            #a single file ends the session, as does any failure (later files are left for the next run)
+            if manifest_fragment_count is None or status != 0:
+                return status
+            #every file begins in the chosen mode, wherever an adaptive transfer left the last
+            if lmodem_get_mode(lostik) != mode:
+                lmodem_switch_mode([lostik] + list(additional_lostiks), mode)
+            pending_file_names.discard(Path(file_transfer_details[0]).name)
+            ui.update_status('Awaiting file transfer details.')
+
+def main():
+    #establish and parse command line arguments
+    parser = argparse.ArgumentParser(description='LMODEM v0.9.2',
+                                     epilog='Copyright © 2021-2025 Chris Clement (K7CTC).')
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('-s', '--send',
+                       help='send the specified file(s), or every file in the specified directory, in one session',
+                       metavar='filename',
+                       nargs='+')
+    group.add_argument('-r', '--receive',
+                       help='receive an incoming file',
+                       action='store_true')
+    parser.add_argument('-c', '--channel',
+                        help='LMODEM channel (default: 3)',
+                        type=int,
+                        choices=[1,2,3,4,5],
+                        default=3)
+    parser.add_argument('-m', '--mode',
+                        help='LMODEM mode (default: 2)',
+                        type=int,
+                        choices=[1,2,3,4,5],
+                        default=2)
+    parser.add_argument('-f', '--fec',
+                        help='send forward error correction (parity) blocks',
+                        action='store_true')
+    parser.add_argument('--survey',
+                        help='survey every channel before the transfer and move both stations to the best (send station only)',
+                        action='store_true')
+    parser.add_argument('-a', '--adaptive',
+                        help='switch to the fastest mode the link allows as the transfer proceeds (send station only)',
+                        action='store_true')
+    parser.add_argument('-p', '--port',
+                        help='LoStik serial port, repeat to stripe across several LoStiks (default: auto-detect)',
+                        metavar='port',
+                        action='append')
+    parser.add_argument('-n', '--lostiks',
+                        help='number of LoStiks to stripe across, on consecutive channels (default: 1)',
+                        type=int,
+                        choices=[1,2,3,4,5],
+                        default=1)
+    parser.add_argument('--no-led',
+                        help='disable LoStik LED signalling',
+                        action='store_true')
+    parser.add_argument('--no-cache',
+                        help='compress the outgoing file afresh rather than reusing an earlier send',
+                        action='store_true')
+    parser.add_argument('--no-chunk-store',
+                        help='receive every file in full rather than reusing content received before',
+                        action='store_true')
+    parser.add_argument('--telemetry',
+                        help='append per-packet telemetry and a session summary to the specified file (JSON lines)',
+                        metavar='filename')
+    args = parser.parse_args()
+    if args.port and args.lostiks not in (1, len(args.port)):
+        parser.error('number of ports does not match number of LoStiks')
+    #directories are sent as a batch of the files they contain
+    outgoing_files = []
+    for outgoing_path in args.send or []:
+        if Path(outgoing_path).is_dir():
+            outgoing_files.extend(sorted(str(path) for path in Path(outgoing_path).iterdir() if path.is_file() and path.name != chunkstore.index_name))
+        else:
+            outgoing_files.append(outgoing_path)
+    if args.send and not outgoing_files:
+        parser.error('no files to send')
+    del group, parser
+
+    #detect and connect to LoStik(s), the first carries the handshake and instructions
+    try:
+        if args.port:
+            lostik_devices = [lostik.connect(port=port) for port in args.port]
+        elif args.lostiks > 1:
+            lostik_devices = [lostik.connect(port=port) for port in lostik.detect_all(args.lostiks)]
+        else:
+            lostik_devices = [lostik.connect()]
+        for lostik_device in lostik_devices:
+            lostik_device.open()
+            lostik_device.leds = not args.no_led
+    except lostik.LoStikError as error:
+        print(f'[ERROR] {error}')
+        if error.help:
+            print(f'HELP: {error.help}')
+        exit(1)
+    lostik_device = lostik_devices[0]
+
+    #optionally log every packet of the session, shared by every LoStik
+    telemetry = None
+    if args.telemetry:
+        try:
+            telemetry = Telemetry(args.telemetry)
+        except OSError as error:
+            print(f'[ERROR] Failed to open telemetry log! {error}')
             exit(1)
+        for stripe, striped_lostik_device in enumerate(lostik_devices):
+            striped_lostik_device.telemetry = telemetry
+            striped_lostik_device.telemetry_number = stripe
 
-except KeyboardInterrupt:
-    ui.update_status('[green1 on deep_sky_blue4][QUIT][/] File transfer aborted.')
-    lostik.blue_led(False)
-    lostik.red_led(False)
+    #initialize user interface
+    ui.check_terminal_size()
+    ui.console.show_cursor(False)
+    ui.splash_k7ctc()
+    ui.splash_lmodem()
+    ui.print_static_content()
+
+    #initialize LoStik(s)
+    for stripe, striped_lostik_device in enumerate(lostik_devices):
+        lmodem_set_channel(striped_lostik_device, lmodem_stripe_channel(args.channel, stripe))
+        lmodem_set_mode(striped_lostik_device, args.mode)
+
+    #display LMODEM channel details
+    ui.insert_lmodem_channel(lmodem_get_channel(lostik_device))
+    ui.insert_frequency(lostik_device.get_freq())
+
+    #display LMODEM mode details
+    display_lmodem_mode(lostik_device)
+
+    #allow CTRL+C to gracefully terminate LMODEM
+    status = 1
+    try:
+        payload_cache = None if args.no_cache else PayloadCache(default_directory())
+        #a single file keeps the single file protocol (no manifest)
+        if args.send and len(outgoing_files) == 1 and outgoing_files[0] == args.send[0]:
+            status = send_file(lostik_device, outgoing_files[0], args.mode, forward_error_correction=args.fec,
+                               additional_lostiks=lostik_devices[1:], payload_cache=payload_cache, adaptive=args.adaptive,
+                               survey=args.survey)
+        elif args.send:
+            status = send_batch(lostik_device, outgoing_files, args.mode, forward_error_correction=args.fec,
+                                additional_lostiks=lostik_devices[1:], payload_cache=payload_cache, adaptive=args.adaptive,
+                                survey=args.survey)
+        if args.receive:
+            status = receive_batch(lostik_device, args.mode, additional_lostiks=lostik_devices[1:],
+                                   chunk_store=None if args.no_chunk_store else ChunkStore('.'))
+    except KeyboardInterrupt:
+        status = 2
+        ui.update_status('[green1 on deep_sky_blue4][QUIT][/] File transfer aborted.')
+        for striped_lostik_device in lostik_devices:
+            striped_lostik_device.blue_led(False)
+            striped_lostik_device.red_led(False)
+        ui.console.show_cursor(True)
+        exit(2)
+    except lostik.LoStikError as error:
+        ui.update_status(f'[red1 on deep_sky_blue4][ERROR][/] {error}')
+        ui.console.show_cursor(True)
+        exit(1)
+    finally:
+        for striped_lostik_device in lostik_devices:
+            striped_lostik_device.close()
+        if telemetry is not None:
+            telemetry.summary(status)
+            telemetry.close()
     ui.console.show_cursor(True)
-    exit(2)
+    exit(status)
+
+if __name__ == '__main__':
+    main()
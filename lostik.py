@@ -7,8 +7,12 @@
 ########################################################################
 
 #standard library imports
+import queue
+import threading
 from sys import exit
-from time import time, sleep
+from math import ceil
+from time import time, sleep, monotonic
+from collections import deque
 
 #related third party imports
 import serial
@@ -18,261 +22,609 @@ if __name__ == '__main__':
     print('[ERROR] lostik.py is not intended for direct execution!')
     exit(1)
 
-#attempt LoStik detection, port assignment and connection
-lostik_port_generator = serial.tools.list_ports.grep('1A86:7523')
-lostik_count = 0
-assigned_port = None
-for detected_lostik in lostik_port_generator:
-    lostik_count += 1
-    assigned_port = detected_lostik.device
-if lostik_count == 0:
-    print('[ERROR] LoStik not detected!')
-    print('HELP: Check serial port descriptor and/or device connection.')
-    exit(1)
-if lostik_count > 1:
-    print('[ERROR] More than one LoStik detected!')
-    print('HELP: Disconnect additional LoStik(s) and try again.')
-    exit(1)
-del lostik_port_generator, lostik_count
-try:
-    lostik_port = serial.Serial(assigned_port, baudrate=57600, timeout=1)
-except:
-    print('[ERROR] Failed to connect to LoStik!')
-    print('HELP: Check port permissions. User must be member of "dialout" group on Linux.')
-    exit(1)
-del assigned_port
-
-#function: read line from serial interface and remove CRLF from end
-# returns: ASCII string
-def read():
-    line = lostik_port.readline().decode('ASCII').rstrip()
-    return line
-
-#function: write command to serial interface and append CRLF to end
-# accepts: LoStik command as ASCII string
-def write(command):
-    if type(command) != str:
-        print('[ERROR] Invalid command type!')
-        print('HELP: Command must be a string.')
-        exit(1)
-    else:
-        command = command.encode('ASCII')
-        lostik_port.write(b''.join([command, b'\r\n']))
-
-#function: get firmware version
-# returns: firmware version
-def get_ver():
-    write('sys get ver')
-    return read()
-
-#confirm expected LoStik firmware version before proceeding
-if get_ver() != 'RN2903 1.0.5 Nov 06 2018 10:45:27':
-    print('[ERROR] LoStik failed to return expected firmware version!')
-    exit(1)
+#expected LoStik firmware version
+firmware_version = 'RN2903 1.0.5 Nov 06 2018 10:45:27'
+
+#function: calculate LoRa time on air for a single packet (Semtech AN1200.13)
+# accepts: payload length in bytes, spreading factor ('sf9' or 9), bandwidth in KHz and coding rate ('4/6')
+#  option: preamble (int) - preamble length in symbols (RN2903 default is 8)
+#  option: crc (boolean) - payload CRC enabled (RN2903 default is on)
+# returns: time on air in seconds (float)
+def time_on_air(payload_length, sf, bw, cr, preamble=8, crc=True):
+    sf = int(str(sf).removeprefix('sf'))
+    bw = int(bw) * 1000
+    cr = int(str(cr).split('/')[1]) - 4
+    symbol_time = (2 ** sf) / bw
+    #low data rate optimization is mandated when symbol time exceeds 16 ms
+    ldro = 1 if symbol_time > 0.016 else 0
+    payload_symbols = 8 + max(ceil((8 * payload_length - 4 * sf + 28 + 16 * int(crc)) / (4 * (sf - 2 * ldro))) * (cr + 4), 0)
+    return (preamble + 4.25 + payload_symbols) * symbol_time
+
+#LoRa demodulation floor, lowest signal-to-noise ratio (dB) at which a packet is received (Semtech SX1276 datasheet)
+demodulation_floor = {'sf7': -7.5, 'sf8': -10.0, 'sf9': -12.5, 'sf10': -15.0, 'sf11': -17.5, 'sf12': -20.0}
+
+#class: LoStik failure, raised rather than exiting so the caller decides how to report or recover
+# accepts: error message
+#  option: help (string) - suggested remedy
+class LoStikError(Exception):
+    def __init__(self, message, help=None):
+        super().__init__(message)
+        self.help = help
+
+#serial port of the last auto-detected LoStik, repeat calls to connect() skip the USB probe
+detected_port = None
+
+#function: locate a single attached LoStik
+#  option: serial_number (string) - select the LoStik with this USB serial number when several are attached
+# returns: serial port path
+def detect(serial_number=None):
+    lostik_count = 0
+    assigned_port = None
+    for detected_lostik in serial.tools.list_ports.grep('1A86:7523'):
+        if serial_number is not None and detected_lostik.serial_number != serial_number:
+            continue
+        lostik_count += 1
+        assigned_port = detected_lostik.device
+    if lostik_count == 0:
+        raise LoStikError('LoStik not detected!', 'Check serial port descriptor and/or device connection.')
+    if lostik_count > 1:
+        raise LoStikError('More than one LoStik detected!', 'Disconnect additional LoStik(s) and try again.')
+    return assigned_port
+
+#function: locate several attached LoStiks (e.g. to stripe a transfer across channels)
+# accepts: number of LoStiks required
+# returns: list of serial port paths (sorted)
+def detect_all(count):
+    assigned_ports = sorted(detected_lostik.device for detected_lostik in serial.tools.list_ports.grep('1A86:7523'))
+    if len(assigned_ports) < count:
+        raise LoStikError(f'{count} LoStiks required, {len(assigned_ports)} detected!', 'Check serial port descriptors and/or device connections.')
+    return assigned_ports[:count]
+
+#function: prepare a LoStik, the device itself is opened on first use
+#  option: port (string) - serial port path, skips detection (default: last detected or auto-detect)
+#  option: serial_number (string) - USB serial number of the LoStik to detect
+# returns: LoStik object
+def connect(port=None, serial_number=None):
+    global detected_port
+    if port is None:
+        if serial_number is not None:
+            port = detect(serial_number)
+        else:
+            if detected_port is None:
+                detected_port = detect()
+            port = detected_port
+    return LoStik(port)
+
+#function: describe a serial interface failure (port closed, disconnected or failed) as a LoStikError
+# accepts: exception raised by the serial interface
+# returns: LoStikError
+def serial_failure(error):
+    failure = LoStikError(f'LoStik serial interface failed! {error}', 'Check device connection, then try again.')
+    failure.__cause__ = error
+    return failure
+
+#RN2903 asynchronous responses, these follow the "ok" of radio tx and radio rx
+radio_events = ('radio_tx_ok', 'radio_rx', 'radio_err')
+
+#class: RN2903 command set over a serial transport, opened on first use or by open()
+# accepts: port - serial port path, open serial.Serial or any object providing readline() and write()
+#                 (e.g. emulator.RN2903)
+# A background thread reads the serial interface, routing command responses and radio events to
+# separate queues so the host is free to prepare the next command while the radio is busy.
+class LoStik:
+    def __init__(self, port):
+        #a port path is opened afresh each time, so a closed LoStik can be opened again
+        self.port_path = port if isinstance(port, str) else None
+        self.port = port
+        self.is_open = False
+        #expected handling of each outstanding command response ('keep', 'discard' or 're-arm')
+        self.pending_responses = deque()
+        self.responses = queue.Queue()
+        self.events = queue.Queue()
+        self.lock = threading.Lock()
+        #arrival time of the last radio event read by the host (monotonic seconds)
+        self.event_time = None
+        #transmission awaiting radio_tx_ok
+        self.tx_pending = False
+        self.tx_start_time = None
+        #radio in (or entering) receive mode
+        self.listening = False
+        #continuous receive: radio re-armed by the reader thread as soon as a packet or time-out is reported
+        self.continuous_rx = False
+        self.rearm_packet = None
+        #LED signalling, each LED change costs a serial command
+        self.leds = True
+        #toggle LEDs around every packet, suspended while a burst is signalled by a single LED
+        self.packet_leds = True
+        #pacing: delay applied before each transmission unless overridden (seconds)
+        self.tx_delay = 0.15
+        #measured host side time between consecutive transmissions, excluding tx_delay (seconds)
+        self.tx_overhead = 0.0
+        #recent receive re-arm latencies, from packet arrival to receiver listening again (seconds)
+        self.rearm_times = deque(maxlen=16)
+        self.last_tx_ok_time = None
+        self.last_rx_time = None
+        self.last_rx_line_time = 0.0
+        self.reader = None
+        #incremented by each open(), a reader thread left from an earlier opening stops without reporting
+        self.reader_generation = 0
+        #telemetry log (telemetry.Telemetry) and this LoStik's number within it, packets are only logged if one is kept
+        self.telemetry = None
+        self.telemetry_number = 0
+        self.tx_measurements = None
+        self.tx_command_ok_time = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    #function: open serial interface, start reader thread and prepare LoStik (no-op if already open)
+    def open(self):
+        if self.is_open:
+            return
+        if self.port_path is not None:
+            try:
+                self.port = serial.Serial(self.port_path, baudrate=57600, timeout=1)
+            except serial.SerialException:
+                raise LoStikError('Failed to connect to LoStik!', 'Check port permissions. User must be member of "dialout" group on Linux.')
+        elif getattr(self.port, 'is_open', True) == False:
+            #serial port handed over open and since closed (a closed emulator cannot be reopened)
+            try:
+                self.port.open()
+            except (AttributeError, serial.SerialException):
+                raise LoStikError('Failed to reopen LoStik serial interface!', 'Reconnect using the serial port path instead.')
+        #nothing from an earlier opening (responses, radio events, failures) carries over
+        self.reader_generation += 1
+        with self.lock:
+            self.pending_responses.clear()
+            self.continuous_rx = False
+            self.rearm_packet = None
+        for source in (self.responses, self.events):
+            while True:
+                try:
+                    source.get_nowait()
+                except queue.Empty:
+                    break
+        self.listening = False
+        self.tx_pending = False
+        self.last_tx_ok_time = None
+        self.last_rx_time = None
+        self.is_open = True
+        self.reader = threading.Thread(target=self.read_serial, args=(self.reader_generation,), daemon=True)
+        self.reader.start()
+        try:
+            #confirm expected LoStik firmware version before proceeding
+            if self.get_ver() != firmware_version:
+                raise LoStikError('LoStik failed to return expected firmware version!')
+            #disable LoRaWAN® before proceeding
+            self.disable_lorawan()
+        except LoStikError:
+            self.close()
+            raise
+
+    #function: close serial interface, the reader thread exits with it
+    def close(self):
+        self.is_open = False
+        if not isinstance(self.port, str):
+            self.port.close()
+        #reader is blocked for at most one serial time-out
+        if self.reader is not None and self.reader is not threading.current_thread():
+            self.reader.join(timeout=(getattr(self.port, 'timeout', None) or 1) + 1)
+        self.reader = None
+
+    #function: reader thread, route lines from serial interface to the response and event queues
+    # accepts: generation of the opening this thread serves
+    def read_serial(self, generation):
+        while generation == self.reader_generation:
+            try:
+                line = self.port.readline().decode('ASCII').rstrip()
+                if line == '':
+                    continue
+                arrival_time = monotonic()
+                if line.startswith(radio_events):
+                    with self.lock:
+                        if line.startswith(('radio_rx', 'radio_err')):
+                            self.listening = self.continuous_rx
+                            if self.continuous_rx:
+                                self.pending_responses.append('re-arm')
+                                self.port.write(b'radio rx 0\r\n')
+                                self.rearm_packet = (arrival_time, line) if line.startswith('radio_rx') else None
+                    self.events.put((line, arrival_time))
+                    continue
+            except Exception as error:
+                #port closed or failed, wake the host so it sees the failure (unless the LoStik has been opened again since)
+                if generation == self.reader_generation:
+                    self.responses.put(error)
+                    self.events.put(error)
+                return
+            with self.lock:
+                handling = self.pending_responses.popleft() if self.pending_responses else 'keep'
+            if handling == 'discard':
+                continue
+            if handling == 're-arm':
+                if line == 'ok':
+                    #re-arm latency includes delivery of the prior packet over the serial interface
+                    if self.rearm_packet is not None:
+                        packet_time, packet_line = self.rearm_packet
+                        self.rearm_times.append(arrival_time - packet_time + self.line_time(packet_line))
+                    continue
+                #failed re-arm is reported to the host waiting on the next radio event
+                self.events.put((line, arrival_time))
+                continue
+            self.responses.put((line, arrival_time))
 
-#function: get LoStik EUI-64™ (globally unique 64-bit identifier aka DevEUI)
-# returns: EUI-64™
-def get_hweui():
-    write('sys get hweui')
-    return read()
-
-#function: control blue led
-# accepts: boolean
-def blue_led(state):
-    if state == True:
-        write('sys set pindig GPIO10 1') #GPIO10 1 = blue rx led on
-    else:
-        write('sys set pindig GPIO10 0') #GPIO10 0 = blue rx led off
-    read()
-
-#function: control red led
-# accepts: boolean
-def red_led(state):
-    if state == True:
-        write('sys set pindig GPIO11 1') #GPIO11 1 = red tx led on
-    else:
-        write('sys set pindig GPIO11 0') #GPIO11 0 = red tx led off
-    read()
-
-#function: disable LoRaWAN® via "mac pause" command
-def disable_lorawan():
-    write('mac pause')
-    if read() != '4294967245':
-        print('[ERROR] Failed to disable LoRaWAN®!')
-        exit(1)
-
-#disable LoRaWAN® before proceeding
-disable_lorawan()
-
-#functions: read radio settings from LoStik
-#  returns: setting value
-def get_bw():
-    write('radio get bw')
-    return read()
-def get_cr():
-    write('radio get cr')
-    return read()
-def get_crc():
-    write('radio get crc')
-    return read()
-def get_freq():
-    write('radio get freq')
-    return read()
-def get_iqi():
-    write('radio get iqi')
-    return read()
-def get_mod():
-    write('radio get mod')
-    return read()
-def get_pwr():
-    write('radio get pwr')
-    return read()
-def get_sf():
-    write('radio get sf')
-    return read()
-def get_sync():
-    write('radio get sync')
-    return read()
-def get_wdt():
-    write('radio get wdt')
-    return read()
-
-#functions: write radio settings to LoStik
-#  accepts: setting value
-def set_bw(bw):
-    write(f'radio set bw {bw}')
-    if read() != 'ok':
-        print('[ERROR] Failed to set LoStik radio bandwidth! Invalid parameter!')
-        exit(1)
-def set_cr(cr):
-    write(f'radio set cr {cr}')
-    if read() != 'ok':
-        print('[ERROR] Failed to set LoStik coding rate! Invalid parameter!')
-        exit(1)
-def set_crc(crc):
-    write(f'radio set crc {crc}')
-    if read() != 'ok':
-        print('[ERROR] Failed to set LoStik CRC header! Invalid parameter!')
-        exit(1)
-def set_freq(freq):
-    write(f'radio set freq {freq}')
-    if read() != 'ok':
-        print('[ERROR] Failed to set LoStik frequency! Invalid parameter!')
-        exit(1)
-def set_iqi(iqi):
-    write(f'radio set iqi {iqi}')
-    if read() != 'ok':
-        print('[ERROR] Failed to set LoStik IQ inversion! Invalid parameter!')
-        exit(1)
-def set_mod(mod):
-    write(f'radio set mod {mod}')
-    if read() != 'ok':
-        print('[ERROR] Failed to set LoStik modulation mode! Invalid parameter!')
-        exit(1)
-def set_pwr(pwr):
-    write(f'radio set pwr {pwr}')
-    if read() != 'ok':
-        print('[ERROR] Failed to set LoStik transmit power! Invalid parameter!')
-        exit(1)
-def set_sf(sf):
-    write(f'radio set sf {sf}')
-    if read() != 'ok':
-        print('[ERROR] Failed to set LoStik spreading factor! Invalid parameter!')
-        exit(1)
-def set_sync(sync):
-    write(f'radio set sync {sync}')
-    if read() != 'ok':
-        print('[ERROR] Failed to set LoStik sync word! Invalid parameter!')
-        exit(1)
-def set_wdt(wdt):
-    write(f'radio set wdt {wdt}')
-    if read() != 'ok':
-        print('[ERROR] Failed to set LoStik watchdog timer time-out! Invalid parameter!')
-        exit(1)
-
-#function: obtain received signal strength indicator of last received packet
-# returns: rssi
-def get_rssi():
-    write('radio get rssi')
-    rssi = read()
-    return rssi
-
-#function: obtain signal-to-noise ratio of last received packet
-# returns: snr
-def get_snr():
-    write('radio get snr')
-    snr = read()
-    return snr
-
-#function: attempt to transmit outbound packet
-# accepts: packet as hexadecimal string by default, optionally accepts ASCII string
-#  option: encode (boolean) - allows function to accept and encode ASCII instead of hexadecimal
-#  option: delay (float) - delay TX operation to allow receive station time to process prior packet
-# returns: time_sent and air_time
-def tx(packet, encode=False, delay=0.15):
-    sleep(delay)
-    if encode == False:
-        write(f'radio tx {packet}')
-    if encode == True:
-        hex = packet.encode('ASCII').hex()
-        write(f'radio tx {hex}')
-    response = read()
-    if response == 'busy':
-        print('[ERROR] Failed to enter transmit mode! LoStik busy!')
-        exit(1)
-    if response == 'invalid_param':
-        print('[ERROR] Failed to enter transmit mode! Invalid parameter!')
-        exit(1)
-    if response == 'ok':
-        red_led(True)
-        tx_start_time = int(round(time()*1000))
+    #function: take next item from a queue, raising any serial interface failure as LoStikError
+    # returns: (line, arrival time) or ('', None) after serial time-out
+    def take(self, source):
+        try:
+            item = source.get(timeout=getattr(self.port, 'timeout', None) or 1)
+        except queue.Empty:
+            return '', None
+        if isinstance(item, Exception):
+            source.put(item)
+            raise serial_failure(item)
+        return item
+
+    #function: read command response from serial interface (CRLF removed)
+    # returns: ASCII string, empty after time-out
+    def read(self):
+        line, _ = self.take(self.responses)
+        return line
+
+    #function: read radio event (radio_tx_ok, radio_rx or radio_err) from serial interface
+    # returns: ASCII string, empty after time-out
+    def read_event(self):
+        line, arrival_time = self.take(self.events)
+        if arrival_time is not None:
+            self.event_time = arrival_time
+        return line
+
+    #function: write command to serial interface and append CRLF to end
+    # accepts: LoStik command as ASCII string
+    #  option: discard (boolean) - fire and forget, response is discarded by the reader thread
+    def write(self, command, discard=False):
+        if type(command) != str:
+            raise LoStikError('Invalid command type!', 'Command must be a string.')
+        else:
+            if not self.is_open:
+                self.open()
+            command = command.encode('ASCII')
+            with self.lock:
+                self.pending_responses.append('discard' if discard else 'keep')
+                try:
+                    self.port.write(b''.join([command, b'\r\n']))
+                except (serial.SerialException, OSError) as error:
+                    raise serial_failure(error)
+
+    #function: get firmware version
+    # returns: firmware version
+    def get_ver(self):
+        self.write('sys get ver')
+        return self.read()
+
+    #function: get LoStik EUI-64™ (globally unique 64-bit identifier aka DevEUI)
+    # returns: EUI-64™
+    def get_hweui(self):
+        self.write('sys get hweui')
+        return self.read()
+
+    #function: control blue led (ignored if LED signalling is disabled)
+    # accepts: boolean
+    def blue_led(self, state):
+        if not self.leds:
+            return
+        if state == True:
+            self.write('sys set pindig GPIO10 1', discard=True) #GPIO10 1 = blue rx led on
+        else:
+            self.write('sys set pindig GPIO10 0', discard=True) #GPIO10 0 = blue rx led off
+
+    #function: control red led (ignored if LED signalling is disabled)
+    # accepts: boolean
+    def red_led(self, state):
+        if not self.leds:
+            return
+        if state == True:
+            self.write('sys set pindig GPIO11 1', discard=True) #GPIO11 1 = red tx led on
+        else:
+            self.write('sys set pindig GPIO11 0', discard=True) #GPIO11 0 = red tx led off
+
+    #function: signal a burst of packets with one LED for its duration instead of toggling LEDs around each packet
+    # accepts: led ('red' or 'blue') and boolean (True at start of burst, False at end)
+    def burst_led(self, led, state):
+        self.packet_leds = not state
+        if led == 'red':
+            self.red_led(state)
+        if led == 'blue':
+            self.blue_led(state)
+
+    #function: disable LoRaWAN® via "mac pause" command
+    def disable_lorawan(self):
+        self.write('mac pause')
+        if self.read() != '4294967245':
+            raise LoStikError('Failed to disable LoRaWAN®!')
+
+    #functions: read radio settings from LoStik
+    #  returns: setting value
+    def get_bw(self):
+        self.write('radio get bw')
+        return self.read()
+    def get_cr(self):
+        self.write('radio get cr')
+        return self.read()
+    def get_crc(self):
+        self.write('radio get crc')
+        return self.read()
+    def get_freq(self):
+        self.write('radio get freq')
+        return self.read()
+    def get_iqi(self):
+        self.write('radio get iqi')
+        return self.read()
+    def get_mod(self):
+        self.write('radio get mod')
+        return self.read()
+    def get_pwr(self):
+        self.write('radio get pwr')
+        return self.read()
+    def get_sf(self):
+        self.write('radio get sf')
+        return self.read()
+    def get_sync(self):
+        self.write('radio get sync')
+        return self.read()
+    def get_wdt(self):
+        self.write('radio get wdt')
+        return self.read()
+
+    #functions: write radio settings to LoStik
+    #  accepts: setting value
+    def set_bw(self, bw):
+        self.write(f'radio set bw {bw}')
+        if self.read() != 'ok':
+            raise LoStikError('Failed to set LoStik radio bandwidth! Invalid parameter!')
+    def set_cr(self, cr):
+        self.write(f'radio set cr {cr}')
+        if self.read() != 'ok':
+            raise LoStikError('Failed to set LoStik coding rate! Invalid parameter!')
+    def set_crc(self, crc):
+        self.write(f'radio set crc {crc}')
+        if self.read() != 'ok':
+            raise LoStikError('Failed to set LoStik CRC header! Invalid parameter!')
+    def set_freq(self, freq):
+        self.write(f'radio set freq {freq}')
+        if self.read() != 'ok':
+            raise LoStikError('Failed to set LoStik frequency! Invalid parameter!')
+    def set_iqi(self, iqi):
+        self.write(f'radio set iqi {iqi}')
+        if self.read() != 'ok':
+            raise LoStikError('Failed to set LoStik IQ inversion! Invalid parameter!')
+    def set_mod(self, mod):
+        self.write(f'radio set mod {mod}')
+        if self.read() != 'ok':
+            raise LoStikError('Failed to set LoStik modulation mode! Invalid parameter!')
+    def set_pwr(self, pwr):
+        self.write(f'radio set pwr {pwr}')
+        if self.read() != 'ok':
+            raise LoStikError('Failed to set LoStik transmit power! Invalid parameter!')
+    def set_sf(self, sf):
+        self.write(f'radio set sf {sf}')
+        if self.read() != 'ok':
+            raise LoStikError('Failed to set LoStik spreading factor! Invalid parameter!')
+    def set_sync(self, sync):
+        self.write(f'radio set sync {sync}')
+        if self.read() != 'ok':
+            raise LoStikError('Failed to set LoStik sync word! Invalid parameter!')
+    def set_wdt(self, wdt):
+        self.write(f'radio set wdt {wdt}')
+        if self.read() != 'ok':
+            raise LoStikError('Failed to set LoStik watchdog timer time-out! Invalid parameter!')
+
+    #function: obtain received signal strength indicator of last received packet
+    # returns: rssi
+    def get_rssi(self):
+        self.write('radio get rssi')
+        rssi = self.read()
+        return rssi
+
+    #function: obtain signal-to-noise ratio of last received packet
+    # returns: snr
+    def get_snr(self):
+        self.write('radio get snr')
+        snr = self.read()
+        return snr
+
+    #function: obtain worst recent receive re-arm latency
+    # returns: seconds (float) or None if not yet measured
+    def get_rearm_time(self):
+        if not self.rearm_times:
+            return None
+        return max(self.rearm_times)
+
+    #function: estimate time for the LoStik to deliver a response line over the serial interface
+    # accepts: response line as ASCII string
+    # returns: seconds (float), zero for transports without a baud rate (e.g. emulator)
+    def line_time(self, line):
+        baudrate = getattr(self.port, 'baudrate', None)
+        if not baudrate:
+            return 0.0
+        return (len(line) + 2) * 10 / baudrate
+
+    #function: attempt to transmit outbound packet
+    # accepts: packet as hexadecimal string by default, optionally accepts ASCII string
+    #  option: encode (boolean) - allows function to accept and encode ASCII instead of hexadecimal
+    #  option: delay (float) - delay TX operation to allow receive station time to process prior packet
+    #                          (default: tx_delay, measured from the end of the prior transmission)
+    #  option: wait (boolean) - wait for transmission to complete, otherwise return once the packet is on air
+    #                           and complete it with finish_tx() (called by the next tx or rx)
+    #  option: block (int) - block number carried in the packet header, recorded in the telemetry log
+    # returns: time_sent and air_time, None if not waiting
+    #  raises: LoStikError if the LoStik fails to enter transmit mode
+    def tx(self, packet, encode=False, delay=None, wait=True, block=None):
+        if delay is None:
+            delay = self.tx_delay
+        self.receive_continuously(False)
+        self.finish_tx()
+        self.last_rx_time = None
+        delay_start_time = monotonic()
+        #work done while the prior packet was on air does not add to the delay
+        if self.last_tx_ok_time is not None:
+            sleep(max(self.last_tx_ok_time + delay - monotonic(), 0.0))
+        else:
+            sleep(delay)
+        command_time = monotonic()
+        if encode == False:
+            self.write(f'radio tx {packet}')
+        if encode == True:
+            hex = packet.encode('ASCII').hex()
+            self.write(f'radio tx {hex}')
+        response = self.read()
+        if response == 'busy':
+            raise LoStikError('Failed to enter transmit mode! LoStik busy!')
+        if response == 'invalid_param':
+            raise LoStikError('Failed to enter transmit mode! Invalid parameter!')
+        if response != 'ok':
+            raise LoStikError('Failed to enter transmit mode! No response from LoStik!')
+        #time between consecutive transmissions not spent in the pacing delay
+        if self.last_tx_ok_time is not None:
+            self.tx_overhead = max(monotonic() - self.last_tx_ok_time - delay, 0.0)
+        #air time runs from this "ok" to radio_tx_ok
+        if self.telemetry is not None:
+            self.tx_measurements = {'length': len(packet) if encode == True else len(packet) // 2,
+                                    'delay': round(command_time - delay_start_time, 4),
+                                    'serial': round(monotonic() - command_time, 4)}
+            if block is not None:
+                self.tx_measurements['block'] = block
+            self.tx_command_ok_time = monotonic()
+        if self.packet_leds:
+            self.red_led(True)
+        self.tx_start_time = int(round(time()*1000))
+        self.tx_pending = True
+        if wait == True:
+            return self.finish_tx()
+
+    #function: wait for an outstanding transmission to complete
+    # returns: time_sent and air_time, None if no transmission outstanding
+    def finish_tx(self):
+        if not self.tx_pending:
+            return None
+        self.tx_pending = False
         response = ''
         while response == '':
-            response = read()
-        red_led(False)
+            response = self.read_event()
+        if self.packet_leds:
+            self.red_led(False)
         if response == 'radio_err':
-            print('[ERROR] LoStik watchdog timer time-out!')
-            exit(1)
+            raise LoStikError('LoStik watchdog timer time-out!')
         if response == 'radio_tx_ok':
+            self.last_tx_ok_time = self.event_time
+            if self.telemetry is not None and self.tx_measurements is not None:
+                self.telemetry.record(self.telemetry_number, 'tx', **self.tx_measurements,
+                                      air=round(self.event_time - self.tx_command_ok_time, 4))
+                self.tx_measurements = None
             tx_end_time = int(round(time()*1000))
             time_sent = tx_end_time
-            air_time = tx_end_time - tx_start_time
+            air_time = tx_end_time - self.tx_start_time
             return time_sent, air_time
 
-#function: attempt to receive inbound packet
-#  option: decode (boolean) - allows returned packed to be decoded from hexadecmial to ASCII
-# returns: packet contents in chosen encoding or 'TIME-OUT' if no packet received before time-out
-def rx(decode=False):
-    write('radio rx 0')
-    response = read()
-    if response == 'busy':
-        print('[ERROR] Failed to enter receive mode. LoStik busy!')
-        print('HELP: Disconnect and reconnect LoStik device, then try again.')
-        exit(1)
-    if response == 'invalid_param':
-        print('[ERROR] Failed to enter receive mode! Invalid parameter!')
-        print('HELP: Disconnect and reconnect LoStik device, then try again.')
-        exit(1)
-    if response == 'ok':
-        blue_led(True)
+    #function: attempt to receive inbound packet
+    #  option: decode (boolean) - allows returned packed to be decoded from hexadecmial to ASCII
+    #  option: block (function) - returns the block number in the header of a packet (hexadecimal string), or None,
+    #                             recorded in the telemetry log
+    # returns: packet contents in chosen encoding or 'TIME-OUT' if no packet received before time-out
+    #  raises: LoStikError if the LoStik fails to enter receive mode
+    def rx(self, decode=False, block=None):
+        self.finish_tx()
+        turnaround_start_time = self.last_tx_ok_time
+        self.last_tx_ok_time = None
+        listen_start_time = monotonic()
+        serial_time = None
+        #in continuous receive the reader thread has already re-armed the radio
+        if not self.listening:
+            self.listening = True
+            self.write('radio rx 0')
+            response = self.read()
+            serial_time = round(monotonic() - listen_start_time, 4)
+            if response == 'busy':
+                raise LoStikError('Failed to enter receive mode. LoStik busy!', 'Disconnect and reconnect LoStik device, then try again.')
+            if response == 'invalid_param':
+                raise LoStikError('Failed to enter receive mode! Invalid parameter!', 'Disconnect and reconnect LoStik device, then try again.')
+            if response != 'ok':
+                #no answer within the serial time-out, the radio state is unknown
+                self.listening = False
+                raise LoStikError('Failed to enter receive mode! No response from LoStik!', 'Disconnect and reconnect LoStik device, then try again.')
+            #re-arm latency includes delivery of the prior packet over the serial interface
+            if self.last_rx_time is not None:
+                self.rearm_times.append(monotonic() - self.last_rx_time + self.last_rx_line_time)
+            #until one packet has followed another, the turn from transmit to receive (the same host side path) stands in
+            elif turnaround_start_time is not None and not self.rearm_times:
+                self.rearm_times.append(monotonic() - turnaround_start_time + self.line_time('radio_tx_ok'))
+        if self.packet_leds:
+            self.blue_led(True)
         response = ''
         while response == '':
-            response = read()
-        blue_led(False)
+            response = self.read_event()
+        if self.packet_leds:
+            self.blue_led(False)
+        if response in ('busy', 'invalid_param'): #reader thread failed to re-arm
+            raise LoStikError('Failed to re-enter receive mode!', 'Disconnect and reconnect LoStik device, then try again.')
         if response == 'radio_err': #wdt time-out
+            self.last_rx_time = None
+            if self.telemetry is not None:
+                self.telemetry.record(self.telemetry_number, 'timeout', serial=serial_time, wait=round(self.event_time - listen_start_time, 4))
             return 'TIME-OUT'
+        self.last_rx_time = self.event_time
+        self.last_rx_line_time = self.line_time(response)
         response = response[10:] #remove 'radio_rx  ' from beginning of string
+        if self.telemetry is not None:
+            measurements = {'length': len(response) // 2, 'serial': serial_time, 'wait': round(self.event_time - listen_start_time, 4)}
+            block_number = block(response) if block is not None else None
+            if block_number is not None:
+                measurements['block'] = block_number
+            #signal is read for single packets only, a burst keeps the serial interface free for the next block
+            if not self.continuous_rx:
+                for measurement, value in (('rssi', self.get_rssi()), ('snr', self.get_snr())):
+                    try:
+                        measurements[measurement] = int(value)
+                    except ValueError:
+                        measurements[measurement] = None
+            self.telemetry.record(self.telemetry_number, 'rx', **measurements)
+            del measurements, block_number
         if decode == False:
             return response
         if decode == True:
             return bytes.fromhex(response).decode('ASCII')
 
-#function: force LoStik to halt continuous receive mode
-def rxstop():
-    write('radio rxstop')
-    if read() == 'ok':
-        blue_led(False)
-    else:
-        print('[ERROR] Failed to exit receive mode!')
-        print('HELP: Disconnect and reconnect LoStik device, then try again.')
-        exit(1)
+    #function: start or stop continuous receive
+    # While enabled the reader thread re-arms the radio the moment a packet or time-out is reported, so
+    # there is no host side gap between consecutive rx() calls.  Transmitting stops continuous receive.
+    # accepts: boolean
+    def receive_continuously(self, state):
+        with self.lock:
+            self.continuous_rx = state
+            listening = self.listening
+        if state == True or not listening:
+            return
+        #radio may still be listening, halt it and drop any packet that arrived in the meantime
+        self.write('radio rxstop')
+        self.read()
+        self.listening = False
+        while True:
+            try:
+                item = self.events.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, Exception):
+                self.events.put(item)
+                raise serial_failure(item)
+
+    #function: force LoStik to halt continuous receive mode
+    def rxstop(self):
+        self.write('radio rxstop')
+        if self.read() == 'ok':
+            self.listening = False
+            self.blue_led(False)
+        else:
+            raise LoStikError('Failed to exit receive mode!', 'Disconnect and reconnect LoStik device, then try again.')
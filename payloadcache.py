@@ -0,0 +1,155 @@
+########################################################################
+#                                                                      #
+#       NAME:  LMODEM - Outgoing Payload Cache                         #
+#  COPYRIGHT:  2021-2025 Chris Clement (K7CTC)                         #
+#    VERSION:  v0.9.1                                                  #
+#                                                                      #
+########################################################################
+
+# Sending the same file again (a retry, a resume or another receiving
+# station) would otherwise mean hashing and compressing it with every codec
+# all over again.  The cache keeps the result on disk, one entry per file:
+#   entry name: blake2b of (resolved path, size, modification time, change time, inode)
+#   entry contents: header (magic, version, codec id, secure hash, time keyed)
+#                   then the compressed file
+# The key is taken before the file is read.  Rewriting a file changes its
+# change time (which, unlike the modification time, cannot be set back) and
+# replacing it changes its inode, so either misses the cache.  Two writes
+# within one timestamp tick cannot be told apart, so an entry keyed within
+# racy_window of the file's last change is only served once the file has
+# been hashed again and matches it (the git index treats "racily clean" files
+# the same way).  The compressed file does not depend on the mode (the
+# smallest codec output is the same whatever the limit) so one entry serves
+# every mode.  Entries are touched when used and the least recently used are
+# evicted once the cache grows past its size limit.
+
+#standard library imports
+import os
+import struct
+import tempfile
+from sys import exit
+from time import time_ns
+from hashlib import blake2b
+from pathlib import Path
+
+if __name__ == '__main__':
+    print('[ERROR] payloadcache.py is not intended for direct execution!')
+    exit(1)
+
+#entry header: magic | version | codec id | secure hash (16 bytes) | time keyed (nanoseconds)
+entry_magic = b'LMODEMPC'
+entry_version = 2
+entry_header = struct.Struct('<8sBB16sQ')
+entry_suffix = '.lmpc'
+
+#bytes on disk before the least recently used entries are evicted
+default_max_size = 16 * 1024 * 1024
+
+#coarsest file timestamp resolution catered for (FAT records modification times to 2 seconds)
+racy_window = 2 * 10**9
+
+#bytes read from disk at a time while verifying a file
+read_size = 65536
+
+#function: default cache directory, following the XDG base directory convention
+# returns: Path
+def default_directory():
+    return Path(os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache') / 'lmodem'
+
+#class: size bounded, least recently used cache of compressed outgoing files
+# accepts: cache directory
+#  option: max_size (int) - bytes on disk before the least recently used entries are evicted (default: default_max_size)
+# a cache that cannot be read or written behaves as if empty, it never stops a transfer
+class PayloadCache:
+    def __init__(self, directory, max_size=default_max_size):
+        self.directory = Path(directory)
+        self.max_size = max_size
+
+    #function: determine the key of a file in its current state on disk (taken before the file is read)
+    # accepts: file path
+    # returns: key (entry path, resolved file path, last change time and time keyed), or None if the file cannot be examined
+    def key(self, path):
+        try:
+            path = Path(path).resolve()
+            stat = path.stat()
+        except OSError:
+            return None
+        name = blake2b(f'{path}|{stat.st_size}|{stat.st_mtime_ns}|{stat.st_ctime_ns}|{stat.st_ino}'.encode('UTF-8'), digest_size=16).hexdigest()
+        return self.directory / (name + entry_suffix), path, max(stat.st_mtime_ns, stat.st_ctime_ns), time_ns()
+
+    #function: look up a file
+    # accepts: key (from key())
+    # returns: secure hash hex digest, codec id and compressed file (bytearray), or None if not cached
+    def get(self, key):
+        if key is None:
+            return None
+        entry_path, path, change_time, key_time = key
+        try:
+            with open(entry_path, 'rb') as file:
+                header = file.read(entry_header.size)
+                payload = bytearray(file.read())
+            if len(header) != entry_header.size:
+                return None
+            magic, version, codec_id, secure_hash, entry_key_time = entry_header.unpack(header)
+            if magic != entry_magic or version != entry_version:
+                return None
+            #file changed too close to the entry being keyed for its timestamps to vouch for it
+            if change_time >= entry_key_time - racy_window:
+                file_secure_hash = blake2b(digest_size=16)
+                with open(path, 'rb') as file:
+                    while chunk := file.read(read_size):
+                        file_secure_hash.update(chunk)
+                if file_secure_hash.digest() != secure_hash:
+                    entry_path.unlink()
+                    return None
+                del file_secure_hash
+                #verified, and once the change is older than the window the timestamps vouch for later hits
+                if change_time < key_time - racy_window:
+                    with open(entry_path, 'r+b') as file:
+                        file.write(entry_header.pack(entry_magic, entry_version, codec_id, secure_hash, key_time))
+            #mark entry as recently used
+            os.utime(entry_path)
+        except OSError:
+            return None
+        return secure_hash.hex(), codec_id, payload
+
+    #function: store a file, evicting least recently used entries as needed
+    # accepts: key (from key(), taken before the file was read), secure hash hex digest, codec id and compressed file (bytes-like)
+    def put(self, key, secure_hash_hex_digest, codec_id, payload):
+        if key is None:
+            return
+        entry_path, _, _, key_time = key
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            #write beside the entry then rename, so a reader never sees a partial entry
+            descriptor, temporary_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            try:
+                with os.fdopen(descriptor, 'wb') as file:
+                    file.write(entry_header.pack(entry_magic, entry_version, codec_id, bytes.fromhex(secure_hash_hex_digest), key_time))
+                    file.write(payload)
+                os.replace(temporary_path, entry_path)
+            except OSError:
+                os.remove(temporary_path)
+                raise
+            self.evict()
+        except OSError:
+            pass
+
+    #function: remove least recently used entries until the cache fits its size limit
+    def evict(self):
+        entries = []
+        for entry_path in self.directory.glob('*' + entry_suffix):
+            try:
+                stat = entry_path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, entry_path))
+        cache_size = sum(size for _, size, _ in entries)
+        for _, size, entry_path in sorted(entries):
+            if cache_size <= self.max_size:
+                break
+            try:
+                entry_path.unlink()
+            except OSError:
+                continue
+            cache_size -= size
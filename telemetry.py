@@ -0,0 +1,105 @@
+########################################################################
+#                                                                      #
+#       NAME:  LMODEM - Transfer Telemetry                             #
+#  COPYRIGHT:  2021-2025 Chris Clement (K7CTC)                         #
+#    VERSION:  v0.9.1                                                  #
+#                                                                      #
+########################################################################
+
+# A slow transfer may be down to lost packets, to pacing or to the serial
+# interface.  When a telemetry log is kept, every packet a LoStik sends or
+# receives (and every receive time-out) is appended to it as one JSON line,
+# and each session ends with a summary line:
+#   {"line": 1, "time": 1750000000.123, "lostik": 0, "event": "tx", "length": 104, "delay": 0.031, "serial": 0.004, "air": 0.412, "block": 7}
+#   {"line": 2, "time": 1750000000.987, "lostik": 0, "event": "rx", "length": 6, "serial": 0.004, "wait": 0.52, "rssi": -71, "snr": 9}
+#   {"line": 3, "time": 1750000003.001, "lostik": 0, "event": "timeout", "serial": 0.004, "wait": 2.0}
+#   {"line": 4, "time": 1750000003.002, "event": "summary", "status": 0, "elapsed": 3.1, "goodput": 330.3, ...}
+# line numbers the lines of the log.  block is the block (or parity block)
+# number from the header of a data packet, so lost and repeated blocks can be
+# told apart; control packets have none.  Times are in seconds.  delay is the pacing delay slept before a transmission,
+# serial the round trip of its radio tx (or radio rx) command, air the time
+# from that command's "ok" to radio_tx_ok and wait the time spent listening.
+# Reading RSSI and SNR costs two serial round trips, so they are read for
+# single packets (handshake, details, NAKs and results) but never part way
+# through a burst of blocks.  Lines are buffered and written out as the buffer
+# fills and with each summary, so a log is cheap enough to keep at all times.
+
+#standard library imports
+import json
+import threading
+from sys import exit
+from time import time, monotonic
+
+if __name__ == '__main__':
+    print('[ERROR] telemetry.py is not intended for direct execution!')
+    exit(1)
+
+#class: per-packet telemetry log (JSON lines) with a summary of each session
+# accepts: log file path (appended to)
+# every LoStik of a station may share one log, each records its own number
+class Telemetry:
+    def __init__(self, path):
+        self.file = open(path, 'a', encoding='UTF-8')
+        #bursts are sent and received by one thread per LoStik
+        self.lock = threading.Lock()
+        self.line_number = 0
+        self.start_session()
+
+    #function: begin a session, the next summary covers only what follows
+    def start_session(self):
+        with self.lock:
+            self.start_time = monotonic()
+            self.totals = {'tx_packets': 0, 'tx_bytes': 0, 'tx_air_time': 0.0, 'tx_delay': 0.0, 'serial_time': 0.0,
+                           'rx_packets': 0, 'rx_bytes': 0, 'rx_timeouts': 0}
+
+    #function: write one line (called with the lock held)
+    # accepts: dictionary
+    def write(self, line):
+        self.line_number += 1
+        self.file.write(json.dumps({'line': self.line_number, 'time': round(time(), 3), **line}) + '\n')
+
+    #function: log a packet sent or received, or a receive time-out
+    # accepts: LoStik number, event ('tx', 'rx' or 'timeout') and its measurements (keyword arguments)
+    def record(self, lostik_number, event, **measurements):
+        with self.lock:
+            self.write({'lostik': lostik_number, 'event': event, **measurements})
+            self.totals['serial_time'] += measurements.get('serial') or 0.0
+            if event == 'tx':
+                self.totals['tx_packets'] += 1
+                self.totals['tx_bytes'] += measurements['length']
+                self.totals['tx_air_time'] += measurements['air']
+                self.totals['tx_delay'] += measurements['delay']
+            if event == 'rx':
+                self.totals['rx_packets'] += 1
+                self.totals['rx_bytes'] += measurements['length']
+            if event == 'timeout':
+                self.totals['rx_timeouts'] += 1
+
+    #function: add to the totals of the session (files delivered, blocks sent, rounds and so on)
+    # accepts: totals (keyword arguments)
+    def add(self, **totals):
+        with self.lock:
+            for name, value in totals.items():
+                self.totals[name] = self.totals.get(name, 0) + value
+
+    #function: log the summary of the session and begin the next
+    # accepts: exit status
+    def summary(self, status):
+        with self.lock:
+            elapsed = monotonic() - self.start_time
+            summary = {'event': 'summary', 'status': status, 'elapsed': round(elapsed, 3)}
+            summary.update({name: round(value, 3) if isinstance(value, float) else value for name, value in self.totals.items()})
+            size_on_disk = self.totals.get('size_on_disk', 0)
+            #file bytes delivered per second, and per byte this station sent or heard (above 1 when compression wins)
+            summary['goodput'] = round(size_on_disk / elapsed, 3) if elapsed else 0.0
+            air_bytes = self.totals['tx_bytes'] + self.totals['rx_bytes']
+            summary['efficiency'] = round(size_on_disk / air_bytes, 3) if air_bytes else 0.0
+            summary['air_time_utilization'] = round(self.totals['tx_air_time'] / elapsed, 4) if elapsed else 0.0
+            self.write(summary)
+            self.file.flush()
+        self.start_session()
+
+    #function: write out any buffered lines and close the log
+    def close(self):
+        with self.lock:
+            self.file.close()
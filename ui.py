@@ -12,6 +12,7 @@ from time import sleep
 from random import randint
 
 #related third party imports
+import rich.progress
 from rich.console import Console
 from rich.theme import Theme
 
@@ -22,13 +23,22 @@ if __name__ == '__main__':
     console.print('HELP: Run lmodem.py instead.')
     exit(1)
 
-if (console.width < 66) or (console.height < 16):
-    console.print('[red1][ERROR][/] Terminal window is too small!')
-    console.print('HELP: LMODEM minimum terminal size is 66x16. Resize and try again.')
-    exit(1)
+def check_terminal_size():
+    if (console.width < 66) or (console.height < 16):
+        console.print('[red1][ERROR][/] Terminal window is too small!')
+        console.print('HELP: LMODEM minimum terminal size is 66x16. Resize and try again.')
+        exit(1)
 
 def move_cursor(row, column):
-    print(f'\033[{row};{column}H', end='')
+    if not console.quiet:
+        print(f'\033[{row};{column}H', end='')
+
+def create_progress():
+    return rich.progress.Progress(rich.progress.BarColumn(bar_width=59),
+                                  rich.progress.TaskProgressColumn(),
+                                  rich.progress.TimeRemainingColumn(),
+                                  rich.progress.TimeElapsedColumn(),
+                                  disable=console.quiet)
 
 def print_static_content():
     console.clear()